@@ -1,16 +1,18 @@
 import asyncio
 import json
 import os
-import sys
 import weakref
 from config import IS_KB_PATH
-from fastmcp import Client
-from fastmcp.client.transports import StdioTransport
 from fastmcp.client.elicitation import ElicitResult
-from models.graph_db import graph_query
+from models.graph_db import graph_query, async_graph_query, RUN_DATA_LABELS
 from agent.super_agent import SuperAgent
 from agent.data_pipe import DataPipe
 from agent.io_data import IOData
+from agent.topology import AgentTopology
+from agent.execution_plan import ExecutionPlan, PlanScheduler
+from agent.run_scheduler import RunScheduler
+from agent.mcp_pool import MCPClientPool, builtin_transport
+from agent.tool_catalog import ToolCatalog, TOOL_FIELDS
 import logging
 import time
 from datetime import datetime
@@ -21,6 +23,9 @@ import shutil
 log = logging.getLogger(__name__)
 log.setLevel('INFO')
 
+PYTHON_PATH = Path(os.path.dirname(__file__)).parent.parent
+MCP_PATH = PYTHON_PATH / "mcp_bus" / "mcp_server.py"
+
 
 class AppRunContext:
     def __init__(self, owner):
@@ -32,8 +37,8 @@ class AppRunContext:
         self.error_messages = None
 
 
-    def new_run(self, incomes):
-        self.node = self.owner().graph().add_node("AppRunCtx", {"timestamp": time.time(), "app_id": self.owner().node_id})
+    async def new_run(self, incomes):
+        self.node = await self.owner().graph().add_node("AppRunCtx", {"timestamp": time.time(), "app_id": self.owner().node_id})
         self.node_id = self.node['node_id']
         self.incomes = incomes.copy()
         self.run_states = {
@@ -43,8 +48,8 @@ class AppRunContext:
         self.error_messages = {}
         return self
 
-    def get_run(self, node_id, incomes):
-        nodes = self.owner().graph().get_node("AppRunCtx", {"node_id": node_id})
+    async def get_run(self, node_id, incomes):
+        nodes = await self.owner().graph().get_node("AppRunCtx", {"node_id": node_id})
         if not nodes:
             return None
         self.node = nodes[0]
@@ -57,18 +62,15 @@ class AppRunContext:
         self.error_messages = {}
         return self
 
-    def list_run(self):
-        return self.owner().graph().get_node("AppRunCtx", {"app_id": self.owner().node_id})
+    async def list_run(self, skip_token=None, limit=None):
+        return await self.owner().graph().get_node("AppRunCtx", {"app_id": self.owner().node_id}, skip_token, limit)
 
-    def del_run(self, node_id=None):
+    async def del_run(self, node_id=None):
         if node_id is None:
-            self.owner().graph().delete_node("AppRunCtx", {"app_id": self.owner().node_id})
-            self.owner().graph().delete_node("IOData", {"app_id": self.owner().node_id})
-            self.owner().graph().delete_node("Data", {"app_id": self.owner().node_id})
+            await self.owner().graph().cascade_delete(app_id=self.owner().node_id, labels=RUN_DATA_LABELS)
         else:
-            self.owner().graph().delete_node("AppRunCtx", {"app_id": self.owner().node_id, "node_id": node_id})
-            self.owner().graph().delete_node("IOData", {"app_id": self.owner().node_id, "app_ctx_id": node_id})
-            self.owner().graph().delete_node("Data", {"app_id": self.owner().node_id, "app_ctx_id": node_id})
+            await self.owner().graph().cascade_delete(app_id=self.owner().node_id, app_ctx_id=node_id)
+        self.owner().owner().collect_blobs()
 
 
     def get_time_str(self):
@@ -81,52 +83,78 @@ class AppRunContext:
 
 class ApplicationManager:
     def __init__(self):
-        self.graph = graph_query()
+        self.graph = async_graph_query()
         self.app_local = {}
-
-    def add_application(self, name, options=None):
+        # shared by the runs of all applications
+        self.scheduler = RunScheduler()
+        self.mcp_pool = MCPClientPool(lambda: builtin_transport(PYTHON_PATH, MCP_PATH))
+        self.tool_catalog = ToolCatalog(self.mcp_pool, MCP_PATH.parent, Path(IS_KB_PATH) / "mcp")
+        self._gc_task = None
+        self._gc_pending = False
+        if os.environ.get("GRAPH_SCHEMA_BOOTSTRAP", "true").lower() == "true":
+            try:
+                graph_query().ensure_schema()
+            except Exception as e:
+                log.error(f"Failed to bootstrap graph schema: {e}")
+
+    async def add_application(self, name, options=None):
         if options is None:
             options = {}
-        exists = self.graph.get_node("Application", {"name": name} | options)
+        exists = await self.graph.get_node("Application", {"name": name} | options)
         if exists:
             return {"status": "failed", "reason": "Same name application exists!"}
-        ret = self.graph.add_node("Application", {"name": name} | options)
+        ret = await self.graph.add_node("Application", {"name": name} | options)
         return {"status": "successfully", "node_id": ret['node_id']}
 
-    def del_application(self, app_id):
-        self.graph.delete_node("Application", {"node_id": app_id})
+    async def del_application(self, app_id):
+        def delete(tx):
+            tx.delete_node("Application", {"node_id": app_id})
+            tx.cascade_delete(app_id=app_id)
+
+        await self.graph.transaction(delete)
+        self.collect_blobs()
         if app_id in self.app_local:
             del self.app_local[app_id]
 
-        self.graph.delete_node("IOData", {"app_id": app_id})
-        self.graph.delete_node("Data",  {"app_id": app_id})
-        self.graph.delete_node("Agent", {"app_id": app_id})
-        self.graph.delete_node("AppRunCtx", {"app_id": app_id})
-        self.graph.delete_node("Tool", {"app_id": app_id})
         app_dir = Path("/is_kb") / "application" / app_id
         if app_dir.exists():
             shutil.rmtree(str(app_dir))
 
         return {"status": "successfully"}
 
-    def load_application(self, name, app_id=None):
+    def collect_blobs(self):
+        """remove the blobs of deleted nodes in the background, see GraphQuery.gc_blobs"""
+        self._gc_pending = True
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.create_task(self._collect_blobs())
+
+    async def _collect_blobs(self):
+        # deletes during a collection are collected by one more pass
+        while self._gc_pending:
+            self._gc_pending = False
+            try:
+                await self.graph.gc_blobs()
+            except Exception as e:
+                log.error(f"Failed to collect unreferenced blobs: {e}")
+
+    async def load_application(self, name, app_id=None):
         if app_id:
-            apps = self.graph.get_node("Application", {"node_id": app_id})
+            apps = await self.graph.get_node("Application", {"node_id": app_id})
         else:
-            apps = self.graph.get_node("Application", {"name": name})
+            apps = await self.graph.get_node("Application", {"name": name})
         if apps:
             return apps[0]
         return None
 
-    def list_application(self):
-        return self.graph.get_node("Application")
+    async def list_application(self, skip_token=None, limit=None):
+        return await self.graph.get_node("Application", None, skip_token, limit)
 
-    def get_application(self, app_id):
+    async def get_application(self, app_id):
         if app := self.app_local.get(app_id):
             return app
-        app_node = self.load_application(None, app_id=app_id)
+        app_node = await self.load_application(None, app_id=app_id)
         if app_node is not None:
-            app = Application(self, app_node)
+            app = await Application(self, app_node).load()
             self.app_local[app_node['node_id']] = app
             return app
         return None
@@ -141,136 +169,123 @@ class Application:
         self.runner = AppRunContext(self)
         self.node_id = app_node['node_id']
         self.app_node = app_node
-        self.python_path = Path(os.path.dirname(__file__)).parent.parent
-        self.mcp_path = Path(os.path.dirname(__file__)).parent.parent / "mcp_bus" / "mcp_server.py"
+        self.python_path = PYTHON_PATH
+        self.mcp_path = MCP_PATH
         self.data_path = Path(IS_KB_PATH) / "Application"
 
-        self.transport = StdioTransport(
-            command=sys.executable,
-            args=[str(self.mcp_path)],
-            env={"PYTHONPATH": str(self.python_path)}
-        )
-        self.heads = []
-        self.nodes = {}
-        self.incomes = defaultdict(set)
-        self.edges = []
+        self.topology = AgentTopology()
+        self.plan = None
         self.ctx = None
         self.tools = None
-        self.ctx = self.select_appctx(None)
 
-    def update_node(self, update):
+    async def load(self):
+        self.ctx = await self.select_appctx(None)
+        return self
+
+    async def update_node(self, update):
         if "node_id" in update:
             del update['node_id']
         self.app_node |= update
-        self.graph().update_node("Application",
-                                 {"node_id": self.node_id},
-                                 self.app_node
-                                 )
-
-    def update_heads(self):
-        for n in self.graph().get_node("Agent", {"app_id": self.node_id}):
-            if n['node_id'] not in self.nodes:
-                self.nodes[n['node_id']] = SuperAgent(self, n)
-        self.heads = self.nodes.values()
-        def get_head_agents(node_id):
-            relations = self.graph().get_relationship(
-                {
-                    "src_label": "Agent",
-                    "src_props": {"node_id": node_id},
-                    "rel_types": ["NEXT"],
-                    "hop_num": 1
-                }
-            )
-            for current, _, next in relations:
-                self.heads = [n for n in self.heads if n.node_id != next['node_id']]
-
-        for node_id in self.nodes.keys():
-            get_head_agents(node_id)
-
-        edges = []
-        for agent in self.heads:
-            edges += self.graph().get_relationship(
-                {
-                    "src_label": "Agent",
-                    "src_props": {"node_id": agent.node_id},
-                    "rel_types": ["NEXT"]
-                }
-            )
-        self.edges = []
-        for k, _, v in edges:
-            self.incomes[v['node_id']].add(k['node_id'])
-            self.edges.append((k['node_id'], v['node_id']))
-
-    async def run_agent(self, ctx, prev, current):
-        ret = await current.invoke(ctx)
-        if isinstance(ret, dict):
-            if tool_name := ret.get("tool_name"):
-                agents = [agent for agent in self.nodes.values() if agent.name == tool_name]
-                if agents:
-                    return await self.run_agent(ctx, current, agents[0])
-        edges = self.graph().get_relationship({
-            "src_label": "Agent",
-            "src_props": {"node_id": current.node_id},
-            "rel_types": ["NEXT"],
-            "hop_num": 1})
-        return await self.run_agents(ctx, current, [self.nodes[nxt['node_id']] for _, _, nxt in edges])
-
-    async def run_agents(self, ctx, src, agents):
-        return await asyncio.gather(*[self.run_agent(ctx, src, target) for target in agents])
-
-    async def run_agents_with_terminate(self, ctx, nodes):
-        await self.run_agents(ctx, None, nodes)
-        await self.terminate()
-
-    async def run(self, options=None):
-        self.update_heads()
-        self.ctx = self.runner.new_run(self.incomes)
-        asyncio.create_task(self.run_agents_with_terminate(self.ctx, self.heads))
-        return self.data_pipe.frontend_event_generator()
+        await self.graph().update_node("Application",
+                                       {"node_id": self.node_id},
+                                       self.app_node
+                                       )
+
+    @property
+    def nodes(self):
+        return self.topology.agents
+
+    @property
+    def heads(self):
+        return self.topology.heads
+
+    @property
+    def edges(self):
+        return self.topology.edges
+
+    @property
+    def incomes(self):
+        return self.topology.incomes
+
+    async def load_topology(self, reload=False):
+        """the agents with their NEXT/INPUT edges are read once, then kept up to date by the methods below"""
+        if self.topology.loaded and not reload:
+            return self.topology
+        neighborhood = await self.graph().get_neighborhood(
+            "Agent", {"app_id": self.node_id}, ["NEXT", "INPUT"], ["node_id"])
+        self.topology.load(neighborhood, lambda node: SuperAgent(self, node))
+        return self.topology
+
+    async def execution_plan(self):
+        """the plan of the current topology, compiled again after it changed"""
+        topology = await self.load_topology()
+        if self.plan is None or self.plan.version != topology.version:
+            self.plan = ExecutionPlan.compile(topology)
+        return self.plan
+
+    async def run_plan(self, ctx, plan):
+        async def invoke(node_id):
+            async with self.owner().scheduler.slot(self.node_id):
+                return await self.nodes[node_id].invoke(ctx)
+
+        await PlanScheduler(plan, invoke).run()
+        await self.terminate(ctx)
+
+    async def run(self, options=None, last_event_id=None):
+        # a reconnect replays the buffered events of its run instead of running again
+        if last_event_id:
+            return self.data_pipe.resume(last_event_id)
+        plan = await self.execution_plan()
+        # every run has its own context, a run still going on keeps its app_ctx_id
+        self.ctx = await AppRunContext(self).new_run(self.incomes)
+        stream = self.data_pipe.frontend_event_generator(self.ctx.node_id)
+        asyncio.create_task(self.run_plan(self.ctx, plan))
+        return stream
 
     def get_data_pipe(self):
         return self.data_pipe
 
-    def get_agent_graph(self):
-        def get_agent_data(agent):
+    async def get_agent_graph(self):
+        async def get_agent_data(agent):
             agent_node = agent.config | {
-                "tools": agent.get_tools(),
-                "inputs": agent.get_input()
+                "tools": await agent.get_tools(),
+                "inputs": self.topology.get_inputs(agent.node_id)
             }
             return agent_node
-        self.update_heads()
+        await self.load_topology()
         return {
-            "nodes": [get_agent_data(agent) for agent in self.nodes.values()],
+            "nodes": [await get_agent_data(agent) for agent in self.nodes.values()],
             "edges": self.edges
         }
 
-    def del_agent(self, agent_id) -> None:
-        self.graph().delete_node("Agent", {"node_id": agent_id})
-        self.io_data.delete_data({"agent_id": agent_id})
-        if agent_id in self.nodes:
-            del self.nodes[agent_id]
+    async def del_agent(self, agent_id) -> None:
+        await self.graph().delete_node("Agent", {"node_id": agent_id})
+        await self.io_data.delete_data({"agent_id": agent_id})
+        self.topology.del_agent(agent_id)
 
-    def add_agent(self, config):
+    async def add_agent(self, config):
         config |= {"app_id": self.node_id}
-        node = self.graph().add_node("Agent", config)
-        self.update_heads()
+        await self.load_topology()
+        node = await self.graph().add_node("Agent", config)
+        self.topology.add_agent(SuperAgent(self, node))
         return node
 
-    def add_edge(self, src, target):
-        r = self.graph().add_relationship(
+    async def add_edge(self, src, target):
+        r = await self.graph().add_relationship(
             "Agent",
             src,
             "NEXT",
             "Agent",
             target
         )
-        target_agent = self.nodes[target]
-        src_agent = self.nodes[src]
-        target_agent.add_input(src_agent.node_id)
+        await self.load_topology()
+        if r.get("status") == "successfully":
+            self.topology.add_edge(src, target)
+        await self.agent_add_input(target, src)
         return r
 
-    def del_edge(self, src, target):
-        self.graph().delete_relationship(
+    async def del_edge(self, src, target):
+        await self.graph().delete_relationship(
             {
                 "src_label": "Agent",
                 "src_props": {"node_id": src},
@@ -279,7 +294,7 @@ class Application:
                 "hop_num": 1
             }
         )
-        self.graph().delete_relationship(
+        await self.graph().delete_relationship(
             {
                 "src_label": "Agent",
                 "src_props": {"node_id": target},
@@ -288,62 +303,71 @@ class Application:
                 "hop_num": 1
             }
         )
+        self.topology.del_edge(src, target)
+        self.topology.del_input(target, src)
 
 
     async def get_agent(self, agent_id):
-        self.update_heads()
-        if agent_id in self.nodes:
-            return self.nodes[agent_id]
-        return None
+        await self.load_topology()
+        return self.topology.get(agent_id)
 
     async def update_agent(self, agent_id, config):
-        self.update_heads()
-        if agent_id in self.nodes:
-            agent = self.nodes[agent_id]
+        await self.load_topology()
+        agent = self.topology.get(agent_id)
+        if agent is not None:
+            name = agent.name
             agent.config |= config
             agent.name = agent.config.get("name", agent.name)
-            agent.save_config()
+            self.topology.rename(agent_id, name)
+            await agent.save_config()
             return agent
         return None
 
     async def feedback(self, message):
-        feedback = json.loads(message)
-        await self.data_pipe.write_to_frontend(self.node_id, '', feedback.get("data", {}).get("description", "操作完成"), 'user')
-        await self.data_pipe.put_to_input_queue(
-            json.dumps(feedback | {"app_id": self.node_id}))
+        feedback = json.loads(message) | {"app_id": self.node_id}
+        if not self.data_pipe.put_feedback(feedback):
+            return {"status": "error", "reason": "no agent is waiting for this feedback."}
+        await self.data_pipe.write_to_frontend(self.node_id, '', feedback.get("data", {}).get("description", "操作完成"), 'user',
+                                               ctx_id=feedback.get("app_ctx_id"))
         return {"status": "successfully"}
 
 
-    async def terminate(self):
-        await self.data_pipe.write_to_frontend(self.node_id, '', '\e')
-        await self.data_pipe.stop_streaming()
+    async def terminate(self, ctx=None):
+        ctx_id = (ctx or self.ctx).node_id
+        await self.data_pipe.write_to_frontend(self.node_id, '', '\e', ctx_id=ctx_id)
+        await self.data_pipe.stop_streaming(ctx_id)
 
 
     async def get_agent_runnable(self, agent_id):
-        self.update_heads()
-        agent = self.nodes.get(agent_id)
+        await self.load_topology()
+        agent = self.topology.get(agent_id)
         if agent is None:
             return {"status": "error", "reason": f"agent: {agent_id} is not found!"}
         if self.ctx is None:
-            self.ctx = self.runner.new_run(self.incomes)
-        if agent.is_callable(self.ctx):
+            self.ctx = await AppRunContext(self).new_run(self.incomes)
+        if await agent.is_callable(self.ctx):
             return {"status": "successfully"}
         return {"status": "error", "reason": "some previous agents are not invoked beforehand."}
 
-    async def agent_run(self, agent_id):
+    async def agent_run(self, agent_id, last_event_id=None):
         async def run_agent(ag, ctx):
-            await ag.invoke(ctx)
-            await self.terminate()
+            async with self.owner().scheduler.slot(self.node_id):
+                await ag.invoke(ctx)
+            await self.terminate(ctx)
 
-        self.update_heads()
-        agent = self.nodes.get(agent_id)
-        if agent is None:
-            self.data_pipe.write_to_frontend(self.node_id, agent_id, f"\e{agent_id} is not found!")
-            return self.data_pipe.frontend_event_generator()
+        if last_event_id:
+            return self.data_pipe.resume(last_event_id)
+        await self.load_topology()
         if self.ctx is None:
-            self.ctx = self.runner.new_run(self.incomes)
+            self.ctx = await AppRunContext(self).new_run(self.incomes)
+        stream = self.data_pipe.frontend_event_generator(self.ctx.node_id)
+        agent = self.topology.get(agent_id)
+        if agent is None:
+            await self.data_pipe.write_to_frontend(self.node_id, agent_id, f"\e{agent_id} is not found!", ctx_id=self.ctx.node_id)
+            await self.data_pipe.end_stream(self.ctx.node_id)
+            return stream
         asyncio.create_task(run_agent(agent, self.ctx))
-        return self.data_pipe.frontend_event_generator()
+        return stream
 
     async def get_available_inputs(self, agent_id):
         return {
@@ -355,26 +379,28 @@ class Application:
         agent = self.nodes.get(agent_id)
         if agent is None:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
-        agent.add_input(input_agent_id)
+        await agent.add_input(input_agent_id)
+        self.topology.add_input(agent_id, input_agent_id)
         return {"status": "successfully"}
 
     async def agent_del_input(self, agent_id: str, input_agent_id: str):
         agent = self.nodes.get(agent_id)
         if agent is None:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
-        agent.del_input(input_agent_id)
+        await agent.del_input(input_agent_id)
+        self.topology.del_input(agent_id, input_agent_id)
         return {"status": "successfully"}
 
     async def agent_get_input(self, agent_id: str):
         agent = self.nodes.get(agent_id)
         if agent is None:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
-        return {"status": "successfully", "data": agent.get_input()}
+        return {"status": "successfully", "data": await agent.get_input()}
 
     async def agent_get_io_detail(self, agent_id: str):
         if self.ctx is None:
             return {"status": "error", "reason": "running context is not initialized!"}
-        nodes = self.io_data.find_node({
+        nodes = await self.io_data.find_node({
             "app_id": self.owner().node_id,
             "agent_id": agent_id,
             "app_ctx_id": self.ctx.node_id
@@ -384,28 +410,25 @@ class Application:
         return nodes[0]
 
     async def update_tools(self):
-        self.tools = {tool['name']: tool
-            for tool in self.graph().get_node("Tool", {"app_id": self.node_id})}
-
-        mcp_client = Client(self.transport,
-                            roots=[f"file://{self.node_id}"]
-        )
-        async with mcp_client:
-            tools = await mcp_client.list_tools()
-            for tool in tools:
-                if tool.name not in self.tools:
-                    tool_node = self.graph().add_node("Tool", {
-                        "app_id": self.node_id,
-                        "name": tool.name,
-                        "title": tool.title,
-                        "description": tool.description,
-                        "inputSchema": tool.inputSchema,
-                        "icons": tool.icons,
-                        "annotations": tool.annotations,
-                        "meta": tool.meta
-                    })
-                    self.tools[tool.name] = tool_node
+        fingerprint, catalog = await self.owner().tool_catalog.get()
+        if self.tools is not None and self.app_node.get("tools_fingerprint") == fingerprint:
+            return
 
+        self.tools = {tool['name']: tool
+            for tool in await self.graph().get_node("Tool", {"app_id": self.node_id})}
+        # the Tool nodes are only written when the server build changed
+        if self.app_node.get("tools_fingerprint") != fingerprint or not self.tools:
+            for tool in catalog:
+                props = {k: tool.get(k) for k in TOOL_FIELDS}
+                tool_node = self.tools.get(tool["name"])
+                if tool_node is None:
+                    self.tools[tool["name"]] = await self.graph().add_node("Tool", {"app_id": self.node_id} | props)
+                elif any(tool_node.get(k) != v for k, v in props.items()):
+                    tool_node |= props
+                    # update_node replaces all properties, the node is written with its node_id and app_id
+                    await self.graph().update_node("Tool", {"node_id": tool_node["node_id"]},
+                                                   {k: v for k, v in tool_node.items() if k != "label"})
+            await self.update_node({"tools_fingerprint": fingerprint})
 
     async def list_tools(self):
         await self.update_tools()
@@ -415,40 +438,41 @@ class Application:
         agent = self.nodes.get(agent_id)
         if agent is None:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
-        agent.add_tool(tool_id)
+        await agent.add_tool(tool_id)
         return {"status": "successfully"}
 
     async def agent_del_tool(self, agent_id, tool_id):
         agent = self.nodes.get(agent_id)
         if agent is None:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
-        agent.del_tool(tool_id)
+        await agent.del_tool(tool_id)
         return {"status": "successfully"}
 
     async def agent_get_tools(self, agent_id):
         agent = self.nodes.get(agent_id)
         if agent is None:
             return []
-        return agent.get_tools()
+        return await agent.get_tools()
 
-    def list_appctx(self):
-        return self.runner.list_run()
+    async def list_appctx(self, skip_token=None, limit=None):
+        return await self.runner.list_run(skip_token, limit)
 
-    def select_appctx(self, app_ctx_id: str|None=None):
-        self.update_heads()
+    async def select_appctx(self, app_ctx_id: str|None=None):
+        await self.load_topology()
         if app_ctx_id is None:
-            runs = self.runner.list_run()
+            runs = await self.runner.list_run()
             if not runs:
                 return None
             app_ctx_id = runs[-1]["node_id"]
 
-        self.ctx = self.runner.get_run(app_ctx_id, self.incomes)
+        self.ctx = await AppRunContext(self).get_run(app_ctx_id, self.incomes)
         return self.ctx
 
-    def delete_appctx(self, app_ctx_id: str):
-        self.runner.del_run(app_ctx_id)
+    async def delete_appctx(self, app_ctx_id: str):
+        await self.runner.del_run(app_ctx_id)
+        self.data_pipe.drop_channel(app_ctx_id)
         if app_ctx_id == self.ctx.node_id:
-            self.ctx = self.select_appctx()
+            self.ctx = await self.select_appctx()
 
 
     async def agent_get_data(self, agent_id, type, content):
@@ -457,7 +481,7 @@ class Application:
             return {"status": "error", "data": f"agent: {agent_id} is not found!"}
         if self.ctx is None:
             return {"status": "error", "data": f"agent output has not been generated!"}
-        data = agent.get_data(self.ctx, type, content)
+        data = await agent.get_data(self.ctx, type, content)
         if data is None:
             return {"status": "error", "data": f"agent output is None!"}
         return {"status": "successfully", "data": data}
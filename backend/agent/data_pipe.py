@@ -1,73 +1,304 @@
 import json
+import os
+import tempfile
+import time
 import weakref
 import asyncio
-from typing import Any
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import islice
+from pathlib import Path
 import logging
-import traceback
 
 log = logging.getLogger(__name__)
 log.setLevel('INFO')
 
+# events kept per run for replay, and runs kept per application
+EVENT_BUFFER_SIZE = int(os.environ.get("EVENT_BUFFER_SIZE", "2000"))
+EVENT_CHANNELS = int(os.environ.get("EVENT_CHANNELS", "8"))
+# seconds the end of a run waits for its subscribers to read the last events
+STREAM_DRAIN_TIMEOUT = float(os.environ.get("STREAM_DRAIN_TIMEOUT", "30"))
 
-class HybridQueue:
-    def __init__(self, maxsize: int = 0):
-        """Initialize the hybrid queue with an asyncio.Queue."""
-        self.loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=maxsize)
+# output policy of the run streams:
+#   STREAM_COALESCE_WINDOW: seconds within which adjacent appends of the same agent/thread are merged into one event, 0 = off
+#   STREAM_BACKPRESSURE: what happens to the events a lagging subscriber has not read yet when the buffer is full
+#       drop_oldest - they are dropped, the subscriber continues after a gap
+#       block - the writer waits for the subscriber, at most STREAM_BLOCK_TIMEOUT seconds, then they are dropped
+#       spill - they are moved to a file in STREAM_SPILL_DIR and read back from there
+#   STREAM_HEARTBEAT: seconds without events after which a subscriber gets a heartbeat line, 0 = off
+STREAM_COALESCE_WINDOW = float(os.environ.get("STREAM_COALESCE_WINDOW", "0.05"))
+STREAM_BACKPRESSURE = os.environ.get("STREAM_BACKPRESSURE", "spill")
+STREAM_BLOCK_TIMEOUT = float(os.environ.get("STREAM_BLOCK_TIMEOUT", "5"))
+STREAM_SPILL_DIR = os.environ.get("STREAM_SPILL_DIR", os.path.join(tempfile.gettempdir(), "onenode_streams"))
+STREAM_HEARTBEAT = float(os.environ.get("STREAM_HEARTBEAT", "15"))
 
-    async def async_put(self, item: Any) -> None:
-        """Asynchronous method to put an item into the queue."""
-        await self.queue.put(item)
+# the last event of a run's stream, a subscriber stops after it
+END_OF_STREAM = {"channel": "control", "command": "eos"}
+# keeps proxies from closing an idle stream, not sequenced
+HEARTBEAT = json.dumps({"channel": "control", "command": "heartbeat"})+'\n'
 
-    async def async_get(self) -> Any:
-        """Asynchronous method to get an item from the queue."""
-        return await self.queue.get()
 
-    def sync_put(self, item: Any, timeout: float = None) -> None:
-        """Synchronous method to put an item into the queue."""
-        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
-        future.result(timeout=timeout)
+class SpillFile:
+    """
+    the events moved out of the ring buffer of a channel, in seq order, read back by their offsets.
+    Only the events a subscriber had not read yet are moved here, the seqs may have gaps.
+    """
 
-    def sync_get(self, timeout: float = None) -> Any:
-        """Synchronous method to get an item from the queue."""
-        future = asyncio.run_coroutine_threadsafe(self.queue.get(), self.loop)
-        return future.result(timeout=timeout)
+    def __init__(self, path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "w+b")
+        self.seqs = []  # seq of every event
+        self.offsets = []  # (offset, is_end) of every event
 
-    def task_done(self) -> None:
-        """Mark a task as done, usable from both sync and async contexts."""
-        self.queue.task_done()
+    def append(self, seq, line, is_end):
+        self.file.seek(0, os.SEEK_END)
+        self.seqs.append(seq)
+        self.offsets.append((self.file.tell(), is_end))
+        self.file.write(line.encode())
 
-    def qsize(self) -> int:
-        """Return the approximate size of the queue."""
-        return self.queue.qsize()
+    def read_after(self, seq, limit):
+        start = bisect_right(self.seqs, seq)
+        chunk = self.offsets[start:start + limit]
+        if not chunk:
+            return []
+        self.file.flush()
+        self.file.seek(chunk[0][0])
+        return [(self.seqs[start + i], self.file.readline().decode(), is_end) for i, (_, is_end) in enumerate(chunk)]
+
+    def close(self):
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class EventChannel:
+    """
+    The events of one run (app_ctx_id), numbered by seq. The last buffer_size events are kept in a ring buffer,
+    every subscriber reads them at its own pace, and a reconnecting one continues after the last seq it received.
+    An event carries its id "<app_ctx_id>:<seq>", the Last-Event-ID of a resume.
+    close() appends END_OF_STREAM, drained is set once every subscriber has read up to it or went away.
+    See STREAM_BACKPRESSURE and STREAM_COALESCE_WINDOW for what is done with lagging subscribers and bursts of appends.
+    """
+
+    def __init__(self, ctx_id, buffer_size=EVENT_BUFFER_SIZE, policy=STREAM_BACKPRESSURE,
+                 coalesce_window=STREAM_COALESCE_WINDOW):
+        self.ctx_id = ctx_id
+        self.buffer = deque()  # (seq, line, is_end)
+        self.buffer_size = max(1, buffer_size)
+        self.policy = policy
+        self.coalesce_window = coalesce_window
+        self.seq = 0
+        self.end_seq = None  # seq of the last END_OF_STREAM
+        self.running = True
+        self.cursors = {}  # subscriber -> seq of the last event it received
+        self.spill = None
+        self.dropped = 0
+        self._pending = None  # (key, event) of the append being coalesced
+        self._flush_handle = None
+        self._published = None  # set when an event was appended
+        self._advanced = None  # set when a subscriber read an event
+        self._drained = None
+
+    @staticmethod
+    def _signal(event):
+        if event is not None:
+            event.set()
+
+    def _wait_published(self):
+        if self._published is None:
+            self._published = asyncio.Event()
+        return self._published.wait()
+
+    def _wait_advanced(self):
+        if self._advanced is None:
+            self._advanced = asyncio.Event()
+        return self._advanced.wait()
+
+    @property
+    def drained(self):
+        if self._drained is None:
+            self._drained = asyncio.Event()
+        return self._drained
+
+    def _check_drained(self):
+        if self.end_seq is not None and all(seq >= self.end_seq for seq in self.cursors.values()):
+            self.drained.set()
+
+    def _lagging(self, seq):
+        return any(cursor < seq for cursor in self.cursors.values())
+
+    def _append(self, event, is_end=False):
+        self.seq += 1
+        self.running = not is_end
+        if is_end:
+            self.end_seq = self.seq
+            self.drained.clear()
+        self.buffer.append((self.seq, json.dumps(event | {"id": f"{self.ctx_id}:{self.seq}"})+'\n', is_end))
+        while len(self.buffer) > self.buffer_size:
+            seq, line, end = self.buffer[0]
+            if self.policy == "block" and self._lagging(seq):
+                # kept until the lagging subscriber read it, see _room
+                break
+            self.buffer.popleft()
+            if not self._lagging(seq):
+                # every subscriber has read it
+                continue
+            if self.policy == "spill":
+                if self.spill is None:
+                    self.spill = SpillFile(Path(STREAM_SPILL_DIR) / f"{self.ctx_id}.{os.getpid()}.jsonl")
+                self.spill.append(seq, line, end)
+            else:
+                self.dropped += 1
+        published, self._published = self._published, None
+        self._signal(published)
+        self._check_drained()
+
+    async def _room(self):
+        """with the block policy, wait until the lagging subscribers made room in the buffer"""
+        if self.policy != "block":
+            return
+        deadline = time.monotonic() + STREAM_BLOCK_TIMEOUT
+        while len(self.buffer) >= self.buffer_size and self._lagging(self.buffer[0][0]):
+            try:
+                await asyncio.wait_for(self._wait_advanced(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                # a slow client must not stall the run for longer
+                while len(self.buffer) >= self.buffer_size:
+                    self.buffer.popleft()
+                    self.dropped += 1
+                log.warning(f"run {self.ctx_id}: a subscriber lags more than {STREAM_BLOCK_TIMEOUT}s, events dropped")
+                return
+
+    @staticmethod
+    def _coalesce_key(event):
+        if event.get("command") != "append" or not isinstance(event.get("data"), dict):
+            return None
+        data = event["data"]
+        return event.get("channel"), event.get("role"), event.get("thread"), data.get("agent_id"), data.get("type"), data.get("delta", False)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending is not None:
+            _, event = self._pending
+            self._pending = None
+            self._append(event)
+
+    async def publish(self, event, is_end=False):
+        key = None if is_end or self.coalesce_window <= 0 else self._coalesce_key(event)
+        if self._pending is not None:
+            if key is not None and key == self._pending[0]:
+                # the frontend shows adjacent appends of one role as paragraphs of one message, deltas as one text
+                sep = "" if event["data"].get("delta") else "\n\n"
+                self._pending[1]["data"]["content"] += sep + event["data"]["content"]
+                return
+            self._flush()
+        await self._room()
+        if key is not None:
+            self._pending = (key, event | {"data": dict(event["data"])})
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self._flush)
+            return
+        self._append(event, is_end)
+
+    async def close(self):
+        await self.publish(END_OF_STREAM, is_end=True)
+
+    def release(self):
+        """the channel is forgotten, its spill file removed"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def events_after(self, seq):
+        first = self.buffer[0][0] if self.buffer else self.seq + 1
+        if seq + 1 < first and self.spill is not None:
+            if events := self.spill.read_after(seq, self.buffer_size):
+                if events[0][0] > seq + 1:
+                    log.warning(f"run {self.ctx_id}: events {seq + 1}..{events[0][0] - 1} are no longer buffered")
+                return events
+        if seq + 1 < first:
+            log.warning(f"run {self.ctx_id}: events {seq + 1}..{first - 1} are no longer buffered")
+        return list(islice(self.buffer, max(0, seq + 1 - first), None))
+
+    async def subscribe(self, after, resume=False):
+        """the events after seq `after` up to the end of the run, with heartbeats while there are none"""
+        token = object()
+        self.cursors[token] = after
+        try:
+            while True:
+                if resume and not self.running and self.seq <= after:
+                    # the run ended before the subscriber went away
+                    return
+                if self.seq <= after:
+                    try:
+                        await asyncio.wait_for(self._wait_published(), STREAM_HEARTBEAT or None)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT
+                    continue
+                for seq, line, is_end in self.events_after(after):
+                    # the event is handed to the subscriber, it no longer lags behind it
+                    after = self.cursors[token] = seq
+                    advanced, self._advanced = self._advanced, None
+                    self._signal(advanced)
+                    yield line
+                    if is_end:
+                        return
+        finally:
+            del self.cursors[token]
+            advanced, self._advanced = self._advanced, None
+            self._signal(advanced)
+            self._check_drained()
 
 
 class DataPipe:
     def __init__(self, owner):
         self.owner = weakref.ref(owner)
-        self.in_q = HybridQueue(1000)
-        self.out_q = HybridQueue(1000)
-        self.out_q_quit = False
-
-    async def frontend_event_generator(self):
-        self.out_q_quit = False
-        log.info("frontend_event_generator start")
-        while not self.out_q_quit:
-            item = await self.out_q.async_get()
-            log.info(f"frontend_event_generator, async_get() = {item}")
-            self.out_q.task_done()
-            yield item
-            try:
-                message_object = json.loads(item)
-                if message_object.get("command") == "end":
+        self.channels = OrderedDict()  # app_ctx_id -> EventChannel, least recently used first
+        self.feedbacks = {}  # (app_id, app_ctx_id, agent_id, request_id) -> future of the pending elicitation
+
+    def channel(self, ctx_id):
+        channel = self.channels.get(ctx_id)
+        if channel is None:
+            channel = self.channels[ctx_id] = EventChannel(ctx_id)
+            for old_id in list(self.channels):
+                if len(self.channels) <= EVENT_CHANNELS:
                     break
-            except Exception as e:
-                log.info(e)
-                log.info(traceback.format_exc())
-                pass
-        self.in_q = HybridQueue(1000)
-        self.out_q = HybridQueue(1000)
-        log.info("frontend_event_generator exit")
+                old = self.channels[old_id]
+                # a run somebody still reads is kept
+                if old is not channel and not old.cursors and not old.running:
+                    del self.channels[old_id]
+                    old.release()
+        self.channels.move_to_end(ctx_id)
+        return channel
+
+    def drop_channel(self, ctx_id):
+        if (channel := self.channels.pop(ctx_id, None)) is not None:
+            channel.release()
+
+    def frontend_event_generator(self, ctx_id):
+        """the events of run ctx_id written from now on, until its end"""
+        log.info(f"frontend_event_generator start, app_ctx_id: {ctx_id}")
+        channel = self.channel(ctx_id)
+        return channel.subscribe(channel.seq)
+
+    def resume(self, last_event_id):
+        """
+        the events after last_event_id ("<app_ctx_id>:<seq>"). A run that is not known (any more) gets a stream
+        of END_OF_STREAM only, a reconnect never starts the run again.
+        """
+        ctx_id, _, seq = (last_event_id or "").strip().rpartition(":")
+        if not seq.isdigit() or ctx_id not in self.channels:
+            log.info(f"frontend_event_generator resume, unknown Last-Event-ID: {last_event_id}")
+            return self.end_of_stream()
+        log.info(f"frontend_event_generator resume, Last-Event-ID: {last_event_id}")
+        return self.channel(ctx_id).subscribe(int(seq), resume=True)
+
+    @staticmethod
+    async def end_of_stream():
+        yield json.dumps(END_OF_STREAM)+'\n'
 
     def print(self):
         pass
@@ -75,31 +306,69 @@ class DataPipe:
     def set_provider(self):
         pass
 
-    async def write_to_frontend(self, app_id, agent_id, message, role='', type='markdown', channel='prompt', thread=''):
-        if message == '\b' or message == '\r':
-            await self.out_q.async_put(json.dumps({'channel': channel, 'command': 'rewind', 'role': role, 'data': 1, 'thread': thread})+'\n')
+    async def write_to_frontend(self, app_id, agent_id, message, role='', type='markdown', channel='prompt', thread='',
+                                ctx_id=None, delta=False):
+        """delta: message is a piece of a streamed text, appended to the agent's previous piece as it is"""
+        if ctx_id is None:
+            # the current run of the application
+            ctx = self.owner().ctx
+            if ctx is None:
+                log.warning(f"no run to write to: {message}")
+                return
+            ctx_id = ctx.node_id
+        if delta:
+            if message == '':
+                return
+            # a streamed piece is never a control message
+            event = {'channel': channel, 'command': 'append', 'role': role, 'data': {'app_id': app_id, 'agent_id': agent_id, 'type': type, 'content': message, 'delta': True}, 'thread': thread}
+        elif message == '\b' or message == '\r':
+            event = {'channel': channel, 'command': 'rewind', 'role': role, 'data': 1, 'thread': thread}
         elif message == '\a':
-            await self.out_q.async_put(json.dumps({'channel': channel, 'command': 'anchor_start', 'role': role, 'data': 1, 'thread': thread})+'\n')
+            event = {'channel': channel, 'command': 'anchor_start', 'role': role, 'data': 1, 'thread': thread}
         elif message.startswith(r'\s'):
-            await self.out_q.async_put(json.dumps({'channel': 'progress', 'command': 'new_step', 'role': role, 'data': {'type': type, 'content': message[2:]}, 'thread': thread})+'\n')
+            event = {'channel': 'progress', 'command': 'new_step', 'role': role, 'data': {'type': type, 'content': message[2:]}, 'thread': thread}
         elif message.startswith(r'\e'):
-            await self.out_q.async_put(json.dumps({'channel': 'control', 'command': 'end', 'role': role, 'data': {'type': type, 'content': message[2:]}, 'thread': thread})+'\n')
+            event = {'channel': 'control', 'command': 'end', 'role': role, 'data': {'type': type, 'content': message[2:]}, 'thread': thread}
         elif message.startswith(r'\u'):
-            await self.out_q.async_put(message[2:]+'\n')
+            event = json.loads(message[2:])
         elif message != '':
-            await self.out_q.async_put(json.dumps({'channel': channel, 'command': 'append', 'role': role, 'data': {'app_id': app_id, 'agent_id': agent_id, 'type': type, 'content': message},'thread': thread})+'\n')
+            event = {'channel': channel, 'command': 'append', 'role': role, 'data': {'app_id': app_id, 'agent_id': agent_id, 'type': type, 'content': message},'thread': thread}
+        else:
+            return
+        await self.channel(ctx_id).publish(event)
 
-        # log.info(f"out_q.async_put({message})")
+    async def end_stream(self, ctx_id):
+        await self.channel(ctx_id).close()
 
-    async def stop_streaming(self):
-        while (self.out_q.qsize() > 0):
-            await asyncio.sleep(1)
-        self.out_q_quit = True
+    async def stop_streaming(self, ctx_id, timeout=STREAM_DRAIN_TIMEOUT):
+        """end the stream of run ctx_id and wait until its subscribers have read it"""
+        channel = self.channel(ctx_id)
+        await channel.close()
+        try:
+            await asyncio.wait_for(channel.drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            # a subscriber that went away without closing its stream is not waited for
+            log.info(f"run {ctx_id}: subscribers did not read the end of the stream in {timeout}s")
         log.info("stop streaming")
 
-    async def read_from_frontend(self):
-        return await self.in_q.async_get()
+    def expect_feedback(self, app_id, ctx_id, agent_id, request_id):
+        """future of the frontend's feedback to the elicitation request_id, registered before the query is sent"""
+        key = (app_id, ctx_id, agent_id, request_id)
+        future = asyncio.get_running_loop().create_future()
+        self.feedbacks[key] = future
+        future.add_done_callback(lambda f: self.feedbacks.pop(key, None))
+        return future
 
-    async def put_to_input_queue(self, message):
-        await self.in_q.async_put(message)
-        log.info(f"in_q.async_put({message})")
+    def put_feedback(self, feedback):
+        """resolve the elicitation the feedback answers, False if none is waiting for it"""
+        key = (feedback.get("app_id"), feedback.get("app_ctx_id"), feedback.get("agent_id"), feedback.get("request_id"))
+        future = self.feedbacks.get(key)
+        if future is None and key[3] is None:
+            # a frontend that does not send the request id back answers the oldest elicitation of the agent
+            future = next((f for (app_id, _, agent_id, _), f in self.feedbacks.items()
+                           if (app_id, agent_id) == (key[0], key[2]) and not f.done()), None)
+        if future is None or future.done():
+            log.info(f"no elicitation is waiting for feedback: {key}")
+            return False
+        future.set_result(feedback)
+        return True
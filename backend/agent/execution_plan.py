@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+
+class ExecutionPlan:
+    """
+    The workflow of an application compiled before a run: the NEXT edges in topological levels,
+    the number of previous agents of every agent (its join counter) and the agents a result can
+    route to by name ({"tool_name": name}).
+    """
+
+    def __init__(self, levels, prev, next, routes, version=None):
+        self.levels = levels  # [[node_id, ...], ...], level 0 are the heads
+        self.prev = prev  # node_id -> node_ids of the previous agents
+        self.next = next  # node_id -> node_ids of the next agents
+        self.routes = routes  # agent name -> node_id
+        self.version = version
+
+    @classmethod
+    def compile(cls, topology):
+        prev = {node_id: [src for src in topology.prev.get(node_id, {}) if src in topology.agents]
+                for node_id in topology.agents}
+        nexts = {node_id: [dest for dest in topology.next.get(node_id, {}) if dest in topology.agents]
+                 for node_id in topology.agents}
+        # Kahn's algorithm, level by level
+        remaining = {node_id: len(srcs) for node_id, srcs in prev.items()}
+        level = [node_id for node_id, count in remaining.items() if count == 0]
+        levels = []
+        while level:
+            levels.append(level)
+            next_level = []
+            for node_id in level:
+                for dest in nexts[node_id]:
+                    remaining[dest] -= 1
+                    if remaining[dest] == 0:
+                        next_level.append(dest)
+            level = next_level
+        if cyclic := [node_id for node_id, count in remaining.items() if count > 0]:
+            log.warning(f"agents on a NEXT cycle are never scheduled: {cyclic}")
+        routes = {name: next(iter(agents)) for name, agents in topology.by_name.items() if agents}
+        return cls(levels, prev, nexts, routes, topology.version)
+
+    @property
+    def heads(self):
+        return self.levels[0] if self.levels else []
+
+    def route(self, result):
+        """the agent a result routes to, or None"""
+        if isinstance(result, dict) and (tool_name := result.get("tool_name")):
+            return self.routes.get(tool_name)
+        return None
+
+
+class PlanScheduler:
+    """
+    Run an ExecutionPlan: every agent is dispatched exactly once, as soon as all of its previous
+    agents are resolved. A result routing to another agent dispatches that agent at once and skips
+    the next agents of the routing one; an agent whose previous agents were all skipped is skipped
+    as well, so the skip propagates down the graph.
+    """
+
+    def __init__(self, plan, invoke):
+        """invoke: async function node_id -> result of the agent"""
+        self.plan = plan
+        self.invoke = invoke
+        self.pending = {node_id: len(srcs) for node_id, srcs in plan.prev.items()}
+        self.completed = defaultdict(int)  # node_id -> previous agents that ran
+        self.state = {}  # node_id -> running | done | skipped
+        self.tasks = set()
+
+    def dispatch(self, node_id):
+        """start the agent, False if it already ran, runs or was skipped in this run"""
+        if node_id in self.state:
+            return False
+        self.state[node_id] = "running"
+        self.tasks.add(asyncio.create_task(self.run_agent(node_id)))
+        return True
+
+    async def run_agent(self, node_id):
+        try:
+            result = await self.invoke(node_id)
+        except Exception as e:
+            log.error(f"agent {node_id} failed: {e}")
+            result = None
+        route = self.plan.route(result)
+        routed = route is not None and self.dispatch(route)
+        if route is not None and not routed:
+            # every agent runs once per run, the workflow goes on along the NEXT edges instead of stopping
+            log.warning(f"agent {node_id} routes to {route}, which is already {self.state[route]}, the route is ignored")
+        self.state[node_id] = "done"
+        for dest in self.plan.next.get(node_id, []):
+            self.resolve(dest, skipped=routed)
+
+    def resolve(self, node_id, skipped):
+        self.pending[node_id] -= 1
+        if not skipped:
+            self.completed[node_id] += 1
+        if self.pending[node_id] > 0 or node_id in self.state:
+            return
+        if self.completed[node_id]:
+            self.dispatch(node_id)
+        else:
+            self.state[node_id] = "skipped"
+            for dest in self.plan.next.get(node_id, []):
+                self.resolve(dest, skipped=True)
+
+    async def run(self):
+        for node_id in self.plan.heads:
+            self.dispatch(node_id)
+        while self.tasks:
+            done, _ = await asyncio.wait(self.tasks, return_when=asyncio.FIRST_COMPLETED)
+            self.tasks -= done
+        return self.state
@@ -32,6 +32,8 @@ import logging
 import mcp_bus.local_service as lsv
 import aiohttp
 from agent.application_manager import ApplicationManager
+from utils.iv3_client import close_session
+from models.graph_db import graph_query, next_skip_token
 from mimetypes import guess_type
 
 
@@ -47,11 +49,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Token"],
 )
 
 app.state.app_man = ApplicationManager()
 
 
+@app.on_event("shutdown")
+async def close_sessions():
+    await app.state.app_man.mcp_pool.close()
+    await close_session()
+
+
 ####        Agent System     ####
 
 
@@ -141,8 +150,8 @@ class AgentGetDataForm(BaseModel):
 @app.get("/application/run/{app_id}")
 async def application_run(app_id: str, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(app_id)
-        response = await agent_app.run()
+        agent_app = await app.state.app_man.get_application(app_id)
+        response = await agent_app.run(last_event_id=request.headers.get("last-event-id"))
         return StreamingResponse(
             response,
             media_type = "text/event-stream",
@@ -164,7 +173,7 @@ async def application_run(app_id: str, request: Request, user=Depends(get_curren
 @app.post("/application/new_app")
 async def application_new(new_app: NewAppForm, request: Request, user=Depends(get_current_user)):
     try:
-        return app.state.app_man.add_application(new_app.name, new_app.options)
+        return await app.state.app_man.add_application(new_app.name, new_app.options)
 
     except Exception as e:
         log.info(e)
@@ -177,7 +186,7 @@ async def application_new(new_app: NewAppForm, request: Request, user=Depends(ge
 @app.get("/application/get_app/{app_id}")
 async def application_get_app(app_id: str, request: Request, user=Depends(get_current_user)):
     try:
-        app_node = app.state.app_man.load_application(name=None, app_id=app_id)
+        app_node = await app.state.app_man.load_application(name=None, app_id=app_id)
         if app_node is None:
             return {"status": "error", "data": f"{app_id} is not found!"}
         return {"status": "successfully", "data": app_node}
@@ -194,10 +203,10 @@ async def application_get_app(app_id: str, request: Request, user=Depends(get_cu
 @app.post("/application/update_app")
 async def application_update_app(update_form: UpdateAppForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(update_form.app_id)
+        agent_app = await app.state.app_man.get_application(update_form.app_id)
         if agent_app is None:
             return {"status": "error", "data": f"{update_form.app_id} is not found!"}
-        agent_app.update_node(update_form.config)
+        await agent_app.update_node(update_form.config)
         return {"status": "successfully"}
 
     except Exception as e:
@@ -210,12 +219,21 @@ async def application_update_app(update_form: UpdateAppForm, request: Request, u
 
 
 @app.get("/application/list_app")
-async def application_list_app(request: Request, user=Depends(get_current_user)):
+async def application_list_app(
+        request: Request,
+        response: Response,
+        skip_token: Optional[str] = None,
+        limit: Optional[int] = None,
+        user=Depends(get_current_user)):
     """
     return node instead of node_id
+    skip_token, limit: optional keyset pagination, the token of the next page is returned in X-Next-Token.
     """
     try:
-        return app.state.app_man.list_application()
+        apps = await app.state.app_man.list_application(skip_token, limit)
+        if token := next_skip_token(apps, limit):
+            response.headers["X-Next-Token"] = token
+        return apps
 
     except Exception as e:
         log.info(e)
@@ -229,7 +247,7 @@ async def application_list_app(request: Request, user=Depends(get_current_user))
 @app.delete("/application/delete_app/{app_id}")
 async def application_delete_app(app_id: str, request: Request, user=Depends(get_current_user)):
     try:
-        return app.state.app_man.del_application(app_id)
+        return await app.state.app_man.del_application(app_id)
 
     except Exception as e:
         log.info(e)
@@ -246,9 +264,9 @@ async def application_export_graph(app_id, request: Request, user=Depends(get_cu
     from mcp_bus.local_service import encode_filename_to_urlsafe
 
     try:
-        app_node = app.state.app_man.load_application(name=None, app_id=app_id)
-        agent_app = app.state.app_man.get_application(app_id)
-        nodes = agent_app.get_agent_graph()
+        app_node = await app.state.app_man.load_application(name=None, app_id=app_id)
+        agent_app = await app.state.app_man.get_application(app_id)
+        nodes = await agent_app.get_agent_graph()
         app_graph =  {
             "app": app_node,
             "workflow": nodes
@@ -293,13 +311,9 @@ async def application_import_graph(request: Request, app_id, file: UploadFile =
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="The YAML file content is empty or invalid"
             )
-        agent_app = app.state.app_man.get_application(app_id)
+        agent_app = await app.state.app_man.get_application(app_id)
         # 清空原数据
-        agent_app.graph().delete_node("Agent", {"app_id": app_id})
-        agent_app.graph().delete_node("Tool", {"app_id": app_id})
-        agent_app.graph().delete_node("AppRunCtx", {"app_id": app_id})
-        agent_app.graph().delete_node("IOData", {"app_id": app_id})
-        agent_app.graph().delete_node("Data", {"app_id": app_id})
+        await agent_app.graph().cascade_delete(app_id=app_id)
 
         app_dir = os.path.join(IS_KB_PATH, "application", app_id)
         if os.path.exists(app_dir):
@@ -307,7 +321,7 @@ async def application_import_graph(request: Request, app_id, file: UploadFile =
 
         # 更新缓存
         del app.state.app_man.app_local[app_id]
-        agent_app = app.state.app_man.get_application(app_id)
+        agent_app = await app.state.app_man.get_application(app_id)
         await agent_app.update_tools()
 
         #解析 graph_data
@@ -321,13 +335,13 @@ async def application_import_graph(request: Request, app_id, file: UploadFile =
             node_config = node.copy()
 
             node_config["app_id"] = app_id
-            created_node = agent_app.add_agent(node_config)
+            created_node = await agent_app.add_agent(node_config)
             for tool in node_config.get("tools", []):
                 tool_name = tool.get("name")
                 if tool_name in agent_app.tools:
                     new_tool_id = agent_app.tools[tool_name].get("node_id")
                     created_agent = agent_app.nodes.get(created_node["node_id"])
-                    created_agent.add_tool(new_tool_id)
+                    await created_agent.add_tool(new_tool_id)
             node_id_map[node.get("node_id")] = created_node["node_id"]
 
         for edge in edges:
@@ -336,21 +350,8 @@ async def application_import_graph(request: Request, app_id, file: UploadFile =
                 target_id = edge[1]
 
                 if src_id in node_id_map and target_id in node_id_map:
-                    agent_app.graph().add_relationship(
-                        "Agent",
-                        node_id_map[target_id],
-                        "INPUT",
-                        "Agent",
-                        node_id_map[src_id]
-                    )
-
-                    agent_app.graph().add_relationship(
-                        "Agent", 
-                        node_id_map[src_id], 
-                        "NEXT", 
-                        "Agent", 
-                        node_id_map[target_id]
-                    )
+                    # NEXT and INPUT edges, kept in the agent topology of the application
+                    await agent_app.add_edge(node_id_map[src_id], node_id_map[target_id])
 
 
         return {"status": "successfully"}
@@ -366,7 +367,7 @@ async def application_import_graph(request: Request, app_id, file: UploadFile =
 @app.post("/application/feedback")
 async def application_feedback(app_feedback: AppFeedBackForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(app_feedback.app_id)
+        agent_app = await app.state.app_man.get_application(app_feedback.app_id)
         return await agent_app.feedback(app_feedback.payload)
 
     except Exception as e:
@@ -380,8 +381,8 @@ async def application_feedback(app_feedback: AppFeedBackForm, request: Request,
 @app.post("/application/add_agent")
 async def application_add_agent(add_agent: AddAgentForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(add_agent.app_id)
-        return agent_app.add_agent(add_agent.config)
+        agent_app = await app.state.app_man.get_application(add_agent.app_id)
+        return await agent_app.add_agent(add_agent.config)
 
     except Exception as e:
         log.info(e)
@@ -394,8 +395,8 @@ async def application_add_agent(add_agent: AddAgentForm, request: Request, user=
 @app.post("/application/del_agent")
 async def application_del_agent(del_agent_form: DeleteAgentForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(del_agent_form.app_id)
-        agent_app.del_agent(del_agent_form.agent_id)
+        agent_app = await app.state.app_man.get_application(del_agent_form.app_id)
+        await agent_app.del_agent(del_agent_form.agent_id)
         return {"status": "successfully"}
 
     except Exception as e:
@@ -413,7 +414,7 @@ async def application_agent_get_agent(agent_info_form: AgentInfoForm, request: R
     有多少已经绑定的输入数据
     """
     try:
-        agent_app = app.state.app_man.get_application(agent_info_form.app_id)
+        agent_app = await app.state.app_man.get_application(agent_info_form.app_id)
         agent = await agent_app.get_agent(agent_info_form.agent_id)
         if agent is not None:
             return {"status": "successfully", "data": agent.config}
@@ -434,7 +435,7 @@ async def application_agent_update_agent(update_agent_form: UpdateAgentForm, req
     有多少已经绑定的输入数据
     """
     try:
-        agent_app = app.state.app_man.get_application(update_agent_form.app_id)
+        agent_app = await app.state.app_man.get_application(update_agent_form.app_id)
         agent = await agent_app.update_agent(update_agent_form.agent_id, update_agent_form.config)
         if agent is not None:
             return {"status": "successfully", "data": agent.config}
@@ -452,8 +453,8 @@ async def application_agent_update_agent(update_agent_form: UpdateAgentForm, req
 @app.post("/application/add_edge")
 async def application_add_edge(add_edge_form: AddEdgeForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(add_edge_form.app_id)
-        return agent_app.add_edge(add_edge_form.src_id, add_edge_form.dest_id)
+        agent_app = await app.state.app_man.get_application(add_edge_form.app_id)
+        return await agent_app.add_edge(add_edge_form.src_id, add_edge_form.dest_id)
 
     except Exception as e:
         log.info(e)
@@ -466,8 +467,8 @@ async def application_add_edge(add_edge_form: AddEdgeForm, request: Request, use
 @app.post("/application/del_edge")
 async def application_del_edge(del_edge_form: DeleteEdgeForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(del_edge_form.app_id)
-        agent_app.del_edge(del_edge_form.src_id, del_edge_form.dest_id)
+        agent_app = await app.state.app_man.get_application(del_edge_form.app_id)
+        await agent_app.del_edge(del_edge_form.src_id, del_edge_form.dest_id)
         return {"status": "successfully"}
 
     except Exception as e:
@@ -481,8 +482,8 @@ async def application_del_edge(del_edge_form: DeleteEdgeForm, request: Request,
 @app.get("/application/agent_graph/{app_id}")
 async def application_get_agent_graph(app_id, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(app_id)
-        return agent_app.get_agent_graph()
+        agent_app = await app.state.app_man.get_application(app_id)
+        return await agent_app.get_agent_graph()
 
     except Exception as e:
         log.info(e)
@@ -499,7 +500,7 @@ class AgentRunnableForm(BaseModel):
 @app.post("/application/agent/runnable")
 async def application_agent_runnable(agent_runnable_form: AgentRunnableForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(agent_runnable_form.app_id)
+        agent_app = await app.state.app_man.get_application(agent_runnable_form.app_id)
         return await agent_app.get_agent_runnable(agent_runnable_form.agent_id)
 
     except Exception as e:
@@ -514,8 +515,8 @@ async def application_agent_runnable(agent_runnable_form: AgentRunnableForm, req
 @app.post("/application/agent/run")
 async def application_agent_run(run_agent_form: AgentInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(run_agent_form.app_id)
-        response = await agent_app.agent_run(run_agent_form.agent_id)
+        agent_app = await app.state.app_man.get_application(run_agent_form.app_id)
+        response = await agent_app.agent_run(run_agent_form.agent_id, request.headers.get("last-event-id"))
 
         return StreamingResponse(
             response,
@@ -540,7 +541,7 @@ async def application_agent_run(run_agent_form: AgentInfoForm, request: Request,
 @app.post("/application/agent/add_input")
 async def application_agent_add_input(add_input_form: AgentInputForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(add_input_form.app_id)
+        agent_app = await app.state.app_man.get_application(add_input_form.app_id)
         return await agent_app.agent_add_input(add_input_form.agent_id, add_input_form.input_agent_id)
 
     except Exception as e:
@@ -554,7 +555,7 @@ async def application_agent_add_input(add_input_form: AgentInputForm, request: R
 @app.post("/application/agent/del_input")
 async def application_agent_del_input(del_input_form: AgentInputForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(del_input_form.app_id)
+        agent_app = await app.state.app_man.get_application(del_input_form.app_id)
         return await agent_app.agent_del_input(del_input_form.agent_id, del_input_form.input_agent_id)
 
     except Exception as e:
@@ -571,7 +572,7 @@ async def application_agent_available_inputs(agent_info: AgentInfoForm, request:
     有多少候选的输入数据
     """
     try:
-        agent_app = app.state.app_man.get_application(agent_info.app_id)
+        agent_app = await app.state.app_man.get_application(agent_info.app_id)
         return await agent_app.get_available_inputs(agent_info.agent_id)
 
     except Exception as e:
@@ -588,7 +589,7 @@ async def application_agent_get_input(get_input_form: AgentInfoForm, request: Re
     有多少已经绑定的输入数据
     """
     try:
-        agent_app = app.state.app_man.get_application(get_input_form.app_id)
+        agent_app = await app.state.app_man.get_application(get_input_form.app_id)
         return await agent_app.agent_get_input(get_input_form.agent_id)
 
     except Exception as e:
@@ -602,7 +603,7 @@ async def application_agent_get_input(get_input_form: AgentInfoForm, request: Re
 @app.get("/application/list_tools/{app_id}")
 async def application_list_tools(app_id: str, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(app_id)
+        agent_app = await app.state.app_man.get_application(app_id)
         return await agent_app.list_tools()
 
     except Exception as e:
@@ -616,7 +617,7 @@ async def application_list_tools(app_id: str, request: Request, user=Depends(get
 @app.post("/application/agent/get_tools")
 async def application_agent_get_tools(agent_info: AgentInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(agent_info.app_id)
+        agent_app = await app.state.app_man.get_application(agent_info.app_id)
         return await agent_app.agent_get_tools(agent_info.agent_id)
 
     except Exception as e:
@@ -630,7 +631,7 @@ async def application_agent_get_tools(agent_info: AgentInfoForm, request: Reques
 @app.post("/application/agent/add_tool")
 async def application_agent_add_tool(agent_tool_info: AgentToolInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(agent_tool_info.app_id)
+        agent_app = await app.state.app_man.get_application(agent_tool_info.app_id)
         return await agent_app.agent_add_tool(agent_tool_info.agent_id, agent_tool_info.tool_id)
 
     except Exception as e:
@@ -644,7 +645,7 @@ async def application_agent_add_tool(agent_tool_info: AgentToolInfoForm, request
 @app.post("/application/agent/del_tool")
 async def application_agent_del_tool(agent_tool_info: AgentToolInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(agent_tool_info.app_id)
+        agent_app = await app.state.app_man.get_application(agent_tool_info.app_id)
         return await agent_app.agent_del_tool(agent_tool_info.agent_id, agent_tool_info.tool_id)
 
     except Exception as e:
@@ -658,7 +659,7 @@ async def application_agent_del_tool(agent_tool_info: AgentToolInfoForm, request
 @app.post("/application/agent/get_data")
 async def application_agent_get_data(agent_get_data_form: AgentGetDataForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(agent_get_data_form.app_id)
+        agent_app = await app.state.app_man.get_application(agent_get_data_form.app_id)
         return await agent_app.agent_get_data(agent_get_data_form.agent_id, agent_get_data_form.type, agent_get_data_form.content)
 
     except Exception as e:
@@ -671,12 +672,19 @@ async def application_agent_get_data(agent_get_data_form: AgentGetDataForm, requ
 
 
 @app.get("/application/list_appctx/{app_id}")
-async def application_list_appctx(app_id: str, request: Request, user=Depends(get_current_user)):
+async def application_list_appctx(
+        app_id: str,
+        request: Request,
+        skip_token: Optional[str] = None,
+        limit: Optional[int] = None,
+        user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(app_id)
+        agent_app = await app.state.app_man.get_application(app_id)
+        app_ctx_list = await agent_app.list_appctx(skip_token, limit)
         return {
-            "app_ctx_list": agent_app.list_appctx(),
-            "app_ctx_id": agent_app.ctx.node_id if not agent_app.ctx is None else ''
+            "app_ctx_list": app_ctx_list,
+            "app_ctx_id": agent_app.ctx.node_id if not agent_app.ctx is None else '',
+            "next_token": next_skip_token(app_ctx_list, limit)
         }
 
     except Exception as e:
@@ -690,8 +698,8 @@ async def application_list_appctx(app_id: str, request: Request, user=Depends(ge
 @app.post("/application/select_appctx")
 async def application_select_appctx(select_appctx_info: AppCtxInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(select_appctx_info.app_id)
-        ctx = agent_app.select_appctx(select_appctx_info.app_ctx_id)
+        agent_app = await app.state.app_man.get_application(select_appctx_info.app_id)
+        ctx = await agent_app.select_appctx(select_appctx_info.app_ctx_id)
         if ctx is None:
             return {"status": "error", "reason": "not ever run!"}
         return {"status": "successfully"}
@@ -707,8 +715,8 @@ async def application_select_appctx(select_appctx_info: AppCtxInfoForm, request:
 @app.delete("/application/delete_appctx")
 async def application_delete_appctx(appctx_info: AppCtxInfoForm, request: Request, user=Depends(get_current_user)):
     try:
-        agent_app = app.state.app_man.get_application(appctx_info.app_id)
-        agent_app.delete_appctx(appctx_info.app_ctx_id)
+        agent_app = await app.state.app_man.get_application(appctx_info.app_id)
+        await agent_app.delete_appctx(appctx_info.app_ctx_id)
         return {"status": "successfully"}
 
     except Exception as e:
@@ -720,6 +728,57 @@ async def application_delete_appctx(appctx_info: AppCtxInfoForm, request: Reques
         )
 
 
+@app.get("/application/admin/graph_stats")
+async def application_graph_stats(
+        request: Request,
+        top: Optional[int] = 20,
+        order: Optional[str] = "total_ms",
+        reset: Optional[bool] = False,
+        user=Depends(get_admin_user)):
+    """
+    the top graph query shapes by total time (or count, max_ms, rows, bytes), with pool and cache stats.
+    reset: clear the query stats after reading them.
+    """
+    try:
+        graph = graph_query()
+        stats = {
+            "queries": graph.query_stats(top, order),
+            "pool": graph.pool_stats(),
+            "cache": graph.cache_stats(),
+            "templates": graph.template_stats(),
+        }
+        if reset:
+            graph.reset_query_stats()
+        return stats
+
+    except Exception as e:
+        log.info(e)
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.DEFAULT(e),
+        )
+
+
+@app.get("/application/admin/run_stats")
+async def application_run_stats(request: Request, user=Depends(get_admin_user)):
+    """
+    running and queued agent invocations of the run scheduler, in total and per application,
+    with the MCP server process pool.
+    """
+    try:
+        app_man = app.state.app_man
+        return app_man.scheduler.stats() | {"mcp_pool": app_man.mcp_pool.stats()}
+
+    except Exception as e:
+        log.info(e)
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.DEFAULT(e),
+        )
+
+
 @app.get("/application/template/{app_id}")
 async def application_template(
         app_id: str,
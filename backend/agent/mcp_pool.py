@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastmcp import Client
+from fastmcp.client.elicitation import ElicitResult
+from fastmcp.client.transports import FastMCPTransport, StdioTransport
+
+log = logging.getLogger(__name__)
+
+# MCP server processes kept started, at most started, and the tool-call batches served by one before it is replaced
+MCP_POOL_MIN_SIZE = int(os.environ.get("MCP_POOL_MIN_SIZE", "2"))
+MCP_POOL_MAX_SIZE = int(os.environ.get("MCP_POOL_MAX_SIZE", "8"))
+MCP_POOL_MAX_REQUESTS = int(os.environ.get("MCP_POOL_MAX_REQUESTS", "200"))
+# an idle process is pinged before it is checked out again after this many seconds
+MCP_POOL_HEALTH_INTERVAL = float(os.environ.get("MCP_POOL_HEALTH_INTERVAL", "30"))
+MCP_POOL_START_TIMEOUT = float(os.environ.get("MCP_POOL_START_TIMEOUT", "60"))
+# stdio: the builtin MCP server runs as child processes, memory: it is called in this process
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "stdio")
+
+
+def mcp_transport(python_path, mcp_path):
+    return StdioTransport(
+        command=sys.executable,
+        args=[str(mcp_path)],
+        # IOData is written by this process, the MCP server must not serve it from its own read cache
+        env={"PYTHONPATH": str(python_path), "MEM_GRAPH_URL": os.environ.get("MEM_GRAPH_URL", "127.0.0.1:7687"),
+             "GRAPH_CACHE_LABELS": "",
+             # both processes resolve the blob references of Data/IOData nodes
+             "IS_KB_PATH": os.environ.get("IS_KB_PATH", "/is_kb"),
+             "GRAPH_BLOB_THRESHOLD": os.environ.get("GRAPH_BLOB_THRESHOLD", str(64 * 1024)),
+             # the memory backend is shared through its snapshot/WAL files
+             "GRAPH_BACKEND": os.environ.get("GRAPH_BACKEND", "memgraph"),
+             **({"GRAPH_SNAPSHOT_PATH": os.environ["GRAPH_SNAPSHOT_PATH"]}
+                if "GRAPH_SNAPSHOT_PATH" in os.environ else {})},
+        cwd=str(python_path),
+        # the pool decides how long a process lives, it ends with the client
+        keep_alive=False
+    )
+
+
+def memory_only_graph():
+    """the graph is kept in the memory of this process (GRAPH_BACKEND=memory with an empty GRAPH_SNAPSHOT_PATH)"""
+    return os.environ.get("GRAPH_BACKEND", "memgraph").lower() == "memory" and os.environ.get("GRAPH_SNAPSHOT_PATH") == ""
+
+
+def builtin_transport(python_path, mcp_path):
+    """transport to the builtin MCP server of mcp_bus, see MCP_TRANSPORT"""
+    if MCP_TRANSPORT != "memory" and memory_only_graph():
+        # a child process would start its own empty graph, the tools would not see the data of the API
+        log.warning("The graph is not shared with other processes, the builtin MCP server is called in-process.")
+    if MCP_TRANSPORT == "memory" or memory_only_graph():
+        # no process and no JSON over pipes, the tools share the graph connections and caches of this process
+        from mcp_bus.mcp_server import mcp
+        return FastMCPTransport(mcp)
+    return mcp_transport(python_path, mcp_path)
+
+
+class MCPProcess:
+    """
+    One MCP server process (or in-memory server session) with its connected client. The roots and the elicitation handler are
+    those of the current checkout, the server asks for the roots on every tool call.
+    """
+
+    def __init__(self, transport):
+        self.roots = []
+        self.elicitation_handler = None
+
+        # the client only takes a plain function as roots handler
+        async def list_roots(context):
+            return list(self.roots)
+
+        self.client = Client(transport, roots=list_roots, elicitation_handler=self.elicit)
+        self.requests = 0
+        self.last_used = time.monotonic()
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = None
+        self._error = None
+
+    async def elicit(self, message, response_type, params, context):
+        if self.elicitation_handler is None:
+            return ElicitResult(action="decline")
+        return await self.elicitation_handler(message, response_type, params, context)
+
+    async def _run(self):
+        # the client is entered and exited by this one task
+        try:
+            async with self.client:
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    async def start(self, timeout=MCP_POOL_START_TIMEOUT):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except BaseException:
+            # a server that did not come up in time (or a cancelled start) is stopped with its process
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            await self._close_transport()
+            raise
+        if self._error is not None or self._task.done():
+            raise ConnectionError(f"MCP server failed to start: {self._error}")
+        return self
+
+    async def healthy(self, timeout=5.0):
+        if self._task is None or self._task.done():
+            return False
+        try:
+            return bool(await asyncio.wait_for(self.client.ping(), timeout))
+        except Exception:
+            return False
+
+    async def _close_transport(self):
+        # stops the server process even when the client did not get to exit cleanly
+        try:
+            await asyncio.wait_for(self.client.transport.close(), 10)
+        except Exception as e:
+            log.warning(f"Failed to close MCP transport: {e}")
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 10)
+            except Exception:
+                self._task.cancel()
+        await self._close_transport()
+
+
+class MCPClientPool:
+    """
+    Pool of started MCP server processes shared by the applications of this process.
+
+        async with pool.checkout(roots, elicitation_handler) as client:
+            await client.call_tool(...)
+
+    A checkout holds one process for a batch of tool calls. Processes are started on demand up to
+    max_size and kept warm down to min_size, a process is replaced after max_requests checkouts,
+    and pinged before reuse when it was idle longer than health_interval or its last batch failed.
+    """
+
+    def __init__(self, transport_factory, min_size=MCP_POOL_MIN_SIZE, max_size=MCP_POOL_MAX_SIZE,
+                 max_requests=MCP_POOL_MAX_REQUESTS, health_interval=MCP_POOL_HEALTH_INTERVAL):
+        self.transport_factory = transport_factory
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.max_requests = max_requests
+        self.health_interval = health_interval
+        self._idle = deque()
+        self._size = 0
+        self._cond = None
+        self._warm_task = None
+        self._closed = False
+        self._stats = {"started": 0, "recycled": 0, "unhealthy": 0, "checkouts": 0, "waits": 0}
+
+    @property
+    def cond(self):
+        # created in the event loop of the first caller
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def _spawn(self):
+        try:
+            proc = await MCPProcess(self.transport_factory()).start()
+        except Exception:
+            async with self.cond:
+                self._size -= 1
+                self.cond.notify()
+            raise
+        self._stats["started"] += 1
+        return proc
+
+    async def warm_up(self):
+        """start processes up to min_size"""
+        async with self.cond:
+            count = max(0, self.min_size - self._size)
+            self._size += count
+        procs = await asyncio.gather(*[self._spawn() for _ in range(count)], return_exceptions=True)
+        for proc in procs:
+            if not isinstance(proc, MCPProcess):
+                log.error(f"Failed to start MCP server: {proc}")
+            elif self._closed:
+                await self._discard(proc)
+            else:
+                async with self.cond:
+                    self._idle.append(proc)
+                    self.cond.notify()
+
+    async def _acquire(self):
+        if self._warm_task is None:
+            self._warm_task = asyncio.create_task(self.warm_up())
+        while True:
+            async with self.cond:
+                while not self._idle and self._size >= self.max_size:
+                    self._stats["waits"] += 1
+                    await self.cond.wait()
+                if self._idle:
+                    proc = self._idle.popleft()
+                else:
+                    self._size += 1
+                    proc = None
+            if proc is None:
+                return await self._spawn()
+            if time.monotonic() - proc.last_used < self.health_interval or await proc.healthy():
+                return proc
+            self._stats["unhealthy"] += 1
+            await self._discard(proc)
+
+    async def _discard(self, proc):
+        await proc.close()
+        async with self.cond:
+            self._size -= 1
+            self.cond.notify()
+        if not self._closed and self._size < self.min_size:
+            # a recycled or broken process is replaced in the background
+            self._warm_task = asyncio.create_task(self.warm_up())
+
+    async def _release(self, proc, failed):
+        proc.requests += 1
+        proc.last_used = time.monotonic()
+        proc.roots = []
+        proc.elicitation_handler = None
+        if self.max_requests and proc.requests >= self.max_requests:
+            self._stats["recycled"] += 1
+            await self._discard(proc)
+            return
+        if failed and not await proc.healthy():
+            self._stats["unhealthy"] += 1
+            await self._discard(proc)
+            return
+        async with self.cond:
+            self._idle.append(proc)
+            self.cond.notify()
+
+    @asynccontextmanager
+    async def checkout(self, roots, elicitation_handler=None):
+        """the client of one process, answering with roots and elicitation_handler until the block ends"""
+        proc = await self._acquire()
+        self._stats["checkouts"] += 1
+        proc.roots = list(roots)
+        proc.elicitation_handler = elicitation_handler
+        failed = True
+        try:
+            yield proc.client
+            failed = False
+        finally:
+            await asyncio.shield(self._release(proc, failed))
+
+    async def close(self):
+        self._closed = True
+        async with self.cond:
+            procs = list(self._idle)
+            self._idle.clear()
+        for proc in procs:
+            await self._discard(proc)
+
+    def stats(self):
+        return self._stats | {"size": self._size, "idle": len(self._idle), "busy": self._size - len(self._idle),
+                              "min_size": self.min_size, "max_size": self.max_size}
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+
+# agent invocations running at once in this process, and per application
+RUN_MAX_CONCURRENCY = int(os.environ.get("RUN_MAX_CONCURRENCY", "8"))
+RUN_APP_CONCURRENCY = int(os.environ.get("RUN_APP_CONCURRENCY", "4"))
+
+
+class RunScheduler:
+    """
+    Process-wide limit on concurrent agent invocations, each of which may start MCP servers and LLM requests.
+
+    At most max_concurrency invocations run at once, at most app_concurrency of one application.
+    Waiting invocations are queued per application and the free slots are handed out round-robin
+    over the applications, so a wide workflow can not starve the others.
+
+        async with scheduler.slot(app_id):
+            await agent.invoke(ctx)
+    """
+
+    def __init__(self, max_concurrency=RUN_MAX_CONCURRENCY, app_concurrency=RUN_APP_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.app_concurrency = max(1, app_concurrency)
+        self.queues = OrderedDict()  # app_id -> deque of waiting futures, in round-robin order
+        self.running = defaultdict(int)  # app_id -> running invocations
+        self.total_running = 0
+        self._stats = defaultdict(int)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _can_start(self, app_id):
+        return self.total_running < self.max_concurrency and self.running.get(app_id, 0) < self.app_concurrency
+
+    def _start(self, app_id, waited):
+        self.running[app_id] += 1
+        self.total_running += 1
+        self._stats["started"] += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _wake(self):
+        """hand the free slots to the queued invocations, one application after the other"""
+        progress = True
+        while progress and self.total_running < self.max_concurrency:
+            progress = False
+            for app_id in list(self.queues):
+                queue = self.queues[app_id]
+                while queue and queue[0][0].done():
+                    queue.popleft()
+                if not queue:
+                    del self.queues[app_id]
+                    continue
+                if not self._can_start(app_id):
+                    continue
+                future, queued_at = queue.popleft()
+                self._start(app_id, time.monotonic() - queued_at)
+                future.set_result(None)
+                # the application goes to the end of the round
+                self.queues.move_to_end(app_id)
+                if not queue:
+                    del self.queues[app_id]
+                progress = True
+                break
+
+    async def acquire(self, app_id):
+        if self._can_start(app_id) and not self.queues:
+            self._start(app_id, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(app_id, deque()).append((future, time.monotonic()))
+        self._stats["queued"] += 1
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted meanwhile
+                self.release(app_id)
+            self._stats["cancelled"] += 1
+            raise
+
+    def release(self, app_id):
+        self.running[app_id] -= 1
+        self.total_running -= 1
+        if not self.running[app_id]:
+            del self.running[app_id]
+        self._stats["finished"] += 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, app_id):
+        await self.acquire(app_id)
+        try:
+            yield
+        finally:
+            self.release(app_id)
+
+    def stats(self):
+        started = self._stats["started"]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "app_concurrency": self.app_concurrency,
+            "running": self.total_running,
+            "queued": sum(len(queue) for queue in self.queues.values()),
+            "apps": {
+                app_id: {"running": self.running.get(app_id, 0), "queued": len(self.queues.get(app_id, ()))}
+                for app_id in set(self.running) | set(self.queues)
+            },
+            "started": started,
+            "finished": self._stats["finished"],
+            "queued_total": self._stats["queued"],
+            "cancelled": self._stats["cancelled"],
+            "wait_avg_ms": round(self._wait_total / started * 1000, 3) if started else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
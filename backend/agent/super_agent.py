@@ -3,13 +3,13 @@ from fastmcp.client.elicitation import ElicitResult
 import asyncio
 import json
 import weakref
-from fastmcp import Client
-from utils.iv3_client import image_conversation_stream, text_conversation, image_conversation, async_chat
+from functools import partial
+from config import ELICITATION_TIMEOUT
+from models.graph_db import get_unique_id
+from utils.iv3_client import image_conversation_stream, text_conversation, image_conversation, async_chat_stream, LLMStreamError
 import logging
 import traceback
-from fastmcp.client.transports import StdioTransport
-import os, re
-import sys
+import re
 from pathlib import Path
 
 
@@ -36,12 +36,6 @@ class SuperAgent:
         self.node_id = config['node_id']
         self.name = config.get("name", f"智能代理_{self.node_id}")
         self.config = config
-        self.transport = StdioTransport(
-            command=sys.executable,
-            args=[str(self.owner().mcp_path)],
-            env={"PYTHONPATH": str(self.owner().python_path),"MEM_GRAPH_URL": os.environ.get("MEM_GRAPH_URL", "127.0.0.1:7687")},
-            cwd=str(self.owner().python_path)
-        )
 
     @staticmethod
     def get_default_config():
@@ -53,9 +47,9 @@ class SuperAgent:
         }
 
     async def invoke(self, app_ctx):
-        def build_input_block():
+        async def build_input_block():
             # convert agent id to io_data node id
-            inp_nodes = [n[0] for n in self.get_input(app_ctx)]
+            inp_nodes = [n[0] for n in await self.get_input(app_ctx)]
             content = ""
             for i, node in enumerate(inp_nodes):
                 content += f"## 参考内容{i}\n"
@@ -74,19 +68,19 @@ class SuperAgent:
                 if tool_r is not None:
                     try:
                         out_d = json.loads(tool_r.content[0].text or '{}')
-                        await self.print("tool", out_d.get('data',""), out_d.get("type","markdown"))
+                        await self.print("tool", out_d.get('data',""), out_d.get("type","markdown"), app_ctx=app_ctx)
                         ret_list.append(out_d)
                     except Exception as e:
                         log.info(f"Failed to call tool: {tool_name}, with: {e}")
                     return True
             return False
 
-        def build_task():
+        async def build_task():
             node_names = re.findall(r'{{(.*?)}}', self.config["task"])
             result = [self.config["task"].strip()]
             for node_name in node_names:
                 try:
-                    node_result = self.get_result_by_name(app_ctx, node_name)
+                    node_result = await self.get_result_by_name(app_ctx, node_name)
                 except Exception:
                     node_result = f"无"
 
@@ -97,15 +91,15 @@ class SuperAgent:
             return "\n".join(result)
 
         try:
-            if not self.is_callable(app_ctx):
+            if not await self.is_callable(app_ctx):
                 app_ctx.set_run_state(self.node_id, "failed", "input node has not prepared!")
                 return None
 
             output_type = self.config.get("output_type", "plain_text")
-            task = build_task()
-            input_content = build_input_block()
+            task = await build_task()
+            input_content = await build_input_block()
             tools_description = ""
-            tools = {t['name']: t for t in self.get_tools()}
+            tools = {t['name']: t for t in await self.get_tools()}
             for v in tools.values():
                 tools_description += f"""
 name: {v['name']}
@@ -149,14 +143,25 @@ inputSchema: {v['inputSchema']}
             """
             try:
                 json_data = json.loads(self.config['task'])
-                await self.print('agent', self.config['task'])
+                await self.print('agent', self.config['task'], app_ctx=app_ctx)
                 answer = None
             except json.JSONDecodeError as e:
                 # not json data, just ask llm
                 log.info(prompt)
-                await self.print('agent', self.config['task'])
-                answer = await async_chat(prompt)
-                await self.print('llm', answer or '调用错误')
+                await self.print('agent', self.config['task'], app_ctx=app_ctx)
+                # the answer is shown while it is generated
+                answer = ''
+                try:
+                    async for text in async_chat_stream(prompt):
+                        answer += text
+                        await self.print('llm', text, app_ctx=app_ctx, delta=True)
+                except LLMStreamError:
+                    # a truncated answer is neither saved nor handed to the next agents, the agent fails
+                    await self.print('llm', '调用错误', app_ctx=app_ctx)
+                    raise
+                if not answer:
+                    answer = None
+                    await self.print('llm', '调用错误', app_ctx=app_ctx)
 
                 # answer = image_conversation(prompt, [])
                 log.info(answer)
@@ -164,8 +169,8 @@ inputSchema: {v['inputSchema']}
 
             tool_ret = None
             tool_called = False
-            self.clear_output(app_ctx)
-            new_io_data = self.save_result(app_ctx, {"content": ""})
+            await self.clear_output(app_ctx)
+            new_io_data = await self.save_result(app_ctx, {"content": ""})
             app_id = self.owner().node_id
             agent_id = self.node_id
             app_ctx_id = app_ctx.node_id
@@ -183,13 +188,13 @@ inputSchema: {v['inputSchema']}
                 log.info(f"io_data_id: {io_data_id}")
                 log.info("*** MCP Tool Call ***")
 
-                mcp_client = Client(self.transport,
-                                    roots=[f"file://{app_id}",
-                                           f"file://{agent_id}",
-                                           f"file://{app_ctx_id}",
-                                           f"file://{io_data_id}"],
-                                    elicitation_handler=self.elic_handle)
-                async with mcp_client:
+                # a warm MCP server process of the pool serves the whole batch of tool calls
+                mcp_pool = self.owner().owner().mcp_pool
+                async with mcp_pool.checkout([f"file://{app_id}",
+                                              f"file://{agent_id}",
+                                              f"file://{app_ctx_id}",
+                                              f"file://{io_data_id}"],
+                                             elicitation_handler=partial(self.elic_handle, app_ctx)) as mcp_client:
                     ret_list = []
                     if isinstance(json_data, list):
                         for call in json_data:
@@ -208,7 +213,7 @@ inputSchema: {v['inputSchema']}
 
             if out_data is None:
                 out_data = ''
-            self.save_result(app_ctx, {"node_id":io_data_id, "content": out_data})
+            await self.save_result(app_ctx, {"node_id":io_data_id, "content": out_data})
 
             log.info(f"SuperAgent executed. app_id: {self.owner().node_id}, agent_id: {self.node_id}, timestamp: {app_ctx.get_time_str()}")
             app_ctx.set_run_state(self.node_id, "succeed")
@@ -219,15 +224,16 @@ inputSchema: {v['inputSchema']}
             app_ctx.set_run_state(self.node_id, "failed", error=str(e))
             return None
 
-    async def print(self, role, message, type="markdown"):
-        await self.owner().get_data_pipe().write_to_frontend(self.owner().node_id, self.node_id, message, role, type)
+    async def print(self, role, message, type="markdown", app_ctx=None, delta=False):
+        await self.owner().get_data_pipe().write_to_frontend(self.owner().node_id, self.node_id, message, role, type,
+                                                             ctx_id=app_ctx.node_id if app_ctx else None, delta=delta)
 
-    def save_config(self):
-        self.owner().graph().update_node("Agent",
-                                         {"node_id": self.node_id},
-                                         self.config)
+    async def save_config(self):
+        await self.owner().graph().update_node("Agent",
+                                               {"node_id": self.node_id},
+                                               self.config)
 
-    def save_result(self, app_ctx, io_data):
+    async def save_result(self, app_ctx, io_data):
         io_data = {
             "app_id": self.owner().node_id,
             "agent_id": self.node_id,
@@ -235,22 +241,22 @@ inputSchema: {v['inputSchema']}
             "name": self.name,
             "data_type": self.config.get("output_type", "markdown"),
         } | io_data
-        return self.owner().io_data.save_data(io_data)
+        return await self.owner().io_data.save_data(io_data)
 
-    def clear_output(self, app_ctx):
-        self.owner().io_data.delete_data({
+    async def clear_output(self, app_ctx):
+        await self.owner().io_data.delete_data({
             "app_id": self.owner().node_id,
             "agent_id": self.node_id,
             "app_ctx_id": app_ctx.node_id
         })
-        self.owner().graph().delete_node("Data", {
+        await self.owner().graph().delete_node("Data", {
             "app_id": self.owner().node_id,
             "agent_id": self.node_id,
             "app_ctx_id": app_ctx.node_id
         })
 
-    def add_input(self, agent):
-        self.owner().graph().add_relationship(
+    async def add_input(self, agent):
+        await self.owner().graph().add_relationship(
             "Agent",
             self.node_id,
             "INPUT",
@@ -258,8 +264,8 @@ inputSchema: {v['inputSchema']}
             agent
         )
 
-    def del_input(self, agent):
-        self.owner().graph().delete_relationship({
+    async def del_input(self, agent):
+        await self.owner().graph().delete_relationship({
             "src_label": "Agent",
             "src_props": {"node_id": self.node_id},
             "target_props": {"node_id": agent},
@@ -267,14 +273,14 @@ inputSchema: {v['inputSchema']}
             "hop_num": 1
         })
 
-    def is_callable(self, app_ctx):
-        inp_nodes = self.get_input(app_ctx)
+    async def is_callable(self, app_ctx):
+        inp_nodes = await self.get_input(app_ctx)
         if all(inp_nodes):
             return True
         return False
 
-    def get_result_by_name(self, app_ctx, node_name):
-        io_data_nodes = self.owner().graph().get_node("IOData",{
+    async def get_result_by_name(self, app_ctx, node_name):
+        io_data_nodes = await self.owner().graph().get_node("IOData",{
             "app_id": self.owner().node_id,
             "name": node_name,
             "app_ctx_id": app_ctx.node_id
@@ -282,7 +288,7 @@ inputSchema: {v['inputSchema']}
         if io_data_nodes and io_data_nodes[0].get("content"):
             return io_data_nodes[0]["content"]
 
-        data_nodes = self.owner().graph().get_node("Data", {
+        data_nodes = await self.owner().graph().get_node("Data", {
             "app_id": self.owner().node_id,
             "app_ctx_id": app_ctx.node_id
         })
@@ -297,25 +303,20 @@ inputSchema: {v['inputSchema']}
                     return "".join(item.get("content", "") for item in content)
 
 
-    def get_input(self, app_ctx=None):
-        relations = self.owner().graph().get_relationship({
-            "src_label": "Agent",
-            "src_props": {"node_id": self.node_id},
-            "rel_types": ["INPUT"],
-            "hop_num": 1
-        })
+    async def get_input(self, app_ctx=None):
+        inputs = (await self.owner().load_topology()).get_inputs(self.node_id)
         if app_ctx is None:
-            return [n['node_id'] for _, _, n in relations]
+            return inputs
 
-        inp_nodes = [self.owner().io_data.find_node({
+        inp_nodes = [await self.owner().io_data.find_node({
             "app_id": self.owner().node_id,
-            "agent_id": n['node_id'],
+            "agent_id": node_id,
             "app_ctx_id": app_ctx.node_id
-        }) for _, _, n in relations]
+        }) for node_id in inputs]
         return inp_nodes
 
-    def get_tools(self):
-        relations = self.owner().graph().get_relationship({
+    async def get_tools(self):
+        relations = await self.owner().graph().get_relationship({
             "src_label": "Agent",
             "src_props": {"node_id": self.node_id},
             "rel_types": ["USE_TOOL"],
@@ -323,8 +324,8 @@ inputSchema: {v['inputSchema']}
         })
         return [n for _, _, n in relations]
 
-    def add_tool(self, tool_id: str):
-        self.owner().graph().add_relationship(
+    async def add_tool(self, tool_id: str):
+        await self.owner().graph().add_relationship(
             "Agent",
             self.node_id,
             "USE_TOOL",
@@ -332,8 +333,8 @@ inputSchema: {v['inputSchema']}
             tool_id
         )
 
-    def del_tool(self, tool_id: str):
-        self.owner().graph().delete_relationship({
+    async def del_tool(self, tool_id: str):
+        await self.owner().graph().delete_relationship({
             "src_label": "Agent",
             "src_props": {"node_id": self.node_id},
             "target_props": {"node_id": tool_id},
@@ -341,27 +342,29 @@ inputSchema: {v['inputSchema']}
             "hop_num": 1
         })
 
-    def get_data(self, app_ctx, type: str, content: str):
+    async def get_data(self, app_ctx, type: str, content: str):
         MAX_LEN = 40
         def get_name(n):
-            name = n.get("name", n.get("title", ""))
+            name = n.get("name") or n.get("title") or ""
             if len(name) > MAX_LEN:
                 name = name[:40] + "..."
             return name
 
         def get_desc(n):
-            content = n.get("content", "")
+            content = n.get("content") or ""
             if isinstance(content, list):
                 texts = [item.get("content", "") for item in content if isinstance(item, dict)]
                 return "\n\n".join(texts)
             return content
 
         if type in ("graph", "tree"):
-            rels = self.owner().graph().get_relationship({
+            rels = await self.owner().graph().get_relationship({
                 "src_label": "Data",
                 "src_props": {"app_ctx_id": app_ctx.node_id, "name": content},
                 "rel_types": ["SUBHEADING"],
-                "hop_num": '0..10'
+                "hop_num": '0..10',
+                "src_prop_keys": ["node_id", "name", "title", "content"],
+                "target_prop_keys": ["node_id", "name", "title", "content"]
             })
 
             nodes = {n['node_id']: n for n, _, _ in rels}
@@ -376,7 +379,7 @@ inputSchema: {v['inputSchema']}
                 "edges": edges
             }
         elif type == "markdown":
-            nodes = self.owner().io_data.find({
+            nodes = await self.owner().io_data.find_node({
                 "app_id": self.owner().node_id,
                 "agent_id": self.node_id,
                 "app_ctx_id": app_ctx.node_id
@@ -385,35 +388,30 @@ inputSchema: {v['inputSchema']}
                 return nodes[0]['content']
         return None
 
-    async def elic_handle(self, message: str, response_type: type, params, context):
+    async def elic_handle(self, app_ctx, message: str, response_type: type, params, context):
         data_pipe = self.owner().get_data_pipe()
         query = json.loads(message)
         if query['command'] == 'end':
-            await self.owner().terminate()
+            await self.owner().terminate(app_ctx)
             return ElicitResult(action="cancel")
         query |= {
             "app_id": self.owner().node_id,
-            "agent_id": self.node_id
+            "agent_id": self.node_id,
+            "app_ctx_id": app_ctx.node_id,
+            "request_id": get_unique_id()
         }
+        # Application.feedback resolves it with the answer to exactly this query
+        waiter = data_pipe.expect_feedback(query["app_id"], query["app_ctx_id"], query["agent_id"], query["request_id"])
         query_data = json.dumps(query)
-        await self.print('', f"\\u{query_data}")
-
-        """
-        find the feedback for this query
-        """
-        while True:
-            response = await data_pipe.read_from_frontend()
-            if response is None:
-                return ElicitResult(action="cancel")
-            feedback = json.loads(response)
-            #check if match the query
-            if feedback['app_id'] != query['app_id'] or feedback['agent_id'] != query['agent_id']:
-                # put it back
-                await data_pipe.put_to_input_queue(response)
-                await asyncio.sleep(0.1)
-            else:
-                break
+        await self.print('', f"\\u{query_data}", app_ctx=app_ctx)
 
+        try:
+            feedback = await asyncio.wait_for(waiter, ELICITATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            # an abandoned query must not keep the MCP server process and the run slot forever
+            log.warning(f"elicitation {query['request_id']} of agent {self.node_id} got no feedback in {ELICITATION_TIMEOUT}s")
+            return ElicitResult(action="decline")
+        response = json.dumps(feedback)
         log.info(f"elic_handle: {response}")
 
         if feedback['status'] == "cancel":
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+
+pytest.importorskip("fastmcp")
+pytest.importorskip("aiohttp")
+
+from agent.application_manager import Application
+from models.graph_db import AsyncGraphQuery
+from models.graph_memory import MemoryGraphQuery
+
+
+class Owner:
+    """ApplicationManager holding the graph and the tool catalog"""
+
+    def __init__(self, graph, tool_catalog):
+        self.graph = graph
+        self.tool_catalog = tool_catalog
+
+
+class Catalog:
+    def __init__(self):
+        self.fingerprint = "1"
+        self.tools = [{"name": "echo", "description": "echo"}, {"name": "search", "description": "search"}]
+
+    async def get(self):
+        return self.fingerprint, self.tools
+
+
+def test_update_tools_rewrites_the_tool_nodes_of_a_new_build():
+    async def main():
+        graph = AsyncGraphQuery(MemoryGraphQuery())
+        owner = Owner(graph, Catalog())
+        app_node = await graph.add_node("Application", {"name": "app"})
+        app = Application(owner, app_node)
+
+        await app.update_tools()
+        tools = await graph.get_node("Tool", {"app_id": app.node_id})
+        assert sorted(tool["name"] for tool in tools) == ["echo", "search"]
+
+        owner.tool_catalog.fingerprint = "2"
+        owner.tool_catalog.tools = [{"name": "echo", "description": "echo the text"},
+                                    {"name": "search", "description": "search"}]
+        await app.update_tools()
+        updated = await graph.get_node("Tool", {"app_id": app.node_id})
+        assert len(updated) == len(tools)
+        assert {tool["name"]: tool["node_id"] for tool in updated} == {tool["name"]: tool["node_id"] for tool in tools}
+        assert {tool["name"]: tool["description"] for tool in updated} == {"echo": "echo the text", "search": "search"}
+        assert (await graph.get_node("Application", {"node_id": app.node_id}))[0]["tools_fingerprint"] == "2"
+
+        # the same build does not write the nodes again
+        app.tools = None
+        await app.update_tools()
+        assert len(await graph.get_node("Tool")) == 2
+
+    asyncio.run(main())
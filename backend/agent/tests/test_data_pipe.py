@@ -0,0 +1,255 @@
+import asyncio
+import json
+
+import pytest
+
+from agent import data_pipe
+from agent.data_pipe import EventChannel, END_OF_STREAM
+
+
+def event(i, **kwargs):
+    return {"channel": "prompt", "command": "progress", "data": i} | kwargs
+
+
+def append(content, agent_id="a", delta=False):
+    data = {"agent_id": agent_id, "type": "markdown", "content": content}
+    if delta:
+        data["delta"] = True
+    return {"channel": "prompt", "command": "append", "role": "assistant", "thread": "", "data": data}
+
+
+async def collect(stream):
+    return [json.loads(line) for line in [line async for line in stream]]
+
+
+def test_subscribers_read_the_run_and_resume_after_the_last_id(pipe):
+    async def main():
+        live = pipe.frontend_event_generator("run")
+        reader = asyncio.create_task(collect(live))
+        await asyncio.sleep(0)
+        for i in range(3):
+            await pipe.channel("run").publish(event(i))
+        await pipe.stop_streaming("run", timeout=1)
+        events = await reader
+        assert [e["id"] for e in events] == ["run:1", "run:2", "run:3", "run:4"]
+        assert events[-1]["command"] == "eos"
+
+        resumed = await collect(pipe.resume("run:2"))
+        assert [e.get("data") for e in resumed] == [2, None]
+        assert resumed[-1]["command"] == "eos"
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("last_event_id", ["other:3", "run", "run:x", "", None])
+def test_resume_of_an_unknown_run_only_ends_the_stream(pipe, last_event_id):
+    async def main():
+        await pipe.channel("run").publish(event(0))
+        assert await collect(pipe.resume(last_event_id)) == [END_OF_STREAM]
+        # the run is not started or created again
+        assert list(pipe.channels) == ["run"]
+
+    asyncio.run(main())
+
+
+def test_resume_of_a_running_run_waits_for_its_end(pipe):
+    async def main():
+        channel = pipe.channel("run")
+        await channel.publish(event(0))
+        reader = asyncio.create_task(collect(pipe.resume("run:1")))
+        await asyncio.sleep(0)
+        await channel.publish(event(1))
+        await channel.close()
+        assert [e.get("data") for e in await reader] == [1, None]
+
+    asyncio.run(main())
+
+
+def test_spill_keeps_the_events_of_a_lagging_subscriber(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_pipe, "STREAM_SPILL_DIR", str(tmp_path))
+
+    async def main():
+        channel = EventChannel("run", buffer_size=2, policy="spill", coalesce_window=0)
+        stream = channel.subscribe(0)
+        await channel.publish(event(0))
+        assert json.loads(await stream.__anext__())["data"] == 0
+        for i in range(1, 5):
+            await channel.publish(event(i))
+        await channel.close()
+        assert len(channel.buffer) == 2
+        assert [e.get("data") for e in await collect(stream)] == [1, 2, 3, 4, None]
+        assert channel.dropped == 0
+        channel.release()
+        assert not list(tmp_path.iterdir())
+
+    asyncio.run(main())
+
+
+def test_nothing_is_spilled_while_no_subscriber_lags(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_pipe, "STREAM_SPILL_DIR", str(tmp_path))
+
+    async def main():
+        channel = EventChannel("run", buffer_size=2, policy="spill", coalesce_window=0)
+        for i in range(5):
+            await channel.publish(event(i))
+        stream = channel.subscribe(channel.seq)
+        await channel.publish(event(5))
+        assert json.loads(await stream.__anext__())["data"] == 5
+        await channel.publish(event(6))
+        await channel.close()
+        assert [e.get("data") for e in await collect(stream)] == [6, None]
+        assert channel.spill is None and channel.dropped == 0
+        assert not list(tmp_path.iterdir())
+
+    asyncio.run(main())
+
+
+def test_spilled_events_may_have_gaps(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_pipe, "STREAM_SPILL_DIR", str(tmp_path))
+
+    async def main():
+        channel = EventChannel("run", buffer_size=1, policy="spill", coalesce_window=0)
+        stream = channel.subscribe(0)
+        await channel.publish(event(0))
+        assert json.loads(await stream.__anext__())["data"] == 0
+        await channel.publish(event(1))
+        await channel.publish(event(2))
+        # the subscriber catches up, seq 3 is not spilled when it leaves the buffer
+        assert [json.loads(await stream.__anext__())["data"] for _ in range(2)] == [1, 2]
+        for i in range(3, 5):
+            await channel.publish(event(i))
+        await channel.close()
+        assert channel.spill.seqs == [2, 4, 5]
+        assert [e.get("data") for e in await collect(stream)] == [3, 4, None]
+        assert [seq for seq, _, _ in channel.events_after(2)] == [4]
+        channel.release()
+
+    asyncio.run(main())
+
+
+def test_drop_oldest_continues_after_a_gap():
+    async def main():
+        channel = EventChannel("run", buffer_size=2, policy="drop_oldest", coalesce_window=0)
+        stream = channel.subscribe(0)
+        await channel.publish(event(0))
+        assert json.loads(await stream.__anext__())["data"] == 0
+        for i in range(1, 5):
+            await channel.publish(event(i))
+        await channel.close()
+        assert [e.get("data") for e in await collect(stream)] == [4, None]
+        assert channel.dropped >= 3
+
+    asyncio.run(main())
+
+
+def test_block_waits_for_the_lagging_subscriber():
+    async def main():
+        channel = EventChannel("run", buffer_size=2, policy="block", coalesce_window=0)
+        stream = channel.subscribe(0)
+        await channel.publish(event(0))
+        assert json.loads(await stream.__anext__())["data"] == 0
+
+        async def write():
+            for i in range(1, 5):
+                await channel.publish(event(i))
+            await channel.close()
+
+        writer = asyncio.create_task(write())
+        await asyncio.sleep(0.01)
+        # the writer waits for room, the buffer holds the 2 events the subscriber has not read
+        assert not writer.done()
+        assert channel.seq == 3
+        assert [e.get("data") for e in await collect(stream)] == [1, 2, 3, 4, None]
+        await writer
+        assert channel.dropped == 0
+
+    asyncio.run(main())
+
+
+def test_block_drops_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(data_pipe, "STREAM_BLOCK_TIMEOUT", 0.01)
+
+    async def main():
+        channel = EventChannel("run", buffer_size=2, policy="block", coalesce_window=0)
+        channel.cursors[object()] = 0  # a subscriber that never reads
+        for i in range(4):
+            await channel.publish(event(i))
+        assert channel.dropped > 0
+        assert channel.seq == 4
+
+    asyncio.run(main())
+
+
+def test_adjacent_appends_are_coalesced():
+    async def main():
+        channel = EventChannel("run", coalesce_window=10)
+        await channel.publish(append("one"))
+        await channel.publish(append("two"))
+        await channel.publish(append("d", delta=True))
+        await channel.publish(append("e", delta=True))
+        await channel.publish(append("other", agent_id="b"))
+        await channel.close()
+        events = await collect(channel.subscribe(0))
+        assert [(e["data"]["content"] if isinstance(e.get("data"), dict) else None) for e in events] == \
+               ["one\n\ntwo", "de", "other", None]
+
+    asyncio.run(main())
+
+
+def test_pending_append_is_flushed_after_the_window():
+    async def main():
+        channel = EventChannel("run", coalesce_window=0.01)
+        await channel.publish(append("one"))
+        assert channel.seq == 0
+        await asyncio.sleep(0.05)
+        assert channel.seq == 1
+        channel.release()
+
+    asyncio.run(main())
+
+
+def test_stop_streaming_waits_until_the_end_is_read(pipe):
+    async def main():
+        stream = pipe.frontend_event_generator("run")
+        reader = asyncio.create_task(collect(stream))
+        await asyncio.sleep(0)
+        await pipe.stop_streaming("run", timeout=1)
+        assert reader.done() or (await reader)[-1]["command"] == "eos"
+        assert pipe.channel("run").drained.is_set()
+
+        # a subscriber that went away is not waited for
+        pipe.channel("idle").cursors[object()] = 0
+        await asyncio.wait_for(pipe.stop_streaming("idle", timeout=0.01), 1)
+
+    asyncio.run(main())
+
+
+def test_heartbeat_while_there_are_no_events(monkeypatch):
+    monkeypatch.setattr(data_pipe, "STREAM_HEARTBEAT", 0.01)
+
+    async def main():
+        stream = EventChannel("run").subscribe(0)
+        assert json.loads(await stream.__anext__())["command"] == "heartbeat"
+        await stream.aclose()
+
+    asyncio.run(main())
+
+
+def test_feedback_resolves_the_waiting_elicitation(pipe):
+    async def main():
+        first = pipe.expect_feedback("app", "run", "agent", "r1")
+        second = pipe.expect_feedback("app", "run", "agent", "r2")
+        feedback = {"app_id": "app", "app_ctx_id": "run", "agent_id": "agent", "request_id": "r2"}
+        assert pipe.put_feedback(feedback) is not False
+        assert second.result() is feedback
+        assert not first.done()
+        # answered twice
+        assert pipe.put_feedback(feedback) is False
+        # without a request id the oldest elicitation of the agent is answered
+        pipe.put_feedback({"app_id": "app", "app_ctx_id": "run", "agent_id": "agent"})
+        assert first.done()
+        await asyncio.sleep(0)
+        assert pipe.feedbacks == {}
+
+    asyncio.run(main())
+
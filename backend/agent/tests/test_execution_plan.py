@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from agent.execution_plan import ExecutionPlan, PlanScheduler
+
+
+def plan(edges, names=None):
+    """edges: "a>b" NEXT edges between one-letter agents, names: agent name -> node_id"""
+    agents = sorted({node_id for edge in edges for node_id in edge.split(">")})
+    prev, next = {}, {}
+    for edge in edges:
+        src, dest = edge.split(">")
+        next.setdefault(src, {})[dest] = None
+        prev.setdefault(dest, {})[src] = None
+    topology = SimpleNamespace(agents={node_id: None for node_id in agents}, prev=prev, next=next,
+                               by_name={name: [node_id] for name, node_id in (names or {}).items()}, version=1)
+    return ExecutionPlan.compile(topology)
+
+
+def run(plan, results=None):
+    order = []
+
+    async def invoke(node_id):
+        order.append(node_id)
+        await asyncio.sleep(0)
+        return (results or {}).get(node_id)
+
+    state = asyncio.run(PlanScheduler(plan, invoke).run())
+    return order, state
+
+
+def test_levels_and_joins():
+    compiled = plan(["a>b", "a>c", "b>d", "c>d"])
+    assert compiled.levels == [["a"], ["b", "c"], ["d"]]
+    order, state = run(compiled)
+    assert order == ["a", "b", "c", "d"]
+    assert set(state.values()) == {"done"}
+
+
+def test_route_skips_the_next_agents():
+    compiled = plan(["a>b", "b>d", "a>c"], names={"jump": "c"})
+    order, state = run(compiled, {"a": {"tool_name": "jump"}})
+    assert order == ["a", "c"]
+    assert state == {"a": "done", "b": "skipped", "c": "done", "d": "skipped"}
+
+
+def test_route_to_an_agent_that_already_ran_continues_along_next():
+    compiled = plan(["a>b", "b>c"], names={"back": "a"})
+    order, state = run(compiled, {"b": {"tool_name": "back"}})
+    assert order == ["a", "b", "c"]
+    assert state == {"a": "done", "b": "done", "c": "done"}
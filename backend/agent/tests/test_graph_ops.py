@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agent import graph_ops
+from models.graph_memory import MemoryGraphQuery
+
+
+class CountingGraph(MemoryGraphQuery):
+    def __init__(self):
+        super().__init__()
+        self.subtree_queries = 0
+
+    def get_subtree(self, *args, **kwargs):
+        self.subtree_queries += 1
+        return super().get_subtree(*args, **kwargs)
+
+
+@pytest.fixture
+def session():
+    return SimpleNamespace(graph=CountingGraph(), app_id="A", appctx_id="R", io_data_id="IO", agent_id="G")
+
+
+def children(graph, node_id):
+    return [(n["title"], n.get("order")) for n in graph.get_subtree(node_id).children(node_id)]
+
+
+def test_update_node_reuses_the_child_of_the_same_order(session):
+    graph = session.graph
+    dest = graph.add_node("Data", {"title": "dest"})
+    ctx = graph_ops.Ctx(graph, dest)
+    first = ctx.update_node(session, dest, {"node_id": "s1", "title": "one", "order": 0})
+    again = ctx.update_node(session, dest, {"node_id": "s2", "title": "other", "order": 0})
+    second = ctx.update_node(session, dest, {"node_id": "s3", "title": "two", "order": 1})
+    assert again["node_id"] == first["node_id"]
+    assert second["node_id"] != first["node_id"]
+    assert children(graph, dest["node_id"]) == [("one", 0), ("two", 1)]
+    # the destination tree is fetched once and kept in sync
+    assert graph.subtree_queries == 2
+    assert ctx.update_node(session, None, {"node_id": "s4"}) is dest
+
+
+def test_append_node_adds_to_the_loaded_tree(session):
+    graph = session.graph
+    dest = graph.add_node("Data", {"title": "dest"})
+    ctx = graph_ops.Ctx(graph, dest)
+    ctx.get_dest_tree()
+    appended = ctx.append_node(session, None, {"node_id": "s1", "title": "new", "order": 0})
+    assert appended["app_ctx_id"] == "R" and appended["node_id"] != "s1"
+    assert ctx.get_dest_tree().child_by_order(dest["node_id"], 0)["node_id"] == appended["node_id"]
+    assert children(graph, dest["node_id"]) == [("new", 0)]
+
+
+def test_copy_to_copies_the_levels_below(session):
+    graph = session.graph
+    src = graph.add_tree("Data", {"title": "src", "level": 0, "children": [
+        {"title": "h", "level": 1, "children": [{"title": "p", "level": 2}]},
+    ]})
+    dest = graph.add_node("Data", {"title": "dest"})
+    graph_ops.copy_to(session, src, dest, 0)
+    tree = graph.get_subtree(dest["node_id"])
+    assert [(n["title"], depth) for n, depth in tree.walk()] == [("dest", 0), ("h", 1), ("p", 2)]
@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+fastmcp = pytest.importorskip("fastmcp")
+
+from fastmcp.client.transports import FastMCPTransport, StdioTransport
+
+from agent import mcp_pool
+from agent.mcp_pool import MCPClientPool
+
+server = fastmcp.FastMCP("test")
+
+
+@server.tool
+def echo(text: str) -> str:
+    return text
+
+
+def transport_factory():
+    return FastMCPTransport(server)
+
+
+def test_checkout_reuses_and_recycles_processes():
+    async def main():
+        pool = MCPClientPool(transport_factory, min_size=0, max_size=2, max_requests=2)
+        clients = []
+        for text in "abc":
+            async with pool.checkout([]) as client:
+                result = await client.call_tool("echo", {"text": text})
+                assert result.data == text
+                clients.append(client)
+        # the process is replaced after max_requests checkouts
+        assert clients[0] is clients[1] and clients[2] is not clients[0]
+        stats = pool.stats()
+        assert stats["started"] == 2 and stats["recycled"] == 1 and stats["size"] == 1
+        await pool.close()
+        assert pool.stats()["size"] == 0
+
+    asyncio.run(main())
+
+
+def test_max_size_bounds_concurrent_checkouts():
+    async def main():
+        pool = MCPClientPool(transport_factory, min_size=0, max_size=1, max_requests=0)
+        active = 0
+        peak = 0
+
+        async def call(text):
+            nonlocal active, peak
+            async with pool.checkout([]) as client:
+                active += 1
+                peak = max(peak, active)
+                await client.call_tool("echo", {"text": text})
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*[call(text) for text in "abc"])
+        assert peak == 1
+        assert pool.stats()["started"] == 1 and pool.stats()["waits"] > 0
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_warm_up_replaces_recycled_processes():
+    async def main():
+        pool = MCPClientPool(transport_factory, min_size=2, max_size=4, max_requests=1)
+        await pool.warm_up()
+        assert pool.stats()["idle"] == 2
+        async with pool.checkout([]) as client:
+            await client.call_tool("echo", {"text": "a"})
+        await asyncio.sleep(0.05)
+        stats = pool.stats()
+        assert stats["recycled"] == 1 and stats["size"] == 2 and stats["idle"] == 2
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_roots_and_elicitation_handler_are_reset_after_the_checkout():
+    async def main():
+        pool = MCPClientPool(transport_factory, min_size=0, max_size=1, max_requests=0)
+
+        async def handler(message, response_type, params, context):
+            pass
+
+        async with pool.checkout(["file:///data"], handler) as client:
+            await client.call_tool("echo", {"text": "a"})
+        [proc] = pool._idle
+        assert proc.client is client
+        assert proc.roots == [] and proc.elicitation_handler is None
+        await pool.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("backend, snapshot_path, stdio", [
+    ("memgraph", None, True),
+    ("memory", None, True),
+    ("memory", "/tmp/graph", True),
+    # there are no files to share the graph through, the server must run in this process
+    ("memory", "", False),
+])
+def test_builtin_transport(monkeypatch, tmp_path, backend, snapshot_path, stdio):
+    module = types.ModuleType("mcp_bus.mcp_server")
+    module.mcp = server
+    monkeypatch.setitem(sys.modules, "mcp_bus.mcp_server", module)
+    monkeypatch.setattr(mcp_pool, "MCP_TRANSPORT", "stdio")
+    monkeypatch.setenv("GRAPH_BACKEND", backend)
+    if snapshot_path is None:
+        monkeypatch.delenv("GRAPH_SNAPSHOT_PATH", raising=False)
+    else:
+        monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", snapshot_path)
+    transport = mcp_pool.builtin_transport(tmp_path, tmp_path / "mcp_server.py")
+    assert isinstance(transport, StdioTransport if stdio else FastMCPTransport)
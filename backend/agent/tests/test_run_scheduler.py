@@ -0,0 +1,72 @@
+import asyncio
+
+from agent.run_scheduler import RunScheduler
+
+
+async def hold(scheduler, app_id, order, release):
+    async with scheduler.slot(app_id):
+        order.append(app_id)
+        await release.wait()
+
+
+def test_quotas():
+    async def main():
+        scheduler = RunScheduler(max_concurrency=3, app_concurrency=2)
+        release = asyncio.Event()
+        order = []
+        tasks = [asyncio.create_task(hold(scheduler, app_id, order, release)) for app_id in "aaab"]
+        await asyncio.sleep(0)
+        # a is at its quota of 2, b takes the last slot
+        assert sorted(order) == ["a", "a", "b"]
+        assert scheduler.stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        stats = scheduler.stats()
+        assert stats["running"] == 0 and stats["queued"] == 0
+        assert stats["started"] == stats["finished"] == 4
+
+    asyncio.run(main())
+
+
+def test_round_robin_over_applications():
+    async def main():
+        scheduler = RunScheduler(max_concurrency=1, app_concurrency=1)
+        order = []
+        gate = asyncio.Event()
+        first = asyncio.create_task(hold(scheduler, "x", order, gate))
+        await asyncio.sleep(0)
+        # a wide workflow queues first, the other applications must not wait for all of it
+        releases = []
+        tasks = []
+        for app_id in ["a"] * 3 + ["b"] * 2 + ["c"]:
+            release = asyncio.Event()
+            releases.append(release)
+            tasks.append(asyncio.create_task(hold(scheduler, app_id, order, release)))
+        await asyncio.sleep(0)
+        for release in [gate] + releases:
+            release.set()
+        await asyncio.gather(first, *tasks)
+        assert order == ["x", "a", "b", "c", "a", "b", "a"]
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        scheduler = RunScheduler(max_concurrency=1, app_concurrency=1)
+        release = asyncio.Event()
+        order = []
+        running = asyncio.create_task(hold(scheduler, "a", order, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(scheduler, "b", order, release))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await running
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert order == ["a"]
+        assert scheduler.stats()["running"] == 0
+        async with scheduler.slot("c"):
+            assert scheduler.total_running == 1
+
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from agent.tool_catalog import ToolCatalog, server_fingerprint
+
+
+class Tool:
+    def __init__(self, name):
+        self.name = name
+
+    def model_dump(self, mode):
+        return {"name": self.name, "description": f"{self.name} tool", "outputSchema": None}
+
+
+class Pool:
+    """MCPClientPool standing in for the builtin server, counts list_tools calls"""
+
+    def __init__(self, names):
+        self.names = names
+        self.calls = 0
+
+    @asynccontextmanager
+    async def checkout(self, roots):
+        async def list_tools():
+            self.calls += 1
+            return [Tool(name) for name in self.names]
+        yield SimpleNamespace(list_tools=list_tools)
+
+
+def test_server_fingerprint(tmp_path):
+    (tmp_path / "server.py").write_text("print(1)")
+    (tmp_path / "data.json").write_text("{}")
+    fingerprint = server_fingerprint(tmp_path)
+    assert fingerprint == server_fingerprint(tmp_path)
+    (tmp_path / "data.json").write_text("[]")
+    assert server_fingerprint(tmp_path) == fingerprint
+    (tmp_path / "server.py").write_text("print(2)")
+    assert server_fingerprint(tmp_path) != fingerprint
+    (tmp_path / "server.py").write_text("print(1)")
+    (tmp_path / "utils").mkdir()
+    (tmp_path / "utils" / "helpers.py").write_text("")
+    assert server_fingerprint(tmp_path) != fingerprint
+
+
+def test_catalog_is_listed_once_per_build(tmp_path):
+    mcp_dir, cache_dir = tmp_path / "mcp_bus", tmp_path / "cache"
+    mcp_dir.mkdir()
+    (mcp_dir / "server.py").write_text("print(1)")
+
+    async def main():
+        pool = Pool(["echo", "search"])
+        catalog = ToolCatalog(pool, mcp_dir, cache_dir)
+        fingerprint, tools = await catalog.get()
+        assert await catalog.get() == (fingerprint, tools)
+        assert [tool["name"] for tool in tools] == ["echo", "search"]
+        assert set(tools[0]) == {"name", "description"}
+        assert json.loads((cache_dir / f"tools_{fingerprint}.json").read_text()) == tools
+
+        # a restart with the same build reads the disk cache
+        restarted = ToolCatalog(pool, mcp_dir, cache_dir)
+        assert await restarted.get() == (fingerprint, tools)
+        assert pool.calls == 1
+
+        # a new build lists the tools again
+        (mcp_dir / "server.py").write_text("print(2)")
+        pool.names = ["echo"]
+        rebuilt = ToolCatalog(pool, mcp_dir, cache_dir)
+        new_fingerprint, new_tools = await rebuilt.get()
+        assert new_fingerprint != fingerprint and [tool["name"] for tool in new_tools] == ["echo"]
+        assert pool.calls == 2
+
+    asyncio.run(main())
+
+
+def test_corrupt_cache_is_listed_again(tmp_path):
+    async def main():
+        pool = Pool(["echo"])
+        catalog = ToolCatalog(pool, tmp_path, tmp_path / "cache")
+        (tmp_path / "cache").mkdir()
+        (tmp_path / "cache" / f"tools_{server_fingerprint(tmp_path)}.json").write_text("[{")
+        fingerprint, tools = await catalog.get()
+        assert pool.calls == 1 and tools == [{"name": "echo", "description": "echo tool"}]
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from agent.topology import AgentTopology
+from models.graph_memory import MemoryGraphQuery
+
+
+def make_agent(node):
+    return SimpleNamespace(node_id=node["node_id"], name=node["name"])
+
+
+def ids(agents):
+    return [agent.node_id for agent in agents]
+
+
+def topology():
+    graph = MemoryGraphQuery()
+    graph.add_nodes_bulk("Agent", [{"node_id": node_id, "app_id": "A", "name": node_id.upper()} for node_id in "abcd"])
+    graph.add_nodes_bulk("Agent", [{"node_id": "x", "app_id": "B", "name": "X"}])
+    graph.add_edges_bulk("Agent", "NEXT", "Agent", [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("d", "x")])
+    graph.add_edges_bulk("Agent", "INPUT", "Agent", [("d", "b"), ("d", "a")])
+    topology = AgentTopology()
+    topology.load(graph.get_neighborhood("Agent", {"app_id": "A"}, ["NEXT", "INPUT"], ["node_id"]), make_agent)
+    return topology
+
+
+def test_load_from_the_neighborhood():
+    topo = topology()
+    assert topo.loaded
+    assert list(topo.agents) == ["a", "b", "c", "d"]
+    # edges to agents of other applications are left out
+    assert topo.edges == [("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")]
+    assert ids(topo.heads) == ["a"]
+    assert ids(topo.successors("a")) == ["b", "c"]
+    assert topo.get_inputs("d") == ["b", "a"]
+    assert topo.incomes["d"] == {"b", "c"} and topo.incomes["a"] == set()
+    assert topo.find("C").node_id == "c" and topo.find("X") is None
+
+
+def test_updates():
+    topo = topology()
+    version = topo.version
+    topo.add_agent(make_agent({"node_id": "e", "name": "E"}))
+    topo.add_edge("d", "e")
+    assert ids(topo.successors("d")) == ["e"] and topo.incomes["e"] == {"d"}
+    topo.del_edge("a", "c")
+    assert ids(topo.heads) == ["a", "c"]
+
+    topo.agents["e"].name = "F"
+    topo.rename("e", "E")
+    assert topo.find("E") is None and topo.find("F").node_id == "e"
+
+    topo.del_agent("d")
+    assert topo.get("d") is None and topo.find("D") is None
+    assert topo.edges == [("a", "b")]
+    assert ids(topo.heads) == ["a", "c", "e"]
+    assert "d" not in topo.inputs
+    topo.del_agent("missing")
+    assert topo.version > version
+
+
+def test_inputs_of_deleted_agents_are_dropped():
+    topo = topology()
+    topo.add_input("c", "b")
+    topo.del_input("d", "a")
+    topo.del_agent("b")
+    assert topo.get_inputs("c") == [] and topo.get_inputs("d") == []
+
+
+def test_every_change_of_the_dag_bumps_the_version():
+    topo = topology()
+    versions = [topo.version]
+    for change in (lambda: topo.add_edge("b", "c"), lambda: topo.del_edge("b", "c"),
+                   lambda: topo.rename("a", "A"), lambda: topo.del_agent("c"),
+                   lambda: topo.add_agent(make_agent({"node_id": "c", "name": "C"}))):
+        change()
+        versions.append(topo.version)
+    assert versions == sorted(set(versions))
+    topo.clear()
+    assert topo.version > versions[-1] and not topo.loaded and topo.agents == {}
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from importlib import metadata
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+TOOL_FIELDS = ["name", "title", "description", "inputSchema", "icons", "annotations", "meta"]
+
+
+def server_fingerprint(mcp_dir):
+    """hash of the sources of the MCP server package and the fastmcp version, changed by every server build"""
+    digest = hashlib.sha256()
+    try:
+        digest.update(metadata.version("fastmcp").encode())
+    except metadata.PackageNotFoundError:
+        pass
+    for path in sorted(Path(mcp_dir).rglob("*.py")):
+        digest.update(str(path.relative_to(mcp_dir)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class ToolCatalog:
+    """
+    The tools of the builtin MCP server, shared by all applications.
+
+    list_tools is called once per server build (see server_fingerprint), the result is kept in memory
+    and in cache_dir/tools_{fingerprint}.json, so a restart with the same build does not call the server.
+    """
+
+    def __init__(self, mcp_pool, mcp_dir, cache_dir):
+        self.mcp_pool = mcp_pool
+        self.mcp_dir = Path(mcp_dir)
+        self.cache_dir = Path(cache_dir)
+        self.fingerprint = None
+        self.tools = None
+        self._lock = None
+
+    def _cache_path(self, fingerprint):
+        return self.cache_dir / f"tools_{fingerprint}.json"
+
+    def _read_cache(self, fingerprint):
+        try:
+            with open(self._cache_path(fingerprint), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, fingerprint, tools):
+        path = self._cache_path(fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(tools, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    async def _list_tools(self):
+        async with self.mcp_pool.checkout([]) as mcp_client:
+            tools = await mcp_client.list_tools()
+        return [{k: v for k, v in tool.model_dump(mode="json").items() if k in TOOL_FIELDS} for tool in tools]
+
+    async def get(self):
+        """(fingerprint, tools) of the current server build"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self.tools is not None:
+            return self.fingerprint, self.tools
+        async with self._lock:
+            if self.tools is None:
+                # the server code of a running process does not change, it is hashed once
+                fingerprint = await asyncio.to_thread(server_fingerprint, self.mcp_dir)
+                tools = await asyncio.to_thread(self._read_cache, fingerprint)
+                if tools is None:
+                    tools = await self._list_tools()
+                    await asyncio.to_thread(self._write_cache, fingerprint, tools)
+                    log.info(f"Tool catalog {fingerprint}: {len(tools)} tools listed from the MCP server.")
+                self.fingerprint, self.tools = fingerprint, tools
+            return self.fingerprint, self.tools
@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+
+class AgentTopology:
+    """
+    In-memory DAG of the agents of an application: the NEXT edges (run order) and the INPUT edges
+    (agent -> agent whose output it reads), with node_id and name indexes.
+
+    It is loaded with one graph query and then maintained by the Application methods changing the
+    agents or edges, so topology reads are dictionary lookups. Edges keep their insertion order.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        self.version = getattr(self, "version", 0) + 1  # changed by every update, see ExecutionPlan
+        self.agents = {}  # node_id -> SuperAgent
+        self.by_name = defaultdict(dict)  # name -> node_id -> SuperAgent
+        self.next = defaultdict(dict)  # node_id -> node_ids of the next agents
+        self.prev = defaultdict(dict)  # node_id -> node_ids of the previous agents
+        self.inputs = defaultdict(dict)  # node_id -> node_ids of the input agents
+
+    def load(self, neighborhood, make_agent):
+        """neighborhood: get_neighborhood rows of the agents with their NEXT/INPUT targets"""
+        self.clear()
+        for node, rels in neighborhood:
+            self.add_agent(make_agent(node))
+        for node, rels in neighborhood:
+            for rel_type, target in rels:
+                if target["node_id"] not in self.agents:
+                    continue
+                if rel_type == "NEXT":
+                    self.add_edge(node["node_id"], target["node_id"])
+                elif rel_type == "INPUT":
+                    self.add_input(node["node_id"], target["node_id"])
+        self.loaded = True
+
+    def add_agent(self, agent):
+        self.version += 1
+        self.agents[agent.node_id] = agent
+        self.by_name[agent.name][agent.node_id] = agent
+
+    def del_agent(self, node_id):
+        self.version += 1
+        agent = self.agents.pop(node_id, None)
+        if agent is None:
+            return
+        self.by_name[agent.name].pop(node_id, None)
+        for dest in self.next.pop(node_id, {}):
+            self.prev[dest].pop(node_id, None)
+        for src in self.prev.pop(node_id, {}):
+            self.next[src].pop(node_id, None)
+        self.inputs.pop(node_id, None)
+        for inputs in self.inputs.values():
+            inputs.pop(node_id, None)
+
+    def rename(self, node_id, old_name):
+        self.version += 1
+        agent = self.agents[node_id]
+        self.by_name[old_name].pop(node_id, None)
+        self.by_name[agent.name][node_id] = agent
+
+    def add_edge(self, src, dest):
+        self.version += 1
+        self.next[src][dest] = None
+        self.prev[dest][src] = None
+
+    def del_edge(self, src, dest):
+        self.version += 1
+        self.next[src].pop(dest, None)
+        self.prev[dest].pop(src, None)
+
+    def add_input(self, node_id, input_id):
+        self.inputs[node_id][input_id] = None
+
+    def del_input(self, node_id, input_id):
+        self.inputs[node_id].pop(input_id, None)
+
+    def get(self, node_id):
+        return self.agents.get(node_id)
+
+    def find(self, name):
+        """the first agent named name"""
+        return next(iter(self.by_name.get(name, {}).values()), None)
+
+    def successors(self, node_id):
+        return [self.agents[dest] for dest in self.next.get(node_id, {}) if dest in self.agents]
+
+    def get_inputs(self, node_id):
+        return list(self.inputs.get(node_id, {}))
+
+    @property
+    def heads(self):
+        """agents without a previous agent"""
+        return [agent for node_id, agent in self.agents.items() if not self.prev.get(node_id)]
+
+    @property
+    def edges(self):
+        return [(src, dest) for src, dests in self.next.items() for dest in dests]
+
+    @property
+    def incomes(self):
+        """node_id -> node_ids of the previous agents"""
+        return defaultdict(set, {node_id: set(srcs) for node_id, srcs in self.prev.items() if srcs})
@@ -80,6 +80,9 @@ HF_URL = os.environ.get("HF_URL", "")
 INTERVL_URL = os.environ.get("INTERVL_URL", "")
 OMPT_URL = os.environ.get("OMPT_URL", "")
 
+# seconds an agent's MCP elicitation waits for the user's feedback before it is declined
+ELICITATION_TIMEOUT = float(os.environ.get("ELICITATION_TIMEOUT", "600"))
+
 ####################################
 # LOGIN Behavior
 ####################################
@@ -0,0 +1,115 @@
+"""
+Fixtures shared by the backend tests. The file sits in backend/ so the tests import the modules
+the way main.py does: models.graph_db, agent.data_pipe, config.
+"""
+import mgclient
+import pytest
+
+from agent.data_pipe import DataPipe
+from models import graph_db
+from models.graph_db import ConnectionPool, GraphQuery
+
+
+class FakeNode:
+    """an mgclient.Node in a result row"""
+
+    def __init__(self, labels, properties):
+        self.labels = set(labels)
+        self.properties = properties
+
+
+class FakeColumn:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((query, params or {}))
+        rows = self.conn.respond(query, params or {}) or []
+        self.description = [FakeColumn(name) for name in rows[0]] if rows else None
+        self.rows = [tuple(row.values()) for row in rows]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    A Memgraph connection that records the executed queries in queries and answers them with
+    respond(query, params) -> list of row dicts.
+    """
+
+    def __init__(self, respond=None):
+        self.status = mgclient.CONN_STATUS_READY
+        self.autocommit = True
+        self.respond = respond or (lambda query, params: [])
+        self.queries = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(ConnectionPool):
+    def __init__(self, connect=FakeConnection, **kwargs):
+        super().__init__("localhost", 7687, **kwargs)
+        self.connect = connect
+        self.created = []
+
+    def _connect(self):
+        conn = self.connect()
+        self.created.append(conn)
+        return conn
+
+
+@pytest.fixture
+def make_pool():
+    """ConnectionPool(**kwargs) handing out FakeConnections"""
+    return FakePool
+
+
+@pytest.fixture
+def memgraph(monkeypatch):
+    """(GraphQuery, FakeConnection): every pooled and lazy connection of the GraphQuery is the FakeConnection"""
+    conn = FakeConnection()
+    monkeypatch.setattr(graph_db.mgclient, "connect", lambda **kwargs: conn)
+    graph = GraphQuery()
+    graph.pool = FakePool(connect=lambda: conn)
+    return graph, conn
+
+
+class Application:
+    """owner of a DataPipe without a run context"""
+    ctx = None
+
+
+@pytest.fixture
+def pipe():
+    """DataPipe of an application the fixture keeps alive, the pipe only holds a weak reference to it"""
+    app = Application()
+    yield DataPipe(app)
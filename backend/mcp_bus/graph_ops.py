@@ -2,6 +2,13 @@ class Ctx:
     def __init__(self, graph, dest_node):
         self.graph = graph
         self.root = dest_node
+        self.dest_tree = None
+
+    def get_dest_tree(self):
+        # the existing destination tree is loaded once and kept in sync by update_node/append_node
+        if self.dest_tree is None:
+            self.dest_tree = self.graph.get_subtree(self.root['node_id'])
+        return self.dest_tree
 
     def update_node(self, app_session, parent, node):
         if parent is None:
@@ -11,16 +18,9 @@ class Ctx:
             # print(f"[update] parent_id: {parent['node_id']}, title: {parent.get('title', parent.get('name', 'notitle'))}， node_id: {node['node_id']}, title: {node.get('title', node.get('name', 'notitle'))}")
             pass
 
-        rels = app_session.graph.get_relationship(
-            {
-                "src_label": "Data",
-                "src_props": {"node_id": parent['node_id']},
-                "rel_types": ['SUBHEADING'],
-                "target_props": {"order": node.get('order', 0)},
-                "hop_num": 1
-            }
-        )
-        if not rels:
+        dest_tree = self.get_dest_tree()
+        child = dest_tree.child_by_order(parent['node_id'], node.get('order', 0))
+        if child is None:
             copy_node = node.copy()
             del copy_node['node_id']
             new_node = app_session.graph.add_node("Data", copy_node)
@@ -31,9 +31,9 @@ class Ctx:
                 "Data",
                 new_node['node_id']
             )
-            return new_node
+            return dest_tree.add(new_node, parent['node_id'])
         else:
-            return rels[0][2]
+            return child
 
     def append_node(self, app_session, parent, node):
         if parent is None:
@@ -59,29 +59,23 @@ class Ctx:
             "Data",
             new_node['node_id']
         )
+        if self.dest_tree is not None:
+            self.dest_tree.add(new_node, parent['node_id'])
         return new_node
 
 
-def traverse_tree(app_session, ctx, parent, node, level):
+def traverse_tree(app_session, ctx, parent, node, level, tree=None):
+    if tree is None:
+        tree = app_session.graph.get_subtree(node['node_id'])
+
     copy_node = None
     if node.get("level", 0) == level:
         copy_node = ctx.update_node(app_session, parent, node)
     elif node.get("level", 0) > level:
         copy_node = ctx.append_node(app_session, parent, node)
 
-    rels = app_session.graph.get_relationship(
-        {
-            "src_label": "Data",
-            "src_props": {"node_id": node['node_id']},
-            "rel_types": ['SUBHEADING'],
-            "hop_num": 1
-        }
-    )
-
-    rels = sorted(rels, key=lambda odr: odr[2].get("order", 0))
-
-    for _, _, n in rels:
-        traverse_tree(app_session, ctx, copy_node, n, level)
+    for n in tree.children(node['node_id']):
+        traverse_tree(app_session, ctx, copy_node, n, level, tree)
 
 def merge_tree(app_session, root_node, level, dest_node_name):
     # Delete old node
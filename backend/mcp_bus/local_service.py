@@ -103,7 +103,9 @@ async def graph_copy_to(app_session, filename, title, target_node_name):
             "src_label": "Data",
             "src_props": {"app_ctx_id": app_session.appctx_id, "name": WHITE_BOARD},
             "rel_types": ["SUBHEADING"],
-            "hop_num": 1
+            "hop_num": 1,
+            "src_prop_keys": ["node_id"],
+            "target_prop_keys": ["node_id", "title", "type", "company"]
         }
     )
     nodes = [
@@ -159,7 +161,9 @@ async def merge_table(app_session, filename, title, table_index,  group, target_
             "src_label": "Data",
             "src_props": {"app_ctx_id": app_session.appctx_id, "name": WHITE_BOARD},
             "rel_types": ["SUBHEADING"],
-            "hop_num": 1
+            "hop_num": 1,
+            "src_prop_keys": ["node_id"],
+            "target_prop_keys": ["node_id", "title", "type", "company"]
         }
     )
     nodes = [
@@ -1,5 +1,8 @@
+import os
 import json
+import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 from fastmcp import FastMCP, Context
 from dataclasses import dataclass
@@ -10,6 +13,17 @@ from pathlib import Path
 
 mcp = FastMCP(name="BuiltinServer")
 
+# the local_service tool bodies never await, they read/write documents and the graph synchronously.
+# They run on these threads, so a server running inside the API process does not block its event loop.
+TOOL_WORKERS = int(os.environ.get("MCP_TOOL_WORKERS", "4"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mcp_tool")
+
+
+async def run_tool(fn, *args):
+    """run the local_service coroutine function fn on the tool worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(tool_executor, lambda: asyncio.run(fn(*args)))
+
 async def end_client_elicit(ctx):
     end_control = {
         "command": "end"
@@ -90,7 +104,7 @@ async def read_docx_from_dir(subdirectory: str, file_format: str, ctx: Context)
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.read_docs_from_dir(app_session, Path(app_session.appctx_id) / subdirectory, file_format)
+        ret = await run_tool(local_service.read_docs_from_dir, app_session, Path(app_session.appctx_id) / subdirectory, file_format)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -107,7 +121,7 @@ async def read_docx_tmpl(filename: str, ctx: Context) -> str:
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.read_docx_tmpl(app_session, filename)
+        ret = await run_tool(local_service.read_docx_tmpl, app_session, filename)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -144,7 +158,7 @@ async def write_docx(template_file_name,filename: str, ctx: Context) -> str:
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.write_graph_to_docx(app_session, template_file_name, filename)
+        ret = await run_tool(local_service.write_graph_to_docx, app_session, template_file_name, filename)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -164,7 +178,7 @@ async def graph_copy_to(filename, title, target_node_name, ctx: Context) -> str:
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.graph_copy_to(app_session, filename, title, target_node_name)
+        ret = await run_tool(local_service.graph_copy_to, app_session, filename, title, target_node_name)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -186,7 +200,7 @@ async def merge_table(filename, title, table_index, group, target_node_name, ctx
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.merge_table(app_session, filename, title, table_index, group, target_node_name)
+        ret = await run_tool(local_service.merge_table, app_session, filename, title, table_index, group, target_node_name)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -202,7 +216,7 @@ async def retrieve_scope(scope_name: str, query: str, ctx: Context) -> str:
     roots = await ctx.list_roots()
     app_session = MCPSession([str(root.uri) for root in roots], ctx)
     try:
-        ret = await local_service.retrieve_scope(app_session, scope_name, query)
+        ret = await run_tool(local_service.retrieve_scope, app_session, scope_name, query)
         return json.dumps(ret)
     except Exception as e:
         app_session.write_log(e)
@@ -21,16 +21,33 @@ class MCPSession:
         with open(r"app.log", "a") as f:
             f.write(f"[{self.app_id}-{self.agent_id}-{self.appctx_id}-{self.io_data_id}]{message}\n")
 
-    def add_node(self, data):
-        data |= {
+    def session_props(self):
+        return {
             "app_id": self.app_id,
             "agent_id": self.agent_id,
             "app_ctx_id": self.appctx_id,
             "io_data_id": self.io_data_id
         }
+
+    def add_node(self, data):
+        data |= self.session_props()
         node = self.graph.add_node("Data", data)
         return node
 
+    def add_tree(self, parent, tree):
+        """
+        write a whole SUBHEADING tree under parent in one transaction
+        """
+        return self.graph.add_tree("Data", tree, "SUBHEADING",
+                                   parent_id=parent['node_id'] if parent else None,
+                                   common_props=self.session_props())
+
+    def add_children(self, parent, children):
+        nodes = self.graph.add_nodes_bulk("Data", [child | self.session_props() for child in children])
+        self.graph.add_edges_bulk("Data", "SUBHEADING", "Data",
+                                  [(parent['node_id'], node['node_id']) for node in nodes])
+        return nodes
+
     def __enter__(self):
         return self
 
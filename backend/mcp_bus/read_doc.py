@@ -199,37 +199,14 @@ class DocReader:
 
     def read_doc(self, docx_file, assets_dir=None):
         tree = create_tree_structure(self.app_session.app_id, self.app_session.appctx_id, docx_file, assets_dir=assets_dir)
-        def add_node(parent, node):
-            children = node['children']
-            del node['children']
-            node = self.app_session.add_node(node)
-            if parent is not None:
-                self.app_session.graph.add_relationship(
-                    "Data",
-                    parent['node_id'],
-                    "SUBHEADING",
-                    "Data",
-                    node['node_id']
-                )
-            for i, child in enumerate(children):
-                add_node(node, child | {"order": i})
-        add_node(self.root_node, tree)
+        # children get their "order" from the position in the tree
+        self.app_session.add_tree(self.root_node, tree)
 
 
     def read_tmpl(self, tmpl_file):
         tpl = DocxTemplate(tmpl_file)
         variable_names = tpl.get_undeclared_template_variables()
-        def add_node(parent, node):
-            node = self.app_session.add_node(node)
-            self.app_session.graph.add_relationship(
-                "Data",
-                parent['node_id'],
-                "SUBHEADING",
-                "Data",
-                node['node_id']
-            )
-        for v_name in variable_names:
-            add_node(self.root_node, {"type": "Task", "name": v_name})
+        self.app_session.add_children(self.root_node, [{"type": "Task", "name": v_name} for v_name in variable_names])
 
 # 示例用法
 if __name__ == "__main__":
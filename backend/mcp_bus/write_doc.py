@@ -328,7 +328,9 @@ class Context:
             self.merge_table_with_xpath(item, table_index, group)
 
 
-def traverse_tree(ctx, parent, node, level, action = None, table_index = -1, group = None):
+def traverse_tree(ctx, parent, node, level, action = None, table_index = -1, group = None, tree = None):
+    if tree is None:
+        tree = ctx.app_session.graph.get_subtree(node['node_id'])
     ctx.app_session.write_log(f"node={node}")
     if action is None:
         action = node.get("action", None)
@@ -338,19 +340,8 @@ def traverse_tree(ctx, parent, node, level, action = None, table_index = -1, gro
     if node.get("level", 0) >= level:
         ctx.handle(node, action, table_index, group)
 
-    rels = ctx.app_session.graph.get_relationship(
-        {
-            "src_label": "Data",
-            "src_props": {"node_id": node['node_id']},
-            "rel_types": ['SUBHEADING'],
-            "hop_num": 1
-        }
-    )
-
-    rels = sorted(rels, key=lambda odr: odr[2].get("order", 0))
-
-    for _, _, n in rels:
-        traverse_tree(ctx, node, n, level, action, table_index, group)
+    for n in tree.children(node['node_id']):
+        traverse_tree(ctx, node, n, level, action, table_index, group, tree)
 
 def write_tree(app_session, tpl, var_node):
     sd = tpl.new_subdoc()
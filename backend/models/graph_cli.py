@@ -1,15 +1,30 @@
 import argparse
+import gzip
+import json
+import time
+from contextlib import nullcontext
 import graph_db
 
+# line-delimited snapshot format: a header line, node chunks of one label, then relationship chunks
+# of one (src_label, rel_type, dest_label). A ".gz" path is gzip compressed.
+EXPORT_FORMAT = "onenode-graph"
+EXPORT_VERSION = 1
+EXPORT_CHUNK_SIZE = 5000
+
+
+def open_snapshot(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=3)
+    return open(path, mode, encoding="utf-8")
+
+
 class GraphManager:
     def __init__(self):
         self.default_list_key_num = 5
 
-    def list_nodes(self, label):
-        if label is None:
-            nodes = graph_db.graph_query().list_all_node()
-        else:
-            nodes = graph_db.graph_query().get_node(label)
+    def list_nodes(self, label, page_size):
+        # nodes are fetched page by page, so listing a large graph does not load it at once
+        nodes = graph_db.graph_query().iter_nodes(label, page_size=page_size)
         for node in nodes:
             key_values = ",".join([f"{k}:{v[:20] if isinstance(v, str) else v}" for i, (k, v) in enumerate(node.items())
                                    if k not in ["label", "node_id"] and i < self.default_list_key_num])
@@ -27,7 +42,7 @@ class GraphManager:
             print(f"{r[0]['label']}, {r[0]['node_id']} -- {rel_types} --> {r[2]['label']}, {r[2]['node_id']}")
 
     def delete_all_nodes(self):
-        graph_db.graph_service().clean_database()
+        graph_db.graph_query().clean_database()
 
     def delete_node(self, label, node_id=None):
         graph_db.graph_query().delete_node(label,
@@ -39,6 +54,84 @@ class GraphManager:
     def delete_edge(self, start_node, edge_type):
         pass
 
+    def export_graph(self, path, chunk_size):
+        graph = graph_db.graph_query()
+        start = time.time()
+        counts = {"nodes": 0, "edges": 0}
+        with open_snapshot(path, "w") as f:
+            def write(kind, key, rows):
+                f.write(json.dumps({"kind": kind, **key, "rows": rows}, ensure_ascii=False, default=str) + "\n")
+                counts[kind] += len(rows)
+
+            f.write(json.dumps({"kind": "header", "format": EXPORT_FORMAT, "version": EXPORT_VERSION}) + "\n")
+            # one buffer per label / edge pattern, at most chunk_size rows each
+            nodes = {}
+            for label, props in graph.export_nodes(chunk_size):
+                props.pop("label", None)
+                rows = nodes.setdefault(label, [])
+                rows.append(props)
+                if len(rows) >= chunk_size:
+                    write("nodes", {"label": label}, nodes.pop(label))
+            for label, rows in nodes.items():
+                write("nodes", {"label": label}, rows)
+            print(f"exported {counts['nodes']} nodes in {time.time() - start:.1f}s")
+
+            edges = {}
+            for src_label, src_id, rel_type, dest_label, dest_id in graph.export_edges(chunk_size):
+                pattern = (src_label, rel_type, dest_label)
+                rows = edges.setdefault(pattern, [])
+                rows.append([src_id, dest_id])
+                if len(rows) >= chunk_size:
+                    write("edges", dict(zip(["src_label", "rel_type", "dest_label"], pattern)), edges.pop(pattern))
+            for pattern, rows in edges.items():
+                write("edges", dict(zip(["src_label", "rel_type", "dest_label"], pattern)), rows)
+            f.write(json.dumps({"kind": "footer", **counts}) + "\n")
+        print(f"exported {counts['edges']} relationships to {path} in {time.time() - start:.1f}s")
+
+    def import_graph(self, path, bulk):
+        graph = graph_db.graph_query()
+        start = time.time()
+        counts = {"nodes": 0, "edges": 0}
+        labels = set()
+        with open_snapshot(path, "r") as f, (graph.bulk_load() if bulk else nullcontext()):
+            header = json.loads(f.readline() or "{}")
+            if header.get("format") != EXPORT_FORMAT or header.get("version") != EXPORT_VERSION:
+                raise ValueError(f"{path} is not a graph snapshot of version {EXPORT_VERSION}")
+            for line in f:
+                chunk = json.loads(line)
+                rows = chunk.get("rows", [])
+                if chunk["kind"] == "nodes":
+                    if chunk["label"] not in labels:
+                        # the edge lookups of a label need its node_id index before the edges are written
+                        labels.add(chunk["label"])
+                        graph.ensure_node_id_schema([chunk["label"]], constraints=not bulk)
+                    graph.add_nodes_bulk(chunk["label"], rows, batch_size=len(rows) or 1, create=bulk)
+                elif chunk["kind"] == "edges":
+                    graph.add_edges_bulk(chunk["src_label"], chunk["rel_type"], chunk["dest_label"], rows,
+                                         batch_size=len(rows) or 1, create=bulk)
+                else:
+                    continue
+                counts[chunk["kind"]] += len(rows)
+                print(f"\rimported {counts['nodes']} nodes, {counts['edges']} relationships", end="", flush=True)
+        if bulk:
+            graph.ensure_node_id_schema(labels)
+        print(f"\nimported {path} in {time.time() - start:.1f}s")
+
+    def gc_blobs(self, min_age):
+        result = graph_db.graph_query().gc_blobs(min_age)
+        print(f"removed {result['removed']} unreferenced blobs, {result['bytes']} bytes")
+
+    def show_schema(self):
+        info = graph_db.graph_query().schema_info()
+        for index in info["indexes"]:
+            print("index: " + ", ".join(f"{k}: {v}" for k, v in index.items()))
+        for constraint in info["constraints"]:
+            print("constraint: " + ", ".join(f"{k}: {v}" for k, v in constraint.items()))
+
+    def rebuild_schema(self, drop):
+        graph_db.graph_query().ensure_schema(rebuild=drop)
+        self.show_schema()
+
 
 def main():
     graph_manager = GraphManager()
@@ -52,7 +145,8 @@ def main():
     # 1. 列出所有节点的命令
     list_nodes_parser = subparsers.add_parser("list-nodes", help="列出所有节点")
     list_nodes_parser.add_argument("-l", "--label", default=None, help="节点标签")
-    list_nodes_parser.set_defaults(func=lambda args: graph_manager.list_nodes(args.label))
+    list_nodes_parser.add_argument("-p", "--page_size", type=int, default=graph_db.ITER_FETCH_SIZE, help="每次查询的节点数")
+    list_nodes_parser.set_defaults(func=lambda args: graph_manager.list_nodes(args.label, args.page_size))
 
     # 2. 列出所有边的命令
     list_edges_parser = subparsers.add_parser("list-edges", help="列出所有边")
@@ -79,6 +173,34 @@ def main():
         func=lambda args: graph_manager.delete_edge(args.start_node, args.edge_type)
     )
 
+    # 6. 查看索引和约束的命令
+    show_schema_parser = subparsers.add_parser("show-schema", help="查看索引和约束")
+    show_schema_parser.set_defaults(func=lambda args: graph_manager.show_schema())
+
+    # 7. 重建索引和约束的命令
+    rebuild_schema_parser = subparsers.add_parser("rebuild-schema", help="创建缺失的索引和约束")
+    rebuild_schema_parser.add_argument("--drop", action="store_true", help="先删除已有的索引和约束再重建")
+    rebuild_schema_parser.set_defaults(func=lambda args: graph_manager.rebuild_schema(args.drop))
+
+    # 8. 导出图数据的命令
+    export_parser = subparsers.add_parser("export", help="分块流式导出所有节点和边")
+    export_parser.add_argument("-o", "--output", required=True, help="导出文件路径, 以 .gz 结尾时压缩")
+    export_parser.add_argument("-c", "--chunk_size", type=int, default=EXPORT_CHUNK_SIZE, help="每块的节点或边数")
+    export_parser.set_defaults(func=lambda args: graph_manager.export_graph(args.output, args.chunk_size))
+
+    # 9. 导入图数据的命令
+    import_parser = subparsers.add_parser("import", help="分块批量导入 export 生成的文件")
+    import_parser.add_argument("-i", "--input", required=True, help="导入文件路径")
+    import_parser.add_argument("--bulk", action="store_true",
+                               help="导入空库的快速模式: 使用分析存储模式, 导入完成后再创建并检查唯一约束")
+    import_parser.set_defaults(func=lambda args: graph_manager.import_graph(args.input, args.bulk))
+
+    # 10. 清理未被引用的大字段文件的命令
+    gc_blobs_parser = subparsers.add_parser("gc-blobs", help="删除没有节点引用的大字段文件")
+    gc_blobs_parser.add_argument("--min_age", type=float, default=graph_db.BLOB_GC_MIN_AGE,
+                                 help="只删除早于该秒数写入的文件, 其节点可能尚未提交")
+    gc_blobs_parser.set_defaults(func=lambda args: graph_manager.gc_blobs(args.min_age))
+
     # 解析命令行参数并执行对应的函数
     args = parser.parse_args()
     args.func(args)  # 调用通过 set_defaults 绑定的处理函数
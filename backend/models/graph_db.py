@@ -1,12 +1,28 @@
 import os
+import re
 import json
-from collections import defaultdict
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from contextlib import contextmanager
 from typing import Any
 import logging
 import mgclient
 import string
 import random
 import traceback
+import copy
+import hashlib
+import mmap
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 logger = logging.getLogger(__name__)
@@ -18,6 +34,8 @@ logger = logging.getLogger(__name__)
 
 graph_service_ = None
 graph_query_ = None
+async_graph_query_ = None
+blob_store_ = None
 
 def graph_service():
     global graph_service_
@@ -28,9 +46,44 @@ def graph_service():
 def graph_query():
     global graph_query_
     if graph_query_ is None:
-        graph_query_ = GraphQuery()
+        if GRAPH_BACKEND == "memory":
+            # graph_cli imports this module as a top-level module
+            try:
+                from .graph_memory import MemoryGraphQuery
+            except ImportError:
+                from graph_memory import MemoryGraphQuery
+            # an empty GRAPH_SNAPSHOT_PATH keeps the graph in memory only
+            graph_query_ = MemoryGraphQuery(os.environ.get(
+                "GRAPH_SNAPSHOT_PATH", str(Path(os.environ.get("IS_KB_PATH", "/is_kb")) / "graph" / "graph")))
+        else:
+            graph_query_ = GraphQuery()
     return graph_query_
 
+def async_graph_query():
+    global async_graph_query_
+    if async_graph_query_ is None:
+        async_graph_query_ = AsyncGraphQuery(graph_query())
+    return async_graph_query_
+
+
+def blob_store():
+    global blob_store_
+    if blob_store_ is None:
+        blob_store_ = BlobStore(
+            Path(os.environ.get("IS_KB_PATH", "/is_kb")) / "blobs",
+            compress=os.environ.get("GRAPH_BLOB_COMPRESS", "true").lower() == "true",
+        )
+    return blob_store_
+
+
+# memgraph: the Memgraph server at MEM_GRAPH_URL, memory: the in-process MemoryGraphQuery
+GRAPH_BACKEND = os.environ.get("GRAPH_BACKEND", "memgraph").lower()
+
+
+def get_graph_address():
+    host, port = os.environ.get("MEM_GRAPH_URL", "127.0.0.1:7687").split(":")
+    return host, int(port)
+
 
 def get_unique_id():
     # Define the character set: lowercase letters and digits
@@ -39,23 +92,298 @@ def get_unique_id():
     unique_id = ''.join(random.choice(characters) for _ in range(12))
     return unique_id
 
+# histogram bucket upper bounds in ms, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def query_shape(query):
+    """query text with literals replaced by ? and whitespace collapsed"""
+    return _SPACE_RE.sub(" ", _LITERAL_RE.sub("?", query)).strip()
+
+
+def value_size(value):
+    """approximate bytes of a decoded result value"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(k) + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(v) for v in value)
+    if hasattr(value, "properties"):
+        return value_size(value.properties)
+    return 8
+
+
+class QueryStats:
+    """
+    Per query shape latency histogram, row count and decoded bytes of the Cypher run by GraphService.
+    Queries slower than slow_ms are logged.
+    """
+
+    def __init__(self, slow_ms=500.0, enabled=True):
+        self.slow_ms = slow_ms
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.shapes = {}
+
+    def record(self, query, seconds, rows=0, nbytes=0, error=False):
+        shape = query_shape(query)
+        ms = seconds * 1000
+        with self.lock:
+            stat = self.shapes.get(shape)
+            if stat is None:
+                stat = self.shapes[shape] = {
+                    "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            stat["count"] += 1
+            stat["errors"] += int(error)
+            stat["total_ms"] += ms
+            stat["max_ms"] = max(stat["max_ms"], ms)
+            stat["rows"] += rows
+            stat["bytes"] += nbytes
+            stat["buckets"][next((i for i, b in enumerate(LATENCY_BUCKETS_MS) if ms <= b), len(LATENCY_BUCKETS_MS))] += 1
+        if ms >= self.slow_ms:
+            logger.warning(f"Slow graph query: {ms:.1f} ms, {rows} rows, {nbytes} bytes: {shape}")
+
+    @staticmethod
+    def percentile(buckets, q):
+        """upper bound in ms of the bucket holding the q quantile, None for the unbounded bucket"""
+        target = q * sum(buckets)
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if n and seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def top(self, n=20, order="total_ms"):
+        with self.lock:
+            shapes = [(shape, dict(stat, buckets=list(stat["buckets"]))) for shape, stat in self.shapes.items()]
+        shapes.sort(key=lambda item: item[1][order], reverse=True)
+        return [
+            {
+                "shape": shape,
+                **stat,
+                "mean_ms": stat["total_ms"] / stat["count"],
+                "p50_ms": self.percentile(stat["buckets"], 0.5),
+                "p95_ms": self.percentile(stat["buckets"], 0.95),
+                "p99_ms": self.percentile(stat["buckets"], 0.99),
+                "buckets": dict(zip([f"<={b}" for b in LATENCY_BUCKETS_MS] + ["inf"], stat["buckets"])),
+            }
+            for shape, stat in shapes[:n]
+        ]
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+
+
+query_stats = QueryStats(
+    slow_ms=float(os.environ.get("GRAPH_SLOW_QUERY_MS", "500")),
+    enabled=os.environ.get("GRAPH_QUERY_STATS", "true").lower() == "true",
+)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived Memgraph connections.
+
+    A connection is leased to one owner (thread, asyncio task) at a time. Nested
+    checkouts by the same owner reuse the leased connection, so helpers that call
+    other GraphQuery methods do not take a second connection from the pool.
+    """
+
+    def __init__(self, host: str, port: int, max_size: int = 8, max_idle: float = 300.0,
+                 health_check_interval: float = 30.0, acquire_timeout: float = 30.0):
+        self._host = host
+        self._port = port
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle: deque[tuple[mgclient.Connection, float]] = deque()
+        self._leases: dict[tuple, list] = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = defaultdict(int)
+
+    @staticmethod
+    def _owner_key():
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return threading.get_ident(), id(task) if task is not None else None
+
+    def _connect(self) -> mgclient.Connection:
+        logger.info(f"Connecting to Memgraph at {self._host}:{self._port}...")
+        conn = mgclient.connect(host=self._host, port=self._port)
+        conn.autocommit = True
+        self._stats["created"] += 1
+        logger.info("Successfully connected to Memgraph.")
+        return conn
+
+    def _close(self, conn: mgclient.Connection) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.info(f"Failed to close Memgraph connection: {e}")
+        self._stats["closed"] += 1
+
+    @staticmethod
+    def _is_healthy(conn: mgclient.Connection) -> bool:
+        if conn.status != mgclient.CONN_STATUS_READY:
+            return False
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("RETURN 1")
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+    def _evict_idle(self) -> list:
+        # called with self._cond held
+        now = time.monotonic()
+        expired = [(c, t) for c, t in self._idle if now - t > self.max_idle]
+        for item in expired:
+            self._idle.remove(item)
+            self._size -= 1
+            self._stats["evicted"] += 1
+        return [c for c, _ in expired]
+
+    def _checkout(self) -> mgclient.Connection:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            conn = None
+            last_used = None
+            create = False
+            with self._cond:
+                expired = self._evict_idle()
+                if self._idle:
+                    # LIFO keeps the warmest connections in use
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        self._stats["timeouts"] += 1
+                        raise ConnectionError(
+                            f"Timed out waiting for a Memgraph connection (pool size: {self.max_size}).")
+            for c in expired:
+                self._close(c)
+
+            if create:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            if conn is None:
+                continue
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                self._stats["reused"] += 1
+                return conn
+            self._stats["unhealthy"] += 1
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+
+    def acquire(self) -> mgclient.Connection:
+        key = self._owner_key()
+        with self._cond:
+            self._stats["acquired"] += 1
+            if lease := self._leases.get(key):
+                lease[1] += 1
+                return lease[0]
+        conn = self._checkout()
+        with self._cond:
+            self._leases[key] = [conn, 1]
+        return conn
+
+    def release(self, conn: mgclient.Connection, broken: bool = False) -> None:
+        key = self._owner_key()
+        with self._cond:
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] is conn:
+                lease[1] -= 1
+                if lease[1] > 0:
+                    return
+                del self._leases[key]
+            keep = not broken and conn.status == mgclient.CONN_STATUS_READY
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not keep:
+            self._close(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats) | {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._leases),
+            }
+
+
 class GraphService:
     """Handles all communication and query execution with the Memgraph database."""
 
-    def __init__(self, batch_size: int = 1000):
-        host, port = os.environ.get("MEM_GRAPH_URL", "127.0.0.1:7687").split(":")
-        self._host = host
-        self._port = int(port)
+    def __init__(self, batch_size: int = 1000, pool: ConnectionPool | None = None, autocommit: bool = True,
+                 lazy: bool = False, create: bool = False):
+        """
+        lazy: open a dedicated lazy connection that pulls results from the server as they are fetched,
+              used by iter_query. Lazy connections are always in autocommit mode and never pooled.
+        create: flush with CREATE instead of MERGE, for loading into an empty graph.
+        """
+        self._host, self._port = get_graph_address()
         self.batch_size = batch_size
+        self.pool = None if lazy else pool
+        self.autocommit = autocommit
+        self.lazy = lazy
+        self.create = create
+        self._owns_tx = False
         self.conn: mgclient.Connection | None = None
         self.node_buffer: list[tuple[str, dict[str, Any]]] = []
         self.relationship_buffer: list[tuple[tuple, str, tuple, dict | None]] = []
 
     def __enter__(self):
-        logger.info(f"Connecting to Memgraph at {self._host}:{self._port}...")
-        self.conn = mgclient.connect(host=self._host, port=self._port)
-        self.conn.autocommit = True
-        logger.info("Successfully connected to Memgraph.")
+        if self.pool is not None:
+            self.conn = self.pool.acquire()
+        else:
+            logger.info(f"Connecting to Memgraph at {self._host}:{self._port}...")
+            self.conn = mgclient.connect(host=self._host, port=self._port, lazy=self.lazy)
+            if not self.lazy:
+                self.conn.autocommit = True
+            logger.info("Successfully connected to Memgraph.")
+        # a nested non-autocommit session joins the transaction opened by the outer one
+        if not self.autocommit and self.conn.autocommit:
+            self.conn.autocommit = False
+            self._owns_tx = True
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -64,10 +392,37 @@ class GraphService:
                 f"An exception occurred: {exc_val}. Flushing remaining items...",
                 exc_info=True,
             )
-        self.flush_all()
-        if self.conn:
-            self.conn.close()
-            logger.info("\nDisconnected from Memgraph.")
+        commit = exc_type is None
+        try:
+            if not (exc_type and self._owns_tx):
+                self.flush_all()
+        except BaseException:
+            # a batch of the final flush failed, the transaction must not commit the others
+            commit = False
+            raise
+        finally:
+            if self._owns_tx:
+                self._end_transaction(commit=commit)
+            if self.conn and self.pool is not None:
+                self.pool.release(self.conn)
+            elif self.conn:
+                self.conn.close()
+                logger.info("\nDisconnected from Memgraph.")
+            self.conn = None
+
+    def _end_transaction(self, commit: bool) -> None:
+        self._owns_tx = False
+        try:
+            if commit:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+                logger.info("Transaction rolled back.")
+        finally:
+            try:
+                self.conn.autocommit = True
+            except Exception as e:
+                logger.error(f"Failed to restore autocommit: {e}")
 
     def execute_query(
         self, query: str, params: dict[str, Any] | None = None
@@ -76,14 +431,21 @@ class GraphService:
             raise ConnectionError("Not connected to Memgraph.")
         params = params or {}
         cursor = None
+        start = time.perf_counter()
         try:
             cursor = self.conn.cursor()
             cursor.execute(query, params)
             if not cursor.description:
-                return []
-            column_names = [desc.name for desc in cursor.description]
-            return [dict(zip(column_names, row)) for row in cursor.fetchall()]
+                rows = []
+            else:
+                column_names = [desc.name for desc in cursor.description]
+                rows = [dict(zip(column_names, row)) for row in cursor.fetchall()]
+            if query_stats.enabled:
+                query_stats.record(query, time.perf_counter() - start, len(rows), value_size(rows))
+            return rows
         except Exception as e:
+            if query_stats.enabled:
+                query_stats.record(query, time.perf_counter() - start, error=True)
             if (
                 "already exists" not in str(e).lower()
                 and "constraint" not in str(e).lower()
@@ -96,17 +458,61 @@ class GraphService:
             if cursor:
                 cursor.close()
 
+    def iter_query(self, query: str, params: dict[str, Any] | None = None, fetch_size: int = 1000):
+        """
+        Generator of result rows fetched fetch_size at a time.
+        Only a lazy connection keeps the memory constant, a normal one receives the whole result on execute.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Memgraph.")
+        params = params or {}
+        cursor = self.conn.cursor()
+        start = time.perf_counter()
+        count, nbytes, error = 0, 0, True
+        try:
+            try:
+                cursor.execute(query, params)
+            except Exception as e:
+                logger.error(f"!!! Cypher Error: {e}")
+                logger.error(f"    Query: {query}")
+                logger.error(f"    Params: {params}")
+                raise
+            if not cursor.description:
+                error = False
+                return
+            column_names = [desc.name for desc in cursor.description]
+            while rows := cursor.fetchmany(fetch_size):
+                count += len(rows)
+                if query_stats.enabled:
+                    nbytes += value_size(rows)
+                for row in rows:
+                    yield dict(zip(column_names, row))
+            error = False
+        finally:
+            cursor.close()
+            # the time includes the consumer of the rows
+            if query_stats.enabled:
+                query_stats.record(query, time.perf_counter() - start, count, nbytes, error)
+
     def _execute_batch(self, query: str, params_list: list[dict[str, Any]]) -> None:
         if not self.conn or not params_list:
             return
         cursor = None
+        start = time.perf_counter()
+        batch_query = f"UNWIND $batch AS row\n{query}"
         try:
             cursor = self.conn.cursor()
-            batch_query = f"UNWIND $batch AS row\n{query}"
             cursor.execute(batch_query, {"batch": params_list})
+            if query_stats.enabled:
+                query_stats.record(batch_query, time.perf_counter() - start, len(params_list), value_size(params_list))
         except Exception as e:
+            if query_stats.enabled:
+                query_stats.record(batch_query, time.perf_counter() - start, len(params_list), error=True)
             if "already exists" not in str(e).lower():
                 logger.error(f"!!! Batch Cypher Error: {e}")
+            # inside a transaction the error must reach the caller so the batch is rolled back
+            if not self.conn.autocommit:
+                raise
         finally:
             if cursor:
                 cursor.close()
@@ -116,7 +522,8 @@ class GraphService:
         self.execute_query("MATCH (n) DETACH DELETE n;")
         logger.info("--- Database cleaned. ---")
 
-    def ensure_constraints(self, constraints) -> None:
+    def ensure_constraints(self, constraints, strict: bool = False) -> None:
+        """strict: raise when a constraint can not be created, e.g. the existing nodes violate it"""
         logger.info("Ensuring constraints...")
         for label, prop in constraints.items():
             try:
@@ -124,9 +531,54 @@ class GraphService:
                     f"CREATE CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE;"
                 )
             except Exception:
-                pass
+                if strict:
+                    raise
         logger.info("Constraints checked/created.")
 
+    def ensure_indexes(self, indexes) -> None:
+        """
+        indexes: dict of label -> list of property keys. A label index is created for every label.
+        """
+        logger.info("Ensuring indexes...")
+        for label, props in indexes.items():
+            for index in [f":{label}"] + [f":{label}({prop})" for prop in props]:
+                try:
+                    self.execute_query(f"CREATE INDEX ON {index};")
+                except Exception:
+                    pass
+        logger.info("Indexes checked/created.")
+
+    def drop_schema(self, indexes, constraints) -> None:
+        logger.info("Dropping indexes and constraints...")
+        statements = [f"DROP CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE;"
+                      for label, prop in constraints.items()]
+        for label, props in indexes.items():
+            statements += [f"DROP INDEX ON :{label};"]
+            statements += [f"DROP INDEX ON :{label}({prop});" for prop in props]
+        for statement in statements:
+            try:
+                self.execute_query(statement)
+            except Exception as e:
+                logger.info(f"{statement} skipped: {e}")
+        logger.info("Indexes and constraints dropped.")
+
+    def schema_info(self) -> dict:
+        return {
+            "indexes": self.execute_query("SHOW INDEX INFO;"),
+            "constraints": self.execute_query("SHOW CONSTRAINT INFO;"),
+        }
+
+    def storage_mode(self) -> str | None:
+        for row in self.execute_query("SHOW STORAGE INFO;"):
+            name, value = list(row.values())[:2]
+            if name == "storage_mode":
+                return value
+        return None
+
+    def set_storage_mode(self, mode: str) -> None:
+        self.execute_query(f"STORAGE MODE {mode};")
+        logger.info(f"Storage mode set to {mode}.")
+
     def ensure_node_batch(self, label: str, properties: dict[str, Any] = {}) -> None:
         self.node_buffer.append((label, properties))
         if len(self.node_buffer) >= self.batch_size:
@@ -148,20 +600,23 @@ class GraphService:
         if not self.node_buffer:
             return
 
-        nodes_by_label = defaultdict(list)
+        nodes_by_shape = defaultdict(list)
         for label, props in self.node_buffer:
-            props['node_id'] = get_unique_id()
-            nodes_by_label[label].append(props)
-        for label, props_list in nodes_by_label.items():
+            # node_ids may be pre-assigned by the caller so edges can be built before the flush
+            props.setdefault('node_id', get_unique_id())
+            row = encode_props(props)
+            nodes_by_shape[(label, tuple(sorted(row.keys())))].append(row)
+        for (label, prop_keys), props_list in nodes_by_shape.items():
             if not props_list:
                 continue
-            # prop_keys = list([k for k in props_list[0].keys() if k != 'node_id'])
-            prop_keys = list(props_list[0].keys())
             set_clause = ", ".join([f"n.{key} = row.{key}" for key in prop_keys])
-            query = (
-                f"MERGE (n:{label} {{node_id: row.node_id}}) "
-                f"ON CREATE SET {set_clause} ON MATCH SET {set_clause}"
-            )
+            if self.create:
+                query = f"CREATE (n:{label}) SET {set_clause}"
+            else:
+                query = (
+                    f"MERGE (n:{label} {{node_id: row.node_id}}) "
+                    f"ON CREATE SET {set_clause} ON MATCH SET {set_clause}"
+                )
             # print(query)
             self._execute_batch(query, props_list)
         logger.info(f"Flushed {len(self.node_buffer)} nodes.")
@@ -182,7 +637,7 @@ class GraphService:
             query = (
                 f"MATCH (a:{from_label} {{{from_key}: row.from_val}}), "
                 f"(b:{to_label} {{{to_key}: row.to_val}})\n"
-                f"MERGE (a)-[r:{rel_type}]->(b)"
+                f"{'CREATE' if self.create else 'MERGE'} (a)-[r:{rel_type}]->(b)"
             )
             if any(p["props"] for p in params_list):
                 query += "\nSET r += row.props"
@@ -197,113 +652,840 @@ class GraphService:
         logger.info("--- Flushing complete. ---")
 
 
-def get_relationship_strings(query_info):
-    if start := query_info.get('src_label', None):
-        start_str = f"start:{start}"
-    else:
-        start_str = "start"
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+TEMPLATE_CACHE_SIZE = int(os.environ.get("GRAPH_TEMPLATE_CACHE_SIZE", "1024"))
+
+# label -> properties used in MATCH lookups, each gets a label/property index
+GRAPH_INDEXES = {
+    "Application": ["node_id", "name"],
+    "Agent": ["node_id", "app_id"],
+    "Tool": ["node_id", "app_id"],
+    "AppRunCtx": ["node_id", "app_id"],
+    "IOData": ["node_id", "app_id", "agent_id", "app_ctx_id"],
+    "Data": ["node_id", "app_id", "app_ctx_id", "io_data_id", "name"],
+}
+GRAPH_CONSTRAINTS = {label: "node_id" for label in GRAPH_INDEXES}
+# labels holding the data of an application, and of its runs
+APP_DATA_LABELS = ["Agent", "Tool", "AppRunCtx", "IOData", "Data"]
+RUN_DATA_LABELS = ["AppRunCtx", "IOData", "Data"]
+
+READ_CACHE_SIZE = int(os.environ.get("GRAPH_READ_CACHE_SIZE", "4096"))
+# labels whose lookups are served by the read cache. Data is written by the MCP server process
+# as well, a write there can not invalidate the cache of this process.
+READ_CACHE_LABELS = [label for label in os.environ.get(
+    "GRAPH_CACHE_LABELS", "Application,Agent,Tool,AppRunCtx,IOData").split(",") if label]
+ITER_FETCH_SIZE = int(os.environ.get("GRAPH_ITER_FETCH_SIZE", "1000"))
+# full graph scans of export_nodes/export_edges, also answered by the memory backend
+EXPORT_NODES_QUERY = "MATCH (n) RETURN labels(n) AS labels, properties(n) AS props"
+EXPORT_EDGES_QUERY = ("MATCH (a)-[r]->(b) RETURN labels(a)[0] AS src_label, a.node_id AS src_id, type(r) AS rel_type, "
+                      "labels(b)[0] AS dest_label, b.node_id AS dest_id")
+# written property values whose encoding is larger than this many bytes go to the blob store, 0 disables it
+BLOB_THRESHOLD = int(os.environ.get("GRAPH_BLOB_THRESHOLD", str(64 * 1024)))
+# blobs younger than this many seconds are kept by gc_blobs, the nodes referencing them may not be committed yet
+BLOB_GC_MIN_AGE = float(os.environ.get("GRAPH_BLOB_GC_MIN_AGE", "3600"))
+# the blob references of all nodes, the blobs gc_blobs keeps
+BLOB_REFS_QUERY = ("MATCH (n) UNWIND [k IN keys(n) WHERE k ENDS WITH '_blob_ref' | properties(n)[k]] AS ref "
+                   "RETURN DISTINCT ref")
+
+
+def check_name(name):
+    """Labels, property keys and relationship types are inlined into Cypher, so only plain identifiers are allowed."""
+    if not isinstance(name, str) or not _NAME_RE.match(name):
+        raise ValueError(f"Invalid graph identifier: {name!r}")
+    return name
+
 
-    if src_props := query_info.get('src_props', None):
-        src_props_str = '{' + ",".join([f"{k}: '{v}'" if isinstance(v, str) else f"{k}: {v}"
-                                        for k, v in src_props.items()]) + '}'
-    else:
-        src_props_str = ""
+def prop_key(key, value):
+    return key if isinstance(value, (int, float, str)) else f"{key}_json_data"
 
-    if target_props := query_info.get("target_props", None):
-        target_props_str = '{' + ",".join([f"{k}: '{v}'" if isinstance(v, str) else f"{k}: {v}"
-                                           for k, v in target_props.items()]) + '}'
-    else:
-        target_props_str = ""
 
-    if rel_types := query_info.get('rel_types', None):
-        if isinstance(rel_types, str):
-            rel_type_str = f":{rel_types}"
+def prop_value(value):
+    return value if isinstance(value, (int, float, str)) else json.dumps(value)
+
+
+def encode_props(props):
+    """
+    graph key -> graph value of written properties.
+    Large values are stored in the blob store, the node keeps the reference under {key}_blob_ref.
+    """
+    encoded = {}
+    # unread blobs of a node read before are written back as references
+    items = dict.items(props) if isinstance(props, LazyNode) else (props or {}).items()
+    for k, v in items:
+        if isinstance(v, BlobRef):
+            encoded[f"{k}_blob_ref"] = v.ref
+            continue
+        value = prop_value(v)
+        if BLOB_THRESHOLD and isinstance(value, str) and len(value) > BLOB_THRESHOLD // 4 \
+                and len(data := json.dumps(v).encode("utf-8")) > BLOB_THRESHOLD:
+            encoded[f"{k}_blob_ref"] = blob_store().put(data)
         else:
-            rel_type_str = ':' + '|'.join(rel_types)
-    else:
-        rel_type_str = ''
+            encoded[prop_key(k, v)] = value
+    return encoded
+
+
+def encoded_params(prefix, encoded):
+    return {f"{prefix}_{k}": v for k, v in encoded.items()}
+
+
+def props_shape(props):
+    """The stable shape of a property dict: its sorted graph keys."""
+    if not props:
+        return ()
+    return tuple(sorted(check_name(prop_key(k, v)) for k, v in props.items()))
+
+
+def encoded_shape(encoded):
+    return tuple(sorted(check_name(k) for k in encoded))
+
+
+def props_params(prefix, props):
+    return {f"{prefix}_{prop_key(k, v)}": prop_value(v) for k, v in (props or {}).items()}
+
 
-    hop_num = query_info.get("hop_num", '')
+def props_pattern(prefix, shape):
+    if not shape:
+        return ""
+    return "{" + ", ".join(f"{k}: ${prefix}_{k}" for k in shape) + "}"
 
+
+def keys_shape(keys):
+    """property keys of a projection, None for whole nodes"""
+    return tuple(check_name(k) for k in keys) if keys else None
+
+
+def projection(var, keys):
+    """map projection of keys, each with its encoded twin"""
+    if keys is None:
+        return var
+    return var + "{" + ", ".join(f".{k}, .{k}_json_data, .{k}_blob_ref" for k in keys) + "}"
+
+
+def rel_types_shape(rel_types):
+    if not rel_types:
+        return ()
+    if isinstance(rel_types, str):
+        rel_types = [rel_types]
+    return tuple(check_name(r) for r in rel_types)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def node_query_template(op, label, src_shape=(), target_shape=()):
+    """
+    op: get | page | page_after | delete | create | merge
+    The text only depends on the query shape, property values are always passed as parameters.
+    page, page_after: keyset pagination ordered by node_id, with $limit and the last seen $skip_token.
+    """
+    label_str = f":{check_name(label)}" if label else ""
+    if op == "get":
+        return f"MATCH (n{label_str} {props_pattern('src', src_shape)}) RETURN n"
+    if op == "page":
+        return (f"MATCH (n{label_str} {props_pattern('src', src_shape)}) WHERE n.node_id IS NOT NULL "
+                f"RETURN n ORDER BY n.node_id LIMIT $limit")
+    if op == "page_after":
+        return (f"MATCH (n{label_str} {props_pattern('src', src_shape)}) WHERE n.node_id > $skip_token "
+                f"RETURN n ORDER BY n.node_id LIMIT $limit")
+    if op == "delete":
+        return f"MATCH (n{label_str} {props_pattern('src', src_shape)}) DETACH DELETE n"
+    if op == "create":
+        return f"CREATE (n{label_str} {props_pattern('target', target_shape)}) RETURN n"
+    if op == "merge":
+        return (f"MERGE (n{label_str} {props_pattern('src', src_shape)}) "
+                f"SET n = {props_pattern('target', target_shape) or '{}'} RETURN n")
+    raise ValueError(f"Unknown node query: {op}")
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def relationship_query_template(op, src_label, src_shape, target_shape, rel_types, hop_num,
+                                src_keys=None, target_keys=None):
+    """
+    op: get | delete
+    src_keys, target_keys: properties returned for the start/end nodes, None for whole nodes
+    """
+    start_str = f"start:{check_name(src_label)}" if src_label else "start"
+    rel_type_str = ":" + "|".join(rel_types) if rel_types else ""
+    src_props_str = props_pattern("src", src_shape)
+    target_props_str = props_pattern("target", target_shape)
+    if op == "get":
+        return f"""
+            MATCH path = ({start_str} {src_props_str})-[{rel_type_str}*{hop_num}]->(end {target_props_str})
+            UNWIND relationships(path) AS row
+            WITH DISTINCT row
+            WITH row, startNode(row) AS s, endNode(row) AS e
+            RETURN 
+              {projection("s", src_keys)} AS start_props,
+              labels(s) as start_label,
+              {projection("e", target_keys)} AS end_props,
+              labels(e) as end_label,
+              type(row) AS rel_type
+        """
+    if op == "delete":
+        return f"""
+            MATCH ({start_str} {src_props_str})-[rel{rel_type_str}]->(end {target_props_str})
+            DELETE rel
+        """
+    raise ValueError(f"Unknown relationship query: {op}")
+
+
+def relationship_query(op, query_info):
+    src_props = query_info.get("src_props", None)
+    target_props = query_info.get("target_props", None)
+    cypher = relationship_query_template(
+        op,
+        query_info.get("src_label", None),
+        props_shape(src_props),
+        props_shape(target_props),
+        rel_types_shape(query_info.get("rel_types", None)),
+        str(query_info.get("hop_num", "")),
+        keys_shape(query_info.get("src_prop_keys", None)) if op == "get" else None,
+        keys_shape(query_info.get("target_prop_keys", None)) if op == "get" else None,
+    )
+    return cypher, props_params("src", src_props) | props_params("target", target_props)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def subtree_query_template(label, rel_type, max_depth):
+    hops = f"1..{max_depth}" if max_depth is not None else ""
+    return f"""
+        MATCH (n:{check_name(label)} {{node_id: $root_id}})
+        RETURN n, null AS parent_id
+        UNION ALL
+        MATCH path = (root:{label} {{node_id: $root_id}})-[:{check_name(rel_type)}*{hops}]->(n)
+        RETURN n, startNode(last(relationships(path))).node_id AS parent_id
+    """
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def neighborhood_query_template(label, src_shape, rel_types, target_keys=None):
+    """
+    one row per matching node with the list of its outgoing relationships of rel_types,
+    empty for a node without any.
+    """
+    rel_type_str = ":" + "|".join(rel_types) if rel_types else ""
+    return f"""
+        MATCH (n:{check_name(label)} {props_pattern('src', src_shape)})
+        OPTIONAL MATCH (n)-[r{rel_type_str}]->(m)
+        WITH n, r, m ORDER BY id(r)
+        RETURN n, collect(CASE WHEN r IS NULL THEN NULL
+                          ELSE {{rel_type: type(r), props: {projection("m", target_keys)}, labels: labels(m)}} END) AS rels
+    """
+
+
+def flatten_tree(tree, parent_id=None, common_props=None, children_key="children", order_key="order"):
+    """
+    nodes (pre-order, with new node_ids) and (parent_id, node_id) edges of a nested dict tree, see add_tree.
+    """
+    nodes, edges = [], []
+
+    def collect(parent, node, order):
+        props = {k: v for k, v in node.items() if k != children_key} | (common_props or {})
+        props["node_id"] = get_unique_id()
+        if order is not None:
+            props[order_key] = order
+        nodes.append(props)
+        if parent is not None:
+            edges.append((parent, props["node_id"]))
+        for i, child in enumerate(node.get(children_key, [])):
+            collect(props["node_id"], child, i)
+
+    collect(parent_id, tree, tree.get(order_key))
+    return nodes, edges
+
+
+def template_cache_info():
     return {
-        "start_str": start_str,
-        "target_props_str": target_props_str,
-        "src_props_str": src_props_str,
-        "rel_type_str": rel_type_str,
-        "hop_num": hop_num
+        "node": node_query_template.cache_info()._asdict(),
+        "relationship": relationship_query_template.cache_info()._asdict(),
+        "subtree": subtree_query_template.cache_info()._asdict(),
+        "neighborhood": neighborhood_query_template.cache_info()._asdict(),
     }
 
 
+class BlobStore:
+    """
+    Content-addressed store of large property values under IS_KB_PATH/blobs.
+
+    A blob is named by the sha256 of its content (".zst" appended when compressed with zstandard),
+    so the same content is stored once. Blobs are read through mmap. Nodes do not count their
+    references, unreferenced blobs are removed by sweep (GraphQuery.gc_blobs).
+    """
+
+    _REF_RE = re.compile(r"^[0-9a-f]{64}(\.zst)?$")
+
+    def __init__(self, root, compress=True, level=3):
+        self.root = Path(root)
+        self.compress = compress and zstandard is not None
+        self.level = level
+
+    def path(self, ref):
+        if not self._REF_RE.match(ref):
+            raise ValueError(f"Invalid blob reference: {ref!r}")
+        return self.root / ref[:2] / ref
+
+    def put(self, data: bytes) -> str:
+        ref = hashlib.sha256(data).hexdigest() + (".zst" if self.compress else "")
+        path = self.path(ref)
+        try:
+            # a blob referenced again is young again, so a running sweep keeps it for the new node
+            os.utime(path)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self.compress:
+                data = zstandard.ZstdCompressor(level=self.level).compress(data)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return ref
+
+    def get(self, ref) -> bytes:
+        path = self.path(ref)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if not ref.endswith(".zst"):
+                    return m[:]
+                if zstandard is None:
+                    raise RuntimeError(f"zstandard is required to read blob {ref}")
+                return zstandard.ZstdDecompressor().decompress(m)
+
+    def load(self, ref):
+        return json.loads(self.get(ref))
+
+    def sweep(self, live, min_age=BLOB_GC_MIN_AGE):
+        """
+        remove the blobs not in live and the leftovers of interrupted writes, if older than min_age seconds.
+        Returns (removed files, freed bytes).
+        """
+        cutoff = time.time() - min_age
+        removed, freed = 0, 0
+        for path in self.root.glob("??/*"):
+            if path.name in live or not (self._REF_RE.match(path.name) or path.name.endswith(".tmp")):
+                continue
+            try:
+                st = path.stat()
+                if st.st_mtime > cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += st.st_size
+        return removed, freed
+
+
+class BlobRef:
+    """A property value kept in the blob store."""
+    __slots__ = ("ref",)
+
+    def __init__(self, ref):
+        self.ref = ref
+
+    def __eq__(self, other):
+        return isinstance(other, BlobRef) and other.ref == self.ref
+
+    def __hash__(self):
+        return hash(self.ref)
+
+    def __repr__(self):
+        return f"BlobRef({self.ref!r})"
+
+
+class LazyNode(dict):
+    """
+    A decoded node whose blob-backed properties are read from the blob store on first access.
+    Copies keep the unread references, so cached and copied nodes stay cheap.
+    """
+
+    def _resolve(self, key, value):
+        if isinstance(value, BlobRef):
+            value = blob_store().load(value.ref)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def __getitem__(self, key):
+        return self._resolve(key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            dict.__setitem__(self, key, default)
+        return self[key]
+
+    def pop(self, key, *default):
+        value = dict.pop(self, key, *default)
+        return blob_store().load(value.ref) if isinstance(value, BlobRef) else value
+
+    def items(self):
+        return [(k, self[k]) for k in dict.keys(self)]
+
+    def values(self):
+        return [self[k] for k in dict.keys(self)]
+
+    def __iter__(self):
+        # a dict subclass with its own __iter__ is copied by dict(), {**node} and update() through
+        # keys() and __getitem__, so those copies get resolved values
+        return dict.__iter__(self)
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    __hash__ = None
+
+    def copy(self):
+        return LazyNode(dict.items(self))
+
+    def __or__(self, other):
+        new = self.copy()
+        new.update(other)
+        return new
+
+    def __ror__(self, other):
+        new = LazyNode(other)
+        dict.update(new, dict.items(self))
+        return new
+
+    def __deepcopy__(self, memo):
+        return LazyNode((k, copy.deepcopy(v, memo)) for k, v in dict.items(self))
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+
+class GraphTree:
+    """
+    An ordered tree of decoded nodes fetched at once by GraphQuery.get_subtree.
+    Traversals iterate it in memory instead of querying the children of every node.
+    """
+
+    def __init__(self, root_id, order_key="order"):
+        self.root_id = root_id
+        self.order_key = order_key
+        self.nodes = {}
+        self.parents = {}
+        self._children = defaultdict(list)
+        self._sorted = set()
+
+    @property
+    def root(self):
+        return self.nodes.get(self.root_id)
+
+    def add(self, node, parent_id=None):
+        node_id = node['node_id']
+        if node_id in self.nodes:
+            return self.nodes[node_id]
+        self.nodes[node_id] = node
+        if parent_id is not None:
+            self.parents[node_id] = parent_id
+            self._children[parent_id].append(node_id)
+            self._sorted.discard(parent_id)
+        return node
+
+    def children(self, node_id):
+        """children of node_id, sorted by their order"""
+        if node_id not in self._sorted:
+            self._children[node_id].sort(key=lambda n: self.nodes[n].get(self.order_key, 0))
+            self._sorted.add(node_id)
+        return [self.nodes[n] for n in self._children.get(node_id, [])]
+
+    def child_by_order(self, node_id, order):
+        for child in self.children(node_id):
+            if child.get(self.order_key) == order:
+                return child
+        return None
+
+    def parent(self, node_id):
+        return self.nodes.get(self.parents.get(node_id))
+
+    def edges(self):
+        return [(parent_id, node_id) for node_id, parent_id in self.parents.items()]
+
+    def walk(self, node_id=None, depth=0):
+        """pre-order iteration of (node, depth)"""
+        node_id = self.root_id if node_id is None else node_id
+        if node_id not in self.nodes:
+            return
+        yield self.nodes[node_id], depth
+        for child in self.children(node_id):
+            yield from self.walk(child['node_id'], depth + 1)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def next_skip_token(nodes, limit):
+    """skip_token of the page after nodes, None when it was the last page"""
+    if limit is None or len(nodes) < limit or not nodes:
+        return None
+    return nodes[-1]["node_id"]
+
+
+class ReadCache:
+    """
+    LRU read-through cache of query results.
+
+    Every entry is stamped with the write generations of the labels and relationship types it
+    depends on, see rel_deps. Writes bump the generations, a stale entry
+    is dropped on its next lookup. Readers take the snapshot before querying and writers bump
+    after writing, so a write racing a read always leaves the entry stale.
+    """
+
+    def __init__(self, max_size=4096, labels=None):
+        self.max_size = max_size
+        self.labels = set(labels or [])
+        self.entries = OrderedDict()
+        self.generations = defaultdict(int)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def cacheable(self, labels):
+        return self.max_size > 0 and bool(labels) and all(label in self.labels for label in labels)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.generations)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stamp, value = entry
+            if any(self.generations[dep] != gen for dep, gen in stamp):
+                del self.entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key, snapshot, deps, value):
+        stamp = tuple((dep, snapshot.get(dep, 0)) for dep in sorted(deps))
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.entries[key] = (stamp, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self, labels=(), rel_types=None):
+        """
+        rel_types: None if no relationship was written, [] if relationships of any type were.
+        """
+        with self.lock:
+            for label in labels:
+                if label:
+                    self.generations[label] += 1
+            if rel_types is None:
+                return
+            for rel_type in rel_types:
+                self.generations[f"rel:{rel_type}"] += 1
+            if not rel_types:
+                self.generations["rel"] += 1
+            self.generations["rel:*"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "labels": sorted(self.labels),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "stale": self.stale,
+                "evictions": self.evictions,
+            }
+
+
+def rel_deps(rel_types):
+    """
+    "rel:<type>" is bumped by writes of that type, "rel:*" by every relationship write and
+    "rel" by writes of unknown type, which all relationship lookups depend on.
+    """
+    return ["rel"] + ([f"rel:{rel_type}" for rel_type in rel_types] if rel_types else ["rel:*"])
+
+
 class GraphQuery:
     def __init__(self):
-        pass
+        host, port = get_graph_address()
+        self.pool = ConnectionPool(
+            host, port,
+            max_size=int(os.environ.get("MEM_GRAPH_POOL_SIZE", "8")),
+            max_idle=float(os.environ.get("MEM_GRAPH_POOL_MAX_IDLE", "300")),
+            health_check_interval=float(os.environ.get("MEM_GRAPH_POOL_HEALTH_CHECK", "30")),
+        )
+        self.cache = ReadCache(READ_CACHE_SIZE, READ_CACHE_LABELS)
+        # owner (thread, task) -> cache invalidations deferred until its transaction ends
+        self._tx_pending = {}
+
+    def session(self, batch_size: int = 1000, autocommit: bool = True, create: bool = False):
+        return GraphService(batch_size=batch_size, pool=self.pool, autocommit=autocommit, create=create)
+
+    @contextmanager
+    def transaction(self, batch_size: int = 1000):
+        """
+        Group the writes of the block into one transaction, committed when the block exits and rolled back on an
+        exception. GraphQuery calls of the same thread/task share its connection, a nested transaction joins it.
+        The read cache is bypassed inside the block and invalidated when it ends.
+
+            with graph_query().transaction() as tx:
+                tx.delete_node(...)
+                tx.add_relationship(...)
+        """
+        key = ConnectionPool._owner_key()
+        if key in self._tx_pending:
+            yield self
+            return
+        self._tx_pending[key] = pending = []
+        try:
+            with self.session(batch_size, autocommit=False):
+                yield self
+        finally:
+            del self._tx_pending[key]
+            for labels, rel_types in pending:
+                self.cache.bump(labels, rel_types)
+
+    def _in_transaction(self):
+        return ConnectionPool._owner_key() in self._tx_pending
+
+    def _cacheable(self, labels):
+        return not self._in_transaction() and self.cache.cacheable(labels)
+
+    def _bump(self, labels=(), rel_types=None):
+        # uncommitted writes must stay visible as cache misses until the commit
+        pending = self._tx_pending.get(ConnectionPool._owner_key())
+        if pending is not None:
+            pending.append((labels, rel_types))
+        else:
+            self.cache.bump(labels, rel_types)
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def template_stats(self):
+        return template_cache_info()
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def query_stats(self, top=20, order="total_ms"):
+        """the top query shapes by order: total_ms | count | max_ms | rows | bytes"""
+        return query_stats.top(top, order)
+
+    def reset_query_stats(self):
+        query_stats.reset()
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def ensure_schema(self, rebuild=False):
+        """
+        create the label/property indexes and node_id uniqueness constraints of the application graph.
+        rebuild: drop them first.
+        """
+        with self.session() as gs:
+            if rebuild:
+                gs.drop_schema(GRAPH_INDEXES, GRAPH_CONSTRAINTS)
+            gs.ensure_indexes(GRAPH_INDEXES)
+            gs.ensure_constraints(GRAPH_CONSTRAINTS)
+
+    def ensure_node_id_schema(self, labels, constraints=True):
+        """node_id index and uniqueness constraint of labels outside GRAPH_INDEXES, e.g. of an imported graph"""
+        labels = [check_name(label) for label in labels if label not in GRAPH_INDEXES]
+        if not labels:
+            return
+        with self.session() as gs:
+            gs.ensure_indexes({label: ["node_id"] for label in labels})
+            if constraints:
+                gs.ensure_constraints({label: "node_id" for label in labels})
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        Load into an empty graph with add_nodes_bulk/add_edges_bulk(create=True) inside the block.
+        The storage runs IN_MEMORY_ANALYTICAL and the node_id uniqueness constraints are dropped for the
+        block, the indexes are kept for the edge lookups. When the block ends the storage mode is restored
+        and the constraints are created again, which checks the loaded nodes once.
+        No other client should write meanwhile, analytical writes can not be rolled back.
+        """
+        with self.session() as gs:
+            mode = gs.storage_mode() or "IN_MEMORY_TRANSACTIONAL"
+            gs.drop_schema({}, GRAPH_CONSTRAINTS)
+            gs.ensure_indexes(GRAPH_INDEXES)
+            gs.set_storage_mode("IN_MEMORY_ANALYTICAL")
+        try:
+            yield self
+        finally:
+            self.cache.clear()
+            with self.session() as gs:
+                gs.set_storage_mode(mode)
+                gs.ensure_constraints(GRAPH_CONSTRAINTS, strict=True)
+
+    def schema_info(self):
+        with self.session() as gs:
+            return gs.schema_info()
+
+    def clean_database(self):
+        with self.session() as gs:
+            gs.clean_database()
+        self.cache.clear()
+
+    def list_all_node(self, skip_token=None, limit=None):
+        """
+        skip_token, limit: keyset pagination, see get_node.
+        """
+        if limit is None and skip_token is None:
+            with self.session() as gs:
+                node_list = gs.execute_query('MATCH (n) RETURN n')
+            return [n['n'].properties|{'label': list(n['n'].labels)} for n in node_list]
+        return self.get_node(None, None, skip_token, limit)
+
+    def iter_query(self, query, params=None, fetch_size=ITER_FETCH_SIZE):
+        """
+        Stream the rows of a query over a dedicated lazy connection, fetch_size rows at a time.
+        The generator must be exhausted or closed to release the connection.
+        """
+        with GraphService(lazy=True) as gs:
+            yield from gs.iter_query(query, params, fetch_size)
 
-    def list_all_node(self):
-        with GraphService() as gs:
-            node_list = gs.execute_query('MATCH (n) RETURN n')
-        return [n['n'].properties|{'label': list(n['n'].labels)} for n in node_list]
+    def iter_nodes(self, label=None, query_info=None, page_size=ITER_FETCH_SIZE):
+        """
+        Iterate all matching nodes page by page (keyset on node_id), at most page_size nodes are held at once.
+        """
+        skip_token = None
+        while True:
+            nodes = self.get_node(label, query_info, skip_token, page_size)
+            yield from nodes
+            skip_token = next_skip_token(nodes, page_size)
+            if skip_token is None:
+                return
+
+    def export_nodes(self, fetch_size=ITER_FETCH_SIZE):
+        """
+        Stream (label, properties) of every node, blob properties are read into the properties
+        so the export does not depend on the blob store of this host.
+        """
+        for row in self.iter_query(EXPORT_NODES_QUERY, fetch_size=fetch_size):
+            if not row["labels"]:
+                continue
+            yield row["labels"][0], dict(self.decode_node(row["props"]).items())
+
+    def export_edges(self, fetch_size=ITER_FETCH_SIZE):
+        """Stream (src_label, src_node_id, rel_type, dest_label, dest_node_id) of every relationship."""
+        for row in self.iter_query(EXPORT_EDGES_QUERY, fetch_size=fetch_size):
+            if row["src_id"] is None or row["dest_id"] is None:
+                continue
+            yield row["src_label"], row["src_id"], row["rel_type"], row["dest_label"], row["dest_id"]
+
+    def blob_refs(self):
+        """the blob references of all nodes"""
+        return {row["ref"] for row in self.iter_query(BLOB_REFS_QUERY)}
+
+    def gc_blobs(self, min_age=BLOB_GC_MIN_AGE):
+        """
+        Remove the blobs no node references any more, e.g. the payloads of deleted runs.
+        Blobs younger than min_age seconds are kept: the processes sharing the store write a blob
+        before the node referencing it.
+        """
+        store = blob_store()
+        if not store.root.exists():
+            return {"removed": 0, "bytes": 0}
+        removed, freed = store.sweep(self.blob_refs(), min_age)
+        logger.info(f"Removed {removed} unreferenced blobs, {freed} bytes.")
+        return {"removed": removed, "bytes": freed}
 
     def decode_node(self, node):
-        ret = {}
+        ret = LazyNode()
         for k, v in node.items():
             if k.endswith("_json_data"):
                 try:
-                    ret |= {
-                        k.replace("_json_data", ""): json.loads(v)
-                    }
+                    ret[k.replace("_json_data", "")] = json.loads(v)
                 except Exception as e:
                     print(v)
                     print(e)
                     traceback.print_exc()
                     raise
+            elif k.endswith("_blob_ref"):
+                # read from the blob store when the property is accessed
+                dict.__setitem__(ret, k[:-len("_blob_ref")], BlobRef(v))
             else:
-                ret |= {k: v}
+                ret[k] = v
         return ret
 
-    def get_node(self, label, query_info=None):
+    def decode_row(self, props, labels, keys=None):
+        """
+        decode a node returned by a relationship query.
+        keys: the projected properties, only those are kept (without label).
+        """
+        if keys is None:
+            return self.decode_node(props.properties | {"label": labels})
+        node = self.decode_node({k: v for k, v in props.items() if v is not None})
+        return {k: node.get(k) for k in keys}
+
+    def get_node(self, label, query_info=None, skip_token=None, limit=None):
         """
         query_info:  None, if we get all node with specified label
                      dict, if we need to match all node with same properties defined by the dict.
+        skip_token, limit: keyset pagination. With a limit at most limit nodes ordered by node_id are returned,
+                           pass next_skip_token(nodes, limit) as skip_token to get the next page.
         """
-        with GraphService() as gs:
-            param = {'label': label}
-            if not query_info:
-                cypher = 'MATCH (n:$label) RETURN n'
-            # elif query_info.get('node_id', None):
-            #     cypher = 'MATCH (n:$label {node_id:$param}) RETURN n'
-            #     param |= {'param': query_info['node_id']}
-            # else:
-            else:
-                kvs = []
-                for k, v in query_info.items():
-                    if isinstance(v, str):
-                        kvs.append(f"{k}:'{v}'")
-                    else:
-                        kvs.append(f"{k}:{v}")
-                params = "{"
-                params += ",".join(kvs)
-                params += "}"
-                cypher = f'MATCH (n:$label {params}) RETURN n'
-            if param is None:
-                n = gs.execute_query(cypher)
-            else:
-                n = gs.execute_query(cypher, param)
+        shape = props_shape(query_info)
+        params = props_params("src", query_info)
+        op = "get"
+        if limit is not None or skip_token is not None:
+            op = "page" if skip_token is None else "page_after"
+            params |= {"limit": int(limit if limit is not None else ITER_FETCH_SIZE)}
+            if skip_token is not None:
+                params |= {"skip_token": skip_token}
+        cacheable = self._cacheable([label])
+        if cacheable:
+            key = ("node", label, shape, tuple(sorted(params.items())))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            snapshot = self.cache.snapshot()
 
-        return [self.decode_node(i['n'].properties|{'label': list(i['n'].labels)}) for i in n]
+        cypher = node_query_template(op, label, shape)
+        with self.session() as gs:
+            n = gs.execute_query(cypher, params)
 
-    def get_params(self, prefix, props, sep=":"):
-        fmt_params = {
-            f"{prefix}_prop_str": "{" + ",".join([f"{key}{sep} ${prefix}_{key}" if isinstance(
-                value, (float,int)) else f"{key}{sep} ${prefix}_{key}" if isinstance(
-                value, str) else f"{key}_json_data{sep} ${prefix}_{key}"
-                                               for key, value in props.items()]) + "}",
-        }
-        params = {
-            f"{prefix}_{key}": value if isinstance(value, (int, float, str)) else json.dumps(value)
-            for key, value in props.items()
-        }
-        return fmt_params, params
+        nodes = [self.decode_node(i['n'].properties|{'label': list(i['n'].labels)}) for i in n]
+        if cacheable:
+            self.cache.put(key, snapshot, [label], nodes)
+        return nodes
+
+    def get_subtree(self, root_node_id, rel='SUBHEADING', max_depth=None, label="Data"):
+        """
+        fetch the whole tree below root_node_id with one query.
+        max_depth: None for unlimited, otherwise the maximum number of hops from the root.
+        """
+        cypher = subtree_query_template(label, rel, max_depth)
+        with self.session() as gs:
+            rows = gs.execute_query(cypher, {"root_id": root_node_id})
 
+        tree = GraphTree(root_node_id)
+        for row in rows:
+            if row['parent_id'] is None:
+                tree.add(self.decode_node(row['n'].properties | {'label': list(row['n'].labels)}))
+        for row in rows:
+            if row['parent_id'] is not None:
+                tree.add(self.decode_node(row['n'].properties | {'label': list(row['n'].labels)}),
+                         row['parent_id'])
+        return tree
 
     def add_node(self, label, props):
         """
@@ -311,15 +1493,16 @@ class GraphQuery:
             src_props: the properties needs to be matched when find the nodes
             target_props: the properties needs to be updated
         """
-        cypher_tmpl = """CREATE(n:$label {target_prop_str})
-        RETURN n"""
         props |= {'node_id': get_unique_id()}
-        fmt_params, params = self.get_params("target", props)
-        cypher = cypher_tmpl.format(**fmt_params)
-        with GraphService() as gs:
-            node = gs.execute_query(cypher, params|{'label': label})
+        encoded = encode_props(props)
+        cypher = node_query_template("create", label, target_shape=encoded_shape(encoded))
+        try:
+            with self.session() as gs:
+                node = gs.execute_query(cypher, encoded_params("target", encoded))
+        finally:
+            self._bump([label])
 
-        return node[0]['n'].properties
+        return self.decode_node(node[0]['n'].properties)
 
     def update_node(self, label, src_props, target_props):
         """
@@ -327,15 +1510,13 @@ class GraphQuery:
             src_props: the properties needs to be matched when find the nodes
             target_props: the properties needs to be updated
         """
-        cypher_tmpl = """MERGE (n:$label {src_prop_str})
-            SET n={target_prop_str}
-            RETURN n
-        """
-        fmt_params, params = self.get_params("src", src_props)
-        fmt_params2, params2 = self.get_params("target", target_props)
-        cypher = cypher_tmpl.format(**(fmt_params|fmt_params2))
-        with GraphService() as gs:
-            node = gs.execute_query(cypher, params|params2|{'label': label})
+        encoded = encode_props(target_props)
+        cypher = node_query_template("merge", label, props_shape(src_props), encoded_shape(encoded))
+        try:
+            with self.session() as gs:
+                node = gs.execute_query(cypher, props_params("src", src_props) | encoded_params("target", encoded))
+        finally:
+            self._bump([label])
 
         return node
 
@@ -346,65 +1527,67 @@ class GraphQuery:
         target_props: dict of target node props, default None
         src_prop_keys: list of node_fields, default None
         target_prop_keys: list of node_fields, default None
+                          only these properties are transferred, projected by the query itself
         rel_types: list of relationship types, default None
         hop_num: n or n1..n2, default *
         """
-        cypher = """
-            MATCH path = ({start_str} {src_props_str})-[{rel_type_str}*{hop_num}]->(end {target_props_str})
-            UNWIND relationships(path) AS row
-            WITH DISTINCT row
-            RETURN 
-              startNode(row) AS start_props,
-              labels(startNode(row)) as start_label,
-              endNode(row) AS end_props,
-              labels(endNode(row)) as end_label,
-              type(row) AS rel_type
-        """
+        cypher, params = relationship_query("get", query_info)
+        src_label = query_info.get("src_label", None)
+        src_keys = keys_shape(query_info.get('src_prop_keys', None))
+        target_keys = keys_shape(query_info.get('target_prop_keys', None))
+        key = ("rel", cypher, tuple(sorted(params.items())))
+        rel_list = self.cache.get(key) if self._cacheable([src_label]) else None
+        if rel_list is None:
+            snapshot = self.cache.snapshot()
+            with self.session() as gs:
+                rows = gs.execute_query(cypher, params)
 
-        with GraphService() as gs:
-            rel_list = gs.execute_query(cypher.format(**get_relationship_strings(query_info)))
-
-        rel_list = [(self.decode_node(row['start_props'].properties|{"label": row['start_label']}),
-                     row['rel_type'],
-                     self.decode_node(row['end_props'].properties|{"label": row['end_label']})) for row in rel_list]
-
-        src_prop_keys = query_info.get('src_prop_keys', None)
-        target_prop_keys = query_info.get('target_prop_keys', None)
-
-        if src_prop_keys and target_prop_keys is None:
-            return [
-                ({k: src[k] for k in src_prop_keys},
-                 rel_types,
-                 target) for src, rel_types, target in rel_list
-            ]
-        elif src_prop_keys is None and target_prop_keys:
-            return [
-                (src,
-                 rel_types,
-                 {k: target[k] for k in target_prop_keys}) for src, rel_types, target in rel_list
-            ]
-        elif src_prop_keys and target_prop_keys:
-            return [
-                ({k: src[k] for k in src_prop_keys},
-                 rel_types,
-                 {k: target[k] for k in target_prop_keys}) for src, rel_types, target in rel_list
-            ]
+            rel_list = [(self.decode_row(row['start_props'], row['start_label'], src_keys),
+                         row['rel_type'],
+                         self.decode_row(row['end_props'], row['end_label'], target_keys)) for row in rows]
+            # results reaching into labels that are not cached are not cached either
+            labels = {src_label} | {label for row in rows for label in row['start_label'] + row['end_label']}
+            if self._cacheable(labels):
+                deps = list(labels) + rel_deps(rel_types_shape(query_info.get("rel_types", None)))
+                self.cache.put(key, snapshot, deps, rel_list)
 
         return rel_list
 
+    def get_neighborhood(self, label, query_info=None, rel_types=None, target_prop_keys=None):
+        """
+        the nodes of label matching query_info, each with its outgoing relationships of rel_types, in one query.
+        returns [(node, [(rel_type, target), ...]), ...], relationships in creation order.
+        target_prop_keys: properties returned for the targets, None for whole nodes
+        """
+        rel_types = rel_types_shape(rel_types)
+        target_keys = keys_shape(target_prop_keys)
+        cypher = neighborhood_query_template(label, props_shape(query_info), rel_types, target_keys)
+        params = props_params("src", query_info)
+        key = ("neighborhood", cypher, tuple(sorted(params.items())))
+        result = self.cache.get(key) if self._cacheable([label]) else None
+        if result is None:
+            snapshot = self.cache.snapshot()
+            with self.session() as gs:
+                rows = gs.execute_query(cypher, params)
+
+            result = [(self.decode_node(row['n'].properties | {'label': list(row['n'].labels)}),
+                       [(rel['rel_type'], self.decode_row(rel['props'], rel['labels'], target_keys))
+                        for rel in row['rels']]) for row in rows]
+            labels = {label} | {label for row in rows for rel in row['rels'] for label in rel['labels']}
+            if self._cacheable(labels):
+                self.cache.put(key, snapshot, list(labels) + rel_deps(rel_types), result)
+        return result
+
     def delete_node(self, label, props=None):
         """
         delete node with props
         """
-        cypher_tmpl = """MATCH (n:{label} {prop_str})
-                         DETACH DELETE n;"""
-        if props:
-            prop_str = "{"+ ",".join([f"{key}:{value}" if isinstance(value, (float, int)) else f"{key}:'{value}'" if isinstance(value, str) else f"{key}_json_data:'{json.dumps(value)}'"
-                                             for key, value in props.items()]) + "}"
-        else:
-            prop_str = ""
-        with GraphService() as gs:
-            gs.execute_query(cypher_tmpl.format(label=label, prop_str=prop_str))
+        cypher = node_query_template("delete", label, props_shape(props))
+        try:
+            with self.session() as gs:
+                gs.execute_query(cypher, props_params("src", props))
+        finally:
+            self._bump([label])
 
     def delete_relationship(self, query_info):
         """
@@ -415,15 +1598,30 @@ class GraphQuery:
         rel_types: list of relationship types, default None
         hop_num: n or n1..n2, default *
         """
-        cypher = """
-            MATCH ({start_str} {src_props_str})-[rel{rel_type_str}]->(end {target_props_str})
-            DELETE rel
-        """
-
-        with GraphService() as gs:
-            rel_list = gs.execute_query(cypher.format(**get_relationship_strings(query_info)))
+        cypher, params = relationship_query("delete", query_info)
+        try:
+            with self.session() as gs:
+                rel_list = gs.execute_query(cypher, params)
+        finally:
+            self._bump(rel_types=rel_types_shape(query_info.get("rel_types", None)) or [])
         return len(rel_list)
 
+    def cascade_delete(self, app_id=None, app_ctx_id=None, labels=None):
+        """
+        Delete the nodes of an application (app_id) or of one of its runs (app_ctx_id) in one transaction.
+        labels: the labels to delete, default APP_DATA_LABELS for an application and RUN_DATA_LABELS for a run.
+        """
+        if app_id is None and app_ctx_id is None:
+            raise ValueError("cascade_delete needs an app_id or an app_ctx_id")
+        if labels is None:
+            labels = RUN_DATA_LABELS if app_ctx_id is not None else APP_DATA_LABELS
+        with self.transaction():
+            for label in labels:
+                props = {} if app_id is None else {"app_id": app_id}
+                if app_ctx_id is not None:
+                    props |= {"node_id" if label == "AppRunCtx" else "app_ctx_id": app_ctx_id}
+                self.delete_node(label, props)
+
     def add_relationship(self, src_label, src_id, rel_types, dest_label, dest_id):
         src_nodes = self.get_node(src_label, {"node_id": src_id})
         dest_nodes = self.get_node(dest_label, {"node_id": dest_id})
@@ -431,11 +1629,122 @@ class GraphQuery:
             return {"status": "Failed", "reason": f"node_id: {src_id} does not exist."}
         if not dest_nodes:
             return {"status": "Failed", "reason": f"node_id: {dest_id} does not exist."}
-        with GraphService() as gs:
-            gs.ensure_relationship_batch(
-                (src_label, "node_id", src_id),
-                rel_types,
-                (dest_label, "node_id", dest_id)
-            )
+        try:
+            with self.session() as gs:
+                gs.ensure_relationship_batch(
+                    (src_label, "node_id", src_id),
+                    rel_types,
+                    (dest_label, "node_id", dest_id)
+                )
+        finally:
+            self._bump(rel_types=[rel_types])
         return {"status": "successfully"}
 
+    def add_nodes_bulk(self, label, props_list, batch_size=1000, create=False):
+        """
+        Create many nodes with the same label in UNWIND batches within one transaction.
+        node_ids are assigned client-side, the created properties are returned in input order.
+        create: CREATE instead of MERGE on node_id, see bulk_load.
+        """
+        check_name(label)
+        nodes = [props | {"node_id": props.get("node_id") or get_unique_id()} for props in props_list]
+        try:
+            with self.session(batch_size, autocommit=False, create=create) as gs:
+                for node in nodes:
+                    gs.ensure_node_batch(label, node.copy())
+        finally:
+            self._bump([label])
+        return nodes
+
+    def add_edges_bulk(self, src_label, rel_type, dest_label, pairs, batch_size=1000, create=False):
+        """
+        pairs: list of (src_node_id, dest_node_id), written in UNWIND batches within one transaction.
+        create: CREATE instead of MERGE, see bulk_load.
+        """
+        check_name(src_label), check_name(rel_type), check_name(dest_label)
+        try:
+            with self.session(batch_size, autocommit=False, create=create) as gs:
+                for src_id, dest_id in pairs:
+                    gs.ensure_relationship_batch(
+                        (src_label, "node_id", src_id),
+                        rel_type,
+                        (dest_label, "node_id", dest_id)
+                    )
+        finally:
+            self._bump(rel_types=[rel_type])
+        return {"status": "successfully"}
+
+    def add_tree(self, label, tree, rel_type="SUBHEADING", parent_id=None, common_props=None,
+                 children_key="children", order_key="order", batch_size=1000):
+        """
+        Write a nested dict tree in one transaction: all nodes first, then all edges.
+        tree: dict with child dicts under children_key, children get their index under order_key.
+        parent_id: optional existing node the tree root is attached to.
+        common_props: properties added to every node of the tree.
+        Returns the properties of the created root node.
+        """
+        check_name(label), check_name(rel_type)
+        nodes, edges = flatten_tree(tree, parent_id, common_props, children_key, order_key)
+        try:
+            with self.session(batch_size, autocommit=False) as gs:
+                for props in nodes:
+                    gs.ensure_node_batch(label, props.copy())
+                gs.flush_nodes()
+                for src_id, dest_id in edges:
+                    gs.ensure_relationship_batch(
+                        (label, "node_id", src_id),
+                        rel_type,
+                        (label, "node_id", dest_id)
+                    )
+        finally:
+            self._bump([label], [rel_type])
+        logger.info(f"add_tree: {len(nodes)} nodes, {len(edges)} edges.")
+        return nodes[0]
+
+
+class AsyncGraphQuery:
+    """
+    Awaitable facade of GraphQuery for code running in the event loop.
+
+    Every GraphQuery method is exposed as a coroutine that runs on a dedicated thread pool.
+    The pool is as large as the connection pool, so at most that many queries are in flight
+    and further calls queue up without blocking the event loop.
+    """
+
+    def __init__(self, graph, max_workers=None):
+        self.graph = graph
+        pool = getattr(graph, "pool", None)
+        self.max_workers = max_workers or int(os.environ.get("MEM_GRAPH_ASYNC_WORKERS",
+                                                             pool.max_size if pool is not None else 4))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="graph_query")
+
+    async def run(self, fn, *args, **kwargs):
+        """run a blocking graph function on the graph executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def decode_node(self, node):
+        return self.graph.decode_node(node)
+
+    async def transaction(self, fn, *args, **kwargs):
+        """
+        run fn(tx, *args, **kwargs) inside one GraphQuery transaction.
+        The whole function runs on one graph thread, a transaction can not span awaits.
+        """
+        def run():
+            with self.graph.transaction() as tx:
+                return fn(tx, *args, **kwargs)
+
+        return await self.run(run)
+
+    def __getattr__(self, name):
+        attr = getattr(self.graph, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
@@ -0,0 +1,589 @@
+import os
+import json
+import copy
+import fcntl
+import threading
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from .graph_db import (GraphQuery, GraphTree, ReadCache, GRAPH_INDEXES, ITER_FETCH_SIZE,
+                           EXPORT_NODES_QUERY, EXPORT_EDGES_QUERY, BLOB_REFS_QUERY, check_name, keys_shape, rel_types_shape, flatten_tree, get_unique_id)
+except ImportError:
+    from graph_db import (GraphQuery, GraphTree, ReadCache, GRAPH_INDEXES, ITER_FETCH_SIZE,
+                          EXPORT_NODES_QUERY, EXPORT_EDGES_QUERY, BLOB_REFS_QUERY, check_name, keys_shape, rel_types_shape, flatten_tree, get_unique_id)
+
+
+logger = logging.getLogger(__name__)
+
+# WAL records after which the log is folded into a new snapshot
+WAL_COMPACT_RECORDS = int(os.environ.get("GRAPH_WAL_COMPACT", "10000"))
+WAL_FSYNC = os.environ.get("GRAPH_WAL_FSYNC", "false").lower() == "true"
+
+
+def parse_hops(hop_num):
+    """(min, max) of a Cypher hop range: "" -> 1.., "2" -> 2..2, "0..10", "..3", "2.."; max None is unbounded"""
+    hop_num = str(hop_num).strip()
+    if not hop_num:
+        return 1, None
+    if ".." not in hop_num:
+        return int(hop_num), int(hop_num)
+    low, high = hop_num.split("..", 1)
+    return int(low) if low else 1, int(high) if high else None
+
+
+def normalize(value):
+    # stored values look like values read back from Memgraph: scalars, or JSON lists/dicts
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return json.loads(json.dumps(value))
+
+
+def copy_props(props):
+    return {k: v if not isinstance(v, (list, dict)) else copy.deepcopy(v) for k, v in props.items()}
+
+
+class MemoryGraphQuery(GraphQuery):
+    """
+    In-process graph with the GraphQuery interface, for single-box deployments, CI and benchmarks.
+
+    Nodes live in dicts with label, label/property (GRAPH_INDEXES) and adjacency indexes.
+    With a snapshot path, every write is appended to {path}.wal and the log is folded into
+    {path}.snapshot every GRAPH_WAL_COMPACT records. Processes sharing the path (the API and
+    its MCP servers) serialize writes with a lock on {path}.lock and replay each other's WAL
+    records before every operation. Without a path the graph is not persisted.
+    """
+
+    def __init__(self, path=""):
+        # GraphQuery.__init__ is not called, it opens the Memgraph connection pool
+        self.path = Path(path) if path else None
+        self.pool = None
+        self.cache = ReadCache(0)
+        self._tx_pending = {}
+        self._lock = threading.RLock()
+        self._tx_owner = None
+        self._tx_records = None
+        self._tx_undo = None
+        self._lock_file = None
+        self._lock_depth = 0
+        self._wal = None
+        self._wal_offset = 0
+        self._wal_records = 0
+        self._snapshot_stamp = None
+        self._reset()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(f"{self.path}.lock", "a+")
+            self._wal = open(f"{self.path}.wal", "a+b")
+            with self._locked(fcntl.LOCK_SH):
+                pass
+
+    def _reset(self):
+        self.nodes = {}  # id -> [label, props]
+        self.seq = {}  # id -> creation order, results are returned in it like Memgraph does
+        self.next_seq = 0
+        self.by_label = defaultdict(set)  # label -> ids
+        self.by_prop = defaultdict(lambda: defaultdict(set))  # (label, key) -> value -> ids
+        self.by_node_id = defaultdict(set)  # node_id property -> ids
+        self.out_edges = defaultdict(lambda: defaultdict(dict))  # id -> type -> dest ids
+        self.in_edges = defaultdict(lambda: defaultdict(dict))  # id -> type -> src ids
+
+    # ---- persistence ----
+
+    @contextmanager
+    def _locked(self, mode):
+        """hold the process lock and the file lock, caught up with the WAL of the other processes"""
+        with self._lock:
+            if self._lock_file is None or self._lock_depth:
+                # a nested call keeps the file lock of the outer one, a transaction holds it exclusively
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            fcntl.flock(self._lock_file, mode)
+            self._lock_depth += 1
+            try:
+                self._catch_up()
+                yield
+            finally:
+                self._lock_depth -= 1
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            st = os.stat(f"{self.path}.snapshot")
+            return st.st_ino, st.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _catch_up(self):
+        stamp = self._stamp()
+        size = os.fstat(self._wal.fileno()).st_size
+        if stamp != self._snapshot_stamp or size < self._wal_offset:
+            self._load_snapshot(stamp)
+        if size > self._wal_offset:
+            self._wal.seek(self._wal_offset)
+            data = self._wal.read(size - self._wal_offset)
+            # a record cut off by a crash is ignored and overwritten by the next write
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    self._apply(json.loads(line))
+                    self._wal_records += 1
+            self._wal_offset += end
+
+    def _load_snapshot(self, stamp):
+        self._reset()
+        self._wal_offset = 0
+        self._wal_records = 0
+        self._snapshot_stamp = stamp
+        if stamp is None:
+            return
+        with open(f"{self.path}.snapshot", "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        for node_key, label, props in snapshot["nodes"]:
+            self._apply({"op": "put_node", "id": node_key, "label": label, "props": props})
+        for src, rel_type, dest in snapshot["edges"]:
+            self._apply({"op": "put_edge", "src": src, "type": rel_type, "dest": dest})
+        logger.info(f"Loaded graph snapshot {self.path}: {len(self.nodes)} nodes.")
+
+    def _write(self, records):
+        if self._tx_records is not None:
+            self._tx_records.extend(records)
+            return
+        if self._wal is None or not records:
+            return
+        # drop a record cut off by a crash before appending
+        self._wal.truncate(self._wal_offset)
+        self._wal.seek(self._wal_offset)
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        self._wal.write(data)
+        self._wal.flush()
+        if WAL_FSYNC:
+            os.fsync(self._wal.fileno())
+        self._wal_offset += len(data)
+        self._wal_records += len(records)
+        if self._wal_records >= WAL_COMPACT_RECORDS:
+            self.compact()
+
+    def compact(self):
+        """fold the WAL into a new snapshot"""
+        if self.path is None:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            snapshot = {
+                "nodes": [[key, *self.nodes[key]] for key in sorted(self.nodes, key=self.seq.get)],
+                "edges": [[src, rel_type, dest]
+                          for src, types in self.out_edges.items()
+                          for rel_type, dests in types.items()
+                          for dest in dests],
+            }
+            tmp = f"{self.path}.snapshot.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, f"{self.path}.snapshot")
+            self._wal.truncate(0)
+            self._wal_offset = 0
+            self._wal_records = 0
+            self._snapshot_stamp = self._stamp()
+        logger.info(f"Compacted graph snapshot {self.path}: {len(self.nodes)} nodes.")
+
+    # ---- primitive changes, the WAL records ----
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "put_node":
+            key = record["id"]
+            if key in self.nodes:
+                self._unindex(key)
+            label, props = record["label"], record["props"]
+            self.nodes[key] = [label, props]
+            if key not in self.seq:
+                self.seq[key] = record.get("seq", self.next_seq)
+                self.next_seq = max(self.next_seq, self.seq[key] + 1)
+            self.by_label[label].add(key)
+            for k in GRAPH_INDEXES.get(label, []):
+                if isinstance(props.get(k), (str, int, float)):
+                    self.by_prop[(label, k)][props[k]].add(key)
+            if "node_id" in props:
+                self.by_node_id[props["node_id"]].add(key)
+        elif op == "del_node":
+            key = record["id"]
+            for rel_type, dests in list(self.out_edges.pop(key, {}).items()):
+                for dest in dests:
+                    self.in_edges[dest][rel_type].pop(key, None)
+            for rel_type, srcs in list(self.in_edges.pop(key, {}).items()):
+                for src in srcs:
+                    self.out_edges[src][rel_type].pop(key, None)
+            self._unindex(key)
+            del self.nodes[key]
+            del self.seq[key]
+        elif op == "put_edge":
+            self.out_edges[record["src"]][record["type"]][record["dest"]] = None
+            self.in_edges[record["dest"]][record["type"]][record["src"]] = None
+        elif op == "del_edge":
+            self.out_edges[record["src"]][record["type"]].pop(record["dest"], None)
+            self.in_edges[record["dest"]][record["type"]].pop(record["src"], None)
+        else:
+            raise ValueError(f"Unknown graph record: {op}")
+
+    def _unindex(self, key):
+        label, props = self.nodes[key]
+        self.by_label[label].discard(key)
+        for k in GRAPH_INDEXES.get(label, []):
+            if isinstance(props.get(k), (str, int, float)):
+                self.by_prop[(label, k)][props[k]].discard(key)
+        if "node_id" in props:
+            self.by_node_id[props["node_id"]].discard(key)
+
+    def _inverse(self, record):
+        """records undoing record, computed before it is applied"""
+        op = record["op"]
+        if op == "put_node":
+            key = record["id"]
+            if key not in self.nodes:
+                return [{"op": "del_node", "id": key}]
+            label, props = self.nodes[key]
+            return [{"op": "put_node", "id": key, "label": label, "props": props}]
+        if op == "del_node":
+            key = record["id"]
+            label, props = self.nodes[key]
+            return [{"op": "put_node", "id": key, "label": label, "props": props, "seq": self.seq[key]}] + [
+                {"op": "put_edge", "src": key, "type": rel_type, "dest": dest}
+                for rel_type, dests in self.out_edges.get(key, {}).items() for dest in dests
+            ] + [
+                {"op": "put_edge", "src": src, "type": rel_type, "dest": key}
+                for rel_type, srcs in self.in_edges.get(key, {}).items() for src in srcs if src != key
+            ]
+        exists = record["dest"] in self.out_edges.get(record["src"], {}).get(record["type"], {})
+        if op == "put_edge":
+            return [] if exists else [record | {"op": "del_edge"}]
+        return [record | {"op": "put_edge"}] if exists else []
+
+    def _change(self, records):
+        for record in records:
+            if self._tx_undo is not None:
+                self._tx_undo.append(self._inverse(record))
+            self._apply(record)
+        self._write(records)
+
+    # ---- matching ----
+
+    def _match(self, label, props=None):
+        """ids of the nodes with label (any if None) having all props"""
+        props = {k: normalize(v) for k, v in (props or {}).items()}
+        if "node_id" in props:
+            candidates = self.by_node_id.get(props["node_id"], ())
+        elif label is not None and (k := next((k for k in GRAPH_INDEXES.get(label, [])
+                                                if isinstance(props.get(k), (str, int, float))), None)):
+            candidates = self.by_prop[(label, k)].get(props[k], ())
+        elif label is not None:
+            candidates = self.by_label.get(label, ())
+        else:
+            candidates = self.nodes
+        ids = []
+        for key in list(candidates):
+            node_label, node_props = self.nodes[key]
+            if label is not None and node_label != label:
+                continue
+            if all(k in node_props and node_props[k] == v for k, v in props.items()):
+                ids.append(key)
+        return sorted(ids, key=self.seq.get)
+
+    def _node(self, key, keys=None):
+        label, props = self.nodes[key]
+        if keys is None:
+            return copy_props(props) | {"label": [label]}
+        return {k: copy.deepcopy(props.get(k)) for k in keys}
+
+    # ---- GraphQuery interface ----
+
+    def session(self, batch_size: int = 1000, autocommit: bool = True, create: bool = False):
+        """
+        There is no Cypher session, the block runs as one transaction() of this graph (committed even
+        without autocommit, like a GraphService block that exits without an exception).
+        """
+        return self.transaction(batch_size)
+
+    def iter_query(self, query, params=None, fetch_size=ITER_FETCH_SIZE):
+        """the rows of the full graph scans GraphQuery runs (EXPORT_NODES_QUERY, EXPORT_EDGES_QUERY, BLOB_REFS_QUERY)"""
+        if query == EXPORT_NODES_QUERY:
+            for label, props in self.export_nodes(fetch_size):
+                yield {"labels": [label], "props": props}
+        elif query == EXPORT_EDGES_QUERY:
+            for src_label, src_id, rel_type, dest_label, dest_id in self.export_edges(fetch_size):
+                yield {"src_label": src_label, "src_id": src_id, "rel_type": rel_type,
+                       "dest_label": dest_label, "dest_id": dest_id}
+        elif query == BLOB_REFS_QUERY:
+            # values are kept in the nodes, only imported properties can hold references
+            with self._locked(fcntl.LOCK_SH):
+                refs = {v for _, props in self.nodes.values() for k, v in props.items() if k.endswith("_blob_ref")}
+            for ref in refs:
+                yield {"ref": ref}
+        else:
+            raise NotImplementedError(f"The memory graph backend can not run this Cypher query: {query}")
+
+    @contextmanager
+    def transaction(self, batch_size: int = 1000):
+        """
+        Writes of the block are applied at once and appended to the WAL when it exits.
+        On an exception the changes of the block are undone and nothing is written.
+        Other threads and processes wait for the block to end.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            if self._tx_owner == threading.get_ident():
+                yield self
+                return
+            self._tx_owner = threading.get_ident()
+            self._tx_records, self._tx_undo = [], []
+            try:
+                yield self
+            except BaseException:
+                for undo in reversed(self._tx_undo):
+                    for record in undo:
+                        self._apply(record)
+                raise
+            else:
+                records = self._tx_records
+                self._tx_records = self._tx_undo = None
+                self._write(records)
+            finally:
+                self._tx_owner = None
+                self._tx_records = self._tx_undo = None
+
+    def ensure_schema(self, rebuild=False):
+        pass
+
+    def ensure_node_id_schema(self, labels, constraints=True):
+        pass
+
+    @contextmanager
+    def bulk_load(self):
+        yield self
+
+    def schema_info(self):
+        return {
+            "indexes": [{"label": label, "property": k} for label, keys in GRAPH_INDEXES.items() for k in keys],
+            "constraints": [],
+        }
+
+    def pool_stats(self):
+        return {"backend": "memory", "nodes": len(self.nodes), "wal_records": self._wal_records}
+
+    def clean_database(self):
+        with self._locked(fcntl.LOCK_EX):
+            self._change([{"op": "del_node", "id": key} for key in list(self.nodes)])
+
+    def list_all_node(self, skip_token=None, limit=None):
+        return self.get_node(None, None, skip_token, limit)
+
+    def get_node(self, label, query_info=None, skip_token=None, limit=None):
+        with self._locked(fcntl.LOCK_SH):
+            ids = self._match(label, query_info)
+            if limit is not None or skip_token is not None:
+                ids = sorted((key for key in ids if self.nodes[key][1].get("node_id") is not None),
+                             key=lambda key: self.nodes[key][1]["node_id"])
+                if skip_token is not None:
+                    ids = [key for key in ids if self.nodes[key][1]["node_id"] > skip_token]
+                ids = ids[:int(limit if limit is not None else ITER_FETCH_SIZE)]
+            return [self._node(key) for key in ids]
+
+    def get_subtree(self, root_node_id, rel='SUBHEADING', max_depth=None, label="Data"):
+        check_name(label), check_name(rel)
+        tree = GraphTree(root_node_id)
+        with self._locked(fcntl.LOCK_SH):
+            roots = self._match(label, {"node_id": root_node_id})
+            for root in roots:
+                tree.add(self._node(root))
+            level = [(root, 0) for root in roots]
+            seen = set(roots)
+            while level:
+                next_level = []
+                for key, depth in level:
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    for child in self.out_edges.get(key, {}).get(rel, {}):
+                        if child in seen:
+                            continue
+                        seen.add(child)
+                        tree.add(self._node(child), self.nodes[key][1].get("node_id"))
+                        next_level.append((child, depth + 1))
+                level = next_level
+        return tree
+
+    def add_node(self, label, props):
+        check_name(label)
+        props |= {'node_id': get_unique_id()}
+        stored = {k: normalize(v) for k, v in props.items()}
+        with self._locked(fcntl.LOCK_EX):
+            key = stored["node_id"]
+            self._change([{"op": "put_node", "id": key, "label": label, "props": stored}])
+            return copy_props(stored)
+
+    def update_node(self, label, src_props, target_props):
+        """same as MERGE (n {src_props}) SET n = target_props: matched or created nodes get exactly target_props"""
+        check_name(label)
+        stored = {k: normalize(v) for k, v in (target_props or {}).items()}
+        with self._locked(fcntl.LOCK_EX):
+            ids = self._match(label, src_props) or [get_unique_id()]
+            self._change([{"op": "put_node", "id": key, "label": label, "props": copy_props(stored)}
+                          for key in ids])
+            return [self._node(key) for key in ids]
+
+    def get_relationship(self, query_info):
+        """
+        rows of the distinct relationships on the paths of the query, like the Cypher variable-length match:
+        a path does not use a relationship twice, its length is within hop_num and it ends at target_props.
+        """
+        src_keys = keys_shape(query_info.get('src_prop_keys', None))
+        target_keys = keys_shape(query_info.get('target_prop_keys', None))
+        rel_types = rel_types_shape(query_info.get("rel_types", None))
+        min_hops, max_hops = parse_hops(query_info.get("hop_num", ""))
+        target_props = {k: normalize(v) for k, v in (query_info.get("target_props") or {}).items()}
+
+        def ends(key):
+            props = self.nodes[key][1]
+            return all(k in props and props[k] == v for k, v in target_props.items())
+
+        def out(key):
+            types = self.out_edges.get(key, {})
+            for rel_type in (rel_types or list(types)):
+                for dest in types.get(rel_type, {}):
+                    yield key, rel_type, dest
+
+        with self._locked(fcntl.LOCK_SH):
+            found = {}
+            for start in self._match(query_info.get("src_label", None), query_info.get("src_props", None)):
+                # depth first over trails: (node, edges of the path)
+                stack = [(start, ())]
+                while stack:
+                    key, path = stack.pop()
+                    if path and len(path) >= min_hops and ends(key):
+                        for edge in path:
+                            found.setdefault(edge, None)
+                    if max_hops is not None and len(path) >= max_hops:
+                        continue
+                    for edge in out(key):
+                        if edge not in path:
+                            stack.append((edge[2], path + (edge,)))
+            return [(self._node(src, src_keys), rel_type, self._node(dest, target_keys))
+                    for src, rel_type, dest in found]
+
+    def get_neighborhood(self, label, query_info=None, rel_types=None, target_prop_keys=None):
+        check_name(label)
+        rel_types = rel_types_shape(rel_types)
+        target_keys = keys_shape(target_prop_keys)
+        with self._locked(fcntl.LOCK_SH):
+            result = []
+            for key in self._match(label, query_info):
+                types = self.out_edges.get(key, {})
+                rels = [(rel_type, self._node(dest, target_keys))
+                        for rel_type in (rel_types or list(types)) for dest in types.get(rel_type, {})]
+                result.append((self._node(key), rels))
+            return result
+
+    def delete_node(self, label, props=None):
+        check_name(label)
+        with self._locked(fcntl.LOCK_EX):
+            self._change([{"op": "del_node", "id": key} for key in self._match(label, props)])
+
+    def delete_relationship(self, query_info):
+        rel_types = rel_types_shape(query_info.get("rel_types", None))
+        target_props = {k: normalize(v) for k, v in (query_info.get("target_props") or {}).items()}
+        with self._locked(fcntl.LOCK_EX):
+            records = []
+            for src in self._match(query_info.get("src_label", None), query_info.get("src_props", None)):
+                types = self.out_edges.get(src, {})
+                for rel_type in (rel_types or list(types)):
+                    for dest in types.get(rel_type, {}):
+                        props = self.nodes[dest][1]
+                        if all(k in props and props[k] == v for k, v in target_props.items()):
+                            records.append({"op": "del_edge", "src": src, "type": rel_type, "dest": dest})
+            self._change(records)
+        return len(records)
+
+    def _edge_records(self, src_label, src_id, rel_type, dest_label, dest_id):
+        # like MERGE (a)-[:T]->(b) between all matching nodes
+        return [{"op": "put_edge", "src": src, "type": check_name(rel_type), "dest": dest}
+                for src in self._match(src_label, {"node_id": src_id})
+                for dest in self._match(dest_label, {"node_id": dest_id})
+                if dest not in self.out_edges.get(src, {}).get(rel_type, {})]
+
+    def add_relationship(self, src_label, src_id, rel_types, dest_label, dest_id):
+        with self._locked(fcntl.LOCK_EX):
+            if not self._match(src_label, {"node_id": src_id}):
+                return {"status": "Failed", "reason": f"node_id: {src_id} does not exist."}
+            if not self._match(dest_label, {"node_id": dest_id}):
+                return {"status": "Failed", "reason": f"node_id: {dest_id} does not exist."}
+            self._change(self._edge_records(src_label, src_id, rel_types, dest_label, dest_id))
+        return {"status": "successfully"}
+
+    def _node_records(self, label, nodes):
+        # like the MERGE on node_id of GraphService.flush_nodes
+        records = []
+        for props in nodes:
+            stored = {k: normalize(v) for k, v in props.items()}
+            keys = self._match(label, {"node_id": stored["node_id"]}) or [stored["node_id"]]
+            for key in keys:
+                merged = (self.nodes[key][1] if key in self.nodes else {}) | stored
+                records.append({"op": "put_node", "id": key, "label": label, "props": merged})
+        return records
+
+    def export_nodes(self, fetch_size=ITER_FETCH_SIZE):
+        # the lock is taken per chunk, writes of other threads and processes may interleave
+        with self._locked(fcntl.LOCK_SH):
+            keys = sorted(self.nodes, key=self.seq.get)
+        for i in range(0, len(keys), fetch_size):
+            with self._locked(fcntl.LOCK_SH):
+                chunk = [(self.nodes[key][0], copy_props(self.nodes[key][1]))
+                         for key in keys[i:i + fetch_size] if key in self.nodes]
+            yield from chunk
+
+    def export_edges(self, fetch_size=ITER_FETCH_SIZE):
+        with self._locked(fcntl.LOCK_SH):
+            keys = sorted((key for key in self.out_edges if key in self.nodes), key=self.seq.get)
+        for i in range(0, len(keys), fetch_size):
+            with self._locked(fcntl.LOCK_SH):
+                chunk = []
+                for src in keys[i:i + fetch_size]:
+                    if src not in self.nodes:
+                        continue
+                    src_label, src_props = self.nodes[src]
+                    for rel_type, dests in self.out_edges.get(src, {}).items():
+                        for dest in dests:
+                            dest_label, dest_props = self.nodes[dest]
+                            if src_props.get("node_id") is None or dest_props.get("node_id") is None:
+                                continue
+                            chunk.append((src_label, src_props["node_id"], rel_type,
+                                          dest_label, dest_props["node_id"]))
+            yield from chunk
+
+    def add_nodes_bulk(self, label, props_list, batch_size=1000, create=False):
+        check_name(label)
+        nodes = [props | {"node_id": props.get("node_id") or get_unique_id()} for props in props_list]
+        with self.transaction():
+            self._change(self._node_records(label, nodes))
+        return nodes
+
+    def add_edges_bulk(self, src_label, rel_type, dest_label, pairs, batch_size=1000, create=False):
+        check_name(src_label), check_name(rel_type), check_name(dest_label)
+        with self.transaction():
+            for src_id, dest_id in pairs:
+                self._change(self._edge_records(src_label, src_id, rel_type, dest_label, dest_id))
+        return {"status": "successfully"}
+
+    def add_tree(self, label, tree, rel_type="SUBHEADING", parent_id=None, common_props=None,
+                 children_key="children", order_key="order", batch_size=1000):
+        check_name(label), check_name(rel_type)
+        nodes, edges = flatten_tree(tree, parent_id, common_props, children_key, order_key)
+        with self.transaction():
+            self._change(self._node_records(label, nodes))
+            for src_id, dest_id in edges:
+                self._change(self._edge_records(label, src_id, rel_type, label, dest_id))
+        return nodes[0]
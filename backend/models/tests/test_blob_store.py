@@ -0,0 +1,120 @@
+import copy
+import os
+import time
+
+import pytest
+
+from models import graph_db
+from models.graph_db import BLOB_REFS_QUERY, BlobRef, BlobStore, LazyNode, encode_props
+from models.graph_memory import MemoryGraphQuery
+
+TEXT = "x" * 200
+
+
+@pytest.fixture(params=[True, False], ids=["zstd", "raw"])
+def blobs(request, tmp_path, monkeypatch):
+    """the BlobStore of encode_props and LazyNode, values of more than 64 bytes go to it"""
+    store = BlobStore(tmp_path / "blobs", compress=request.param)
+    monkeypatch.setattr(graph_db, "blob_store_", store)
+    monkeypatch.setattr(graph_db, "BLOB_THRESHOLD", 64)
+    return store
+
+
+def test_large_values_round_trip_through_a_blob(blobs, memgraph):
+    graph, _ = memgraph
+    encoded = encode_props({"text": TEXT, "table": [[TEXT]], "small": "y"})
+    assert set(encoded) == {"text_blob_ref", "table_blob_ref", "small"}
+    assert encoded["text_blob_ref"].endswith(".zst") == blobs.compress
+    assert blobs.path(encoded["text_blob_ref"]).exists()
+
+    node = graph.decode_node(encoded)
+    # nothing is read before a blob property is accessed
+    assert isinstance(dict.__getitem__(node, "text"), BlobRef)
+    assert node["text"] == TEXT
+    assert node.get("table") == [[TEXT]]
+    assert dict(node.items()) == {"text": TEXT, "table": [[TEXT]], "small": "y"}
+
+
+def test_lazy_node_copies_keep_unread_refs(blobs, memgraph):
+    graph, _ = memgraph
+    node = graph.decode_node(encode_props({"text": TEXT, "small": "y"}))
+    for other in (node.copy(), copy.deepcopy(node), node | {"more": 1}, {"more": 1} | node):
+        assert isinstance(other, LazyNode)
+        assert isinstance(dict.__getitem__(other, "text"), BlobRef)
+        assert other["text"] == TEXT
+    # plain dict copies read the values
+    assert {**node}["text"] == TEXT
+    # written back, an unread blob keeps its reference
+    assert encode_props(graph.decode_node(encode_props({"text": TEXT})))["text_blob_ref"] == \
+           encode_props({"text": TEXT})["text_blob_ref"]
+    assert node.pop("text") == TEXT
+
+
+def test_same_content_is_stored_once(blobs):
+    first = blobs.put(b"data")
+    assert blobs.put(b"data") == first
+    assert len(list(blobs.root.glob("??/*"))) == 1
+    assert blobs.get(first) == b"data"
+    assert blobs.put(b"") and blobs.get(blobs.put(b"")) == b""
+
+
+def test_compressed_blobs_are_read_by_any_store(tmp_path):
+    compressed = BlobStore(tmp_path, compress=True)
+    raw = BlobStore(tmp_path, compress=False)
+    data = TEXT.encode() * 10
+    ref = compressed.put(data)
+    assert ref.endswith(".zst")
+    assert compressed.path(ref).stat().st_size < len(data)
+    assert raw.get(ref) == data
+    assert raw.path(raw.put(data)).read_bytes() == data
+
+
+@pytest.mark.parametrize("ref", ["../../etc/passwd", "abc", "0" * 64 + ".gz"])
+def test_invalid_refs_are_rejected(tmp_path, ref):
+    with pytest.raises(ValueError):
+        BlobStore(tmp_path).get(ref)
+
+
+def age(path, seconds):
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_sweep_removes_old_unreferenced_blobs(tmp_path):
+    store = BlobStore(tmp_path, compress=False)
+    live, dead, young = store.put(b"live"), store.put(b"dead"), store.put(b"young")
+    leftover = store.path(dead).with_name(f"{dead}.1.2.tmp")
+    leftover.write_bytes(b"partial")
+    for ref in (live, dead):
+        age(store.path(ref), 100)
+    age(leftover, 100)
+    assert store.sweep({live}, min_age=10) == (2, len(b"dead") + len(b"partial"))
+    assert [p.name for p in sorted(tmp_path.glob("??/*"))] == sorted([live, young])
+
+
+def test_writing_a_blob_again_keeps_it_from_the_sweep(tmp_path):
+    store = BlobStore(tmp_path, compress=False)
+    ref = store.put(b"data")
+    age(store.path(ref), 100)
+    store.put(b"data")
+    assert store.sweep(set(), min_age=10) == (0, 0)
+
+
+def test_gc_blobs_keeps_the_referenced_blobs(blobs, memgraph):
+    graph, conn = memgraph
+    live = blobs.put(b"live")
+    dead = blobs.put(b"dead")
+    for ref in (live, dead):
+        age(blobs.path(ref), 100)
+    conn.respond = lambda query, params: [{"ref": live}] if query == BLOB_REFS_QUERY else []
+    assert graph.gc_blobs(min_age=10)["removed"] == 1
+    assert blobs.path(live).exists() and not blobs.path(dead).exists()
+
+
+def test_memory_backend_answers_the_blob_refs_query(blobs):
+    graph = MemoryGraphQuery()
+    live = blobs.put(b"live")
+    age(blobs.path(live), 100)
+    graph.add_nodes_bulk("Data", [{"text_blob_ref": live}, {"title": "t"}])
+    assert graph.blob_refs() == {live}
+    assert graph.gc_blobs(min_age=10)["removed"] == 0
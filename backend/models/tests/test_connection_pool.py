@@ -0,0 +1,102 @@
+import threading
+import time
+
+import mgclient
+import pytest
+
+
+def test_nested_acquire_reuses_the_lease(make_pool):
+    pool = make_pool(max_size=2)
+    outer = pool.acquire()
+    inner = pool.acquire()
+    assert inner is outer
+    pool.release(inner)
+    # still leased by the outer checkout
+    assert not pool._idle
+    pool.release(outer)
+    assert [c for c, _ in pool._idle] == [outer]
+    assert pool.acquire() is outer
+    assert len(pool.created) == 1
+
+
+def test_other_threads_get_their_own_connection(make_pool):
+    pool = make_pool(max_size=2)
+    mine = pool.acquire()
+    theirs = []
+    thread = threading.Thread(target=lambda: theirs.append(pool.acquire()))
+    thread.start()
+    thread.join()
+    assert theirs[0] is not mine
+    assert pool._size == 2
+
+
+def test_full_pool_times_out(make_pool):
+    pool = make_pool(max_size=1, acquire_timeout=0.05)
+    pool.acquire()
+    errors = []
+
+    def acquire():
+        try:
+            pool.acquire()
+        except ConnectionError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+    assert pool._stats["timeouts"] == 1
+
+
+def test_waiter_gets_the_released_connection(make_pool):
+    pool = make_pool(max_size=1, acquire_timeout=5)
+    conn = pool.acquire()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+    thread.start()
+    while not pool._stats["waits"]:
+        time.sleep(0.001)
+    pool.release(conn)
+    thread.join()
+    assert got == [conn]
+
+
+@pytest.mark.parametrize("broken", [True, False])
+def test_broken_connection_is_not_reused(make_pool, broken):
+    pool = make_pool(max_size=1)
+    conn = pool.acquire()
+    if not broken:
+        conn.status = mgclient.CONN_STATUS_BAD
+    pool.release(conn, broken=broken)
+    assert pool._size == 0
+    assert not pool._idle
+    assert pool.acquire() is not conn
+
+
+def test_idle_connections_expire(make_pool):
+    pool = make_pool(max_size=2, max_idle=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.001)
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert pool.stats()["evicted"] == 1 and pool.stats()["size"] == 1
+
+
+def test_unhealthy_idle_connection_is_replaced(make_pool):
+    pool = make_pool(max_size=1, health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.status = mgclient.CONN_STATUS_BAD
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert pool.stats()["unhealthy"] == 1
+
+
+def test_close_closes_the_idle_connections(make_pool):
+    pool = make_pool(max_size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    pool.close()
+    assert conn.closed
+    assert pool.stats()["size"] == 0
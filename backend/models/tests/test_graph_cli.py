@@ -0,0 +1,108 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from models.graph_db import GRAPH_CONSTRAINTS
+from models.graph_memory import MemoryGraphQuery
+
+
+@pytest.fixture
+def cli(monkeypatch):
+    """graph_cli imported the way it runs, as a script next to graph_db, over an in-memory graph"""
+    monkeypatch.syspath_prepend(str(Path(__file__).parents[1]))
+    import graph_cli
+    graph = MemoryGraphQuery()
+    monkeypatch.setattr(graph_cli.graph_db, "graph_query_", graph)
+    return graph_cli, graph
+
+
+def fill(graph):
+    graph.add_nodes_bulk("Agent", [{"node_id": f"a{i}", "app_id": "A", "order": i} for i in range(5)])
+    graph.add_nodes_bulk("Tool", [{"node_id": "t", "app_id": "A", "meta": {"name": "echo"}}])
+    graph.add_edges_bulk("Agent", "NEXT", "Agent", [(f"a{i}", f"a{i + 1}") for i in range(4)])
+    graph.add_edges_bulk("Agent", "USE", "Tool", [("a0", "t")])
+
+
+def dump(graph):
+    nodes = sorted((label, json.dumps(props, sort_keys=True)) for label, props in graph.export_nodes())
+    return nodes, sorted(graph.export_edges())
+
+
+@pytest.mark.parametrize("name", ["graph.jsonl", "graph.jsonl.gz"])
+@pytest.mark.parametrize("bulk", [False, True])
+def test_export_import_round_trip(cli, tmp_path, monkeypatch, name, bulk):
+    graph_cli, graph = cli
+    fill(graph)
+    path = str(tmp_path / name)
+    graph_cli.GraphManager().export_graph(path, chunk_size=2)
+    with (gzip.open(path, "rt") if name.endswith(".gz") else open(path)) as f:
+        chunks = [json.loads(line) for line in f]
+    assert chunks[0] == {"kind": "header", "format": graph_cli.EXPORT_FORMAT, "version": graph_cli.EXPORT_VERSION}
+    assert chunks[-1] == {"kind": "footer", "nodes": 6, "edges": 5}
+    assert max(len(chunk.get("rows", [])) for chunk in chunks) == 2
+
+    restored = MemoryGraphQuery()
+    monkeypatch.setattr(graph_cli.graph_db, "graph_query_", restored)
+    graph_cli.GraphManager().import_graph(path, bulk)
+    assert dump(restored) == dump(graph)
+
+
+def test_import_rejects_other_files(cli, tmp_path):
+    graph_cli, graph = cli
+    path = tmp_path / "graph.jsonl"
+    path.write_text(json.dumps({"kind": "header", "format": graph_cli.EXPORT_FORMAT, "version": 0}) + "\n")
+    with pytest.raises(ValueError):
+        graph_cli.GraphManager().import_graph(str(path), bulk=False)
+    assert graph.list_all_node() == []
+
+
+def test_export_command(cli, tmp_path, monkeypatch):
+    graph_cli, graph = cli
+    fill(graph)
+    path = tmp_path / "graph.jsonl"
+    monkeypatch.setattr("sys.argv", ["graph_cli.py", "export", "-o", str(path), "-c", "3"])
+    graph_cli.main()
+    assert json.loads(path.read_text().splitlines()[-1]) == {"kind": "footer", "nodes": 6, "edges": 5}
+
+
+def storage(mode):
+    def respond(query, params):
+        if query == "SHOW STORAGE INFO;":
+            return [{"storage info": "name", "value": "graph"}, {"storage info": "storage_mode", "value": mode}]
+        return []
+    return respond
+
+
+def test_bulk_load_switches_the_storage_mode(memgraph):
+    graph, conn = memgraph
+    conn.respond = storage("ON_DISK_TRANSACTIONAL")
+    with graph.bulk_load():
+        start = len(conn.queries)
+        graph.add_nodes_bulk("Agent", [{"node_id": "a"}], create=True)
+        loaded = [query for query, _ in conn.queries[start:]]
+    queries = [query for query, _ in conn.queries]
+
+    assert queries[0] == "SHOW STORAGE INFO;"
+    drops = [f"DROP CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE;" for label, prop in GRAPH_CONSTRAINTS.items()]
+    assert queries[1:1 + len(drops)] == drops
+    assert "CREATE INDEX ON :Agent(node_id);" in queries
+    assert queries.index("STORAGE MODE IN_MEMORY_ANALYTICAL;") < start
+    assert any(query.startswith("UNWIND") and "CREATE" in query for query in loaded)
+
+    after = queries[start + len(loaded):]
+    assert after[0] == "STORAGE MODE ON_DISK_TRANSACTIONAL;"
+    assert after[1:] == [f"CREATE CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE;"
+                         for label, prop in GRAPH_CONSTRAINTS.items()]
+
+
+def test_bulk_load_restores_the_mode_on_errors(memgraph):
+    graph, conn = memgraph
+    conn.respond = storage("IN_MEMORY_TRANSACTIONAL")
+    with pytest.raises(RuntimeError):
+        with graph.bulk_load():
+            raise RuntimeError("failed")
+    queries = [query for query, _ in conn.queries]
+    assert queries.index("STORAGE MODE IN_MEMORY_TRANSACTIONAL;") > queries.index("STORAGE MODE IN_MEMORY_ANALYTICAL;")
+    assert queries[-1].startswith("CREATE CONSTRAINT")
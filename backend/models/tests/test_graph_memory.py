@@ -0,0 +1,145 @@
+import pytest
+
+from models import graph_memory
+from models.graph_db import EXPORT_NODES_QUERY, EXPORT_EDGES_QUERY
+from models.graph_memory import MemoryGraphQuery, parse_hops
+
+
+@pytest.fixture
+def path(tmp_path):
+    """snapshot path of graphs standing for processes that share it"""
+    return tmp_path / "graph"
+
+
+def node_ids(graph, label):
+    return sorted(node["node_id"] for node in graph.get_node(label))
+
+
+def test_parse_hops():
+    assert parse_hops("") == (1, None)
+    assert parse_hops("2") == (2, 2)
+    assert parse_hops("0..10") == (0, 10)
+    assert parse_hops("..3") == (1, 3)
+    assert parse_hops("2..") == (2, None)
+
+
+def test_processes_sharing_the_path_see_each_others_writes(path):
+    a, b = MemoryGraphQuery(path), MemoryGraphQuery(path)
+    node = a.add_node("Doc", {"name": "x"})
+    assert b.get_node("Doc", {"name": "x"})[0]["node_id"] == node["node_id"]
+    b.update_node("Doc", {"node_id": node["node_id"]}, {"node_id": node["node_id"], "name": "y"})
+    assert a.get_node("Doc")[0]["name"] == "y"
+    b.delete_node("Doc")
+    assert a.get_node("Doc") == []
+
+
+def test_wal_is_replayed_on_open(path):
+    graph = MemoryGraphQuery(path)
+    src = graph.add_node("Doc", {"name": "src"})
+    dest = graph.add_node("Doc", {"name": "dest"})
+    graph.add_relationship("Doc", src["node_id"], "LINK", "Doc", dest["node_id"])
+
+    reopened = MemoryGraphQuery(path)
+    assert node_ids(reopened, "Doc") == node_ids(graph, "Doc")
+    [(node, rels)] = reopened.get_neighborhood("Doc", {"name": "src"})
+    assert [(rel_type, n["name"]) for rel_type, n in rels] == [("LINK", "dest")]
+
+
+def test_compaction_folds_the_wal_into_the_snapshot(path, monkeypatch):
+    monkeypatch.setattr(graph_memory, "WAL_COMPACT_RECORDS", 3)
+    graph = MemoryGraphQuery(path)
+    for i in range(4):
+        graph.add_node("Doc", {"i": i})
+    assert path.with_name("graph.snapshot").exists()
+    # the 4th record is in the new WAL
+    assert graph._wal_records == 1
+
+    reopened = MemoryGraphQuery(path)
+    assert sorted(node["i"] for node in reopened.get_node("Doc")) == [0, 1, 2, 3]
+    # a process that read the old WAL reloads the snapshot
+    graph.add_node("Doc", {"i": 4})
+    assert len(reopened.get_node("Doc")) == 5
+
+
+def test_cut_off_record_is_ignored(path):
+    graph = MemoryGraphQuery(path)
+    graph.add_node("Doc", {"name": "kept"})
+    with open(f"{path}.wal", "ab") as f:
+        f.write(b'{"op": "put_node", "id"')
+    reopened = MemoryGraphQuery(path)
+    assert [node["name"] for node in reopened.get_node("Doc")] == ["kept"]
+    reopened.add_node("Doc", {"name": "next"})
+    assert sorted(node["name"] for node in MemoryGraphQuery(path).get_node("Doc")) == ["kept", "next"]
+
+
+def test_transaction_is_undone_on_exception(path):
+    graph = MemoryGraphQuery(path)
+    kept = graph.add_node("Doc", {"name": "kept"})
+    with pytest.raises(RuntimeError):
+        with graph.transaction():
+            graph.add_node("Doc", {"name": "gone"})
+            graph.delete_node("Doc", {"name": "kept"})
+            raise RuntimeError
+    assert node_ids(graph, "Doc") == [kept["node_id"]]
+    assert node_ids(MemoryGraphQuery(path), "Doc") == [kept["node_id"]]
+
+
+def test_session_and_iter_query(path):
+    graph = MemoryGraphQuery(path)
+    with graph.session() as session:
+        src = session.add_node("Doc", {"name": "src"})
+        dest = session.add_node("Doc", {"name": "dest"})
+        session.add_relationship("Doc", src["node_id"], "LINK", "Doc", dest["node_id"])
+
+    rows = list(graph.iter_query(EXPORT_NODES_QUERY, fetch_size=1))
+    assert [(row["labels"], row["props"]["name"]) for row in rows] == [(["Doc"], "src"), (["Doc"], "dest")]
+    assert list(graph.iter_query(EXPORT_EDGES_QUERY)) == [{
+        "src_label": "Doc", "src_id": src["node_id"], "rel_type": "LINK",
+        "dest_label": "Doc", "dest_id": dest["node_id"]}]
+    with pytest.raises(NotImplementedError):
+        list(graph.iter_query("MATCH (n) RETURN n"))
+
+
+def test_variable_length_relationships():
+    graph = MemoryGraphQuery()
+    a, b, c = (graph.add_node("Doc", {"name": name}) for name in "abc")
+    graph.add_relationship("Doc", a["node_id"], "NEXT", "Doc", b["node_id"])
+    graph.add_relationship("Doc", b["node_id"], "NEXT", "Doc", c["node_id"])
+    rows = graph.get_relationship({"src_label": "Doc", "src_props": {"name": "a"}, "hop_num": "2",
+                                   "src_prop_keys": ["name"], "target_prop_keys": ["name"]})
+    assert sorted((src["name"], dest["name"]) for src, _, dest in rows) == [("a", "b"), ("b", "c")]
+    rows = graph.get_relationship({"src_label": "Doc", "src_props": {"name": "a"}, "hop_num": "1",
+                                   "src_prop_keys": ["name"], "target_prop_keys": ["name"]})
+    assert [(src["name"], dest["name"]) for src, _, dest in rows] == [("a", "b")]
+
+
+def test_update_node_sets_exactly_the_target_props():
+    graph = MemoryGraphQuery()
+    node = graph.add_node("Tool", {"app_id": "A", "name": "t"})
+    graph.update_node("Tool", {"node_id": node["node_id"]}, {"node_id": node["node_id"], "name": "u"})
+    assert graph.get_node("Tool") == [{"node_id": node["node_id"], "name": "u", "label": ["Tool"]}]
+    # MERGE creates a node that does not match
+    graph.update_node("Tool", {"node_id": "other"}, {"name": "v"})
+    assert len(graph.get_node("Tool")) == 2
+
+
+def test_pages_by_node_id():
+    graph = MemoryGraphQuery()
+    graph.add_nodes_bulk("Data", [{"node_id": node_id} for node_id in "dbca"])
+    first = graph.get_node("Data", limit=3)
+    assert [n["node_id"] for n in first] == ["a", "b", "c"]
+    assert [n["node_id"] for n in graph.get_node("Data", skip_token="c", limit=3)] == ["d"]
+
+
+def test_neighborhood_and_relationship_deletes():
+    graph = MemoryGraphQuery()
+    graph.add_nodes_bulk("Agent", [{"node_id": node_id, "app_id": "A"} for node_id in "abc"])
+    graph.add_edges_bulk("Agent", "NEXT", "Agent", [("a", "b"), ("a", "c")])
+    graph.add_edges_bulk("Agent", "INPUT", "Agent", [("b", "a")])
+    rows = graph.get_neighborhood("Agent", {"app_id": "A"}, ["NEXT"], ["node_id"])
+    assert [(node["node_id"], rels) for node, rels in rows] == [
+        ("a", [("NEXT", {"node_id": "b"}), ("NEXT", {"node_id": "c"})]), ("b", []), ("c", [])]
+    assert graph.delete_relationship({"src_label": "Agent", "src_props": {"node_id": "a"},
+                                      "target_props": {"node_id": "b"}, "rel_types": ["NEXT"]}) == 1
+    rows = graph.get_neighborhood("Agent", {"node_id": "a"})
+    assert [(rel_type, n["node_id"]) for rel_type, n in rows[0][1]] == [("NEXT", "c")]
@@ -0,0 +1,131 @@
+import pytest
+
+from conftest import FakeNode
+from models.graph_db import check_name, flatten_tree, node_query_template, projection, props_shape, template_cache_info
+
+
+@pytest.mark.parametrize("name", ["Data", "node_id", "_x1"])
+def test_check_name_accepts_identifiers(name):
+    assert check_name(name) == name
+
+
+@pytest.mark.parametrize("name", ["", "1abc", "a-b", "a b", "n) DETACH DELETE (m", "名字", None, 1])
+def test_check_name_rejects_everything_else(name):
+    with pytest.raises(ValueError):
+        check_name(name)
+
+
+def test_templates_only_depend_on_the_shape():
+    assert props_shape({"name": "a", "meta": {"x": 1}}) == ("meta_json_data", "name")
+    first = node_query_template("get", "Data", props_shape({"name": "a"}))
+    second = node_query_template("get", "Data", props_shape({"name": "b'; DROP"}))
+    assert first is second
+    assert first == "MATCH (n:Data {name: $src_name}) RETURN n"
+    assert node_query_template("merge", "Tool", ("node_id",), ("name",)) == \
+           "MERGE (n:Tool {node_id: $src_node_id}) SET n = {name: $target_name} RETURN n"
+    assert template_cache_info()["node"]["hits"] >= 1
+
+
+def test_templates_check_the_label():
+    with pytest.raises(ValueError):
+        node_query_template("get", "Data) DETACH DELETE (n")
+    with pytest.raises(ValueError):
+        node_query_template("unknown", "Data")
+
+
+def test_values_are_passed_as_parameters(memgraph):
+    graph, conn = memgraph
+    conn.respond = lambda query, params: [{"n": FakeNode(["Data"], {"node_id": "x", "meta_json_data": '{"a": 1}'})}]
+    nodes = graph.get_node("Data", {"name": "it's", "meta": {"a": 1}})
+    query, params = conn.queries[-1]
+    assert "it's" not in query
+    assert params == {"src_name": "it's", "src_meta_json_data": '{"a": 1}'}
+    assert nodes == [{"node_id": "x", "meta": {"a": 1}, "label": ["Data"]}]
+
+
+def test_pages_are_ordered_by_node_id(memgraph):
+    graph, conn = memgraph
+    graph.get_node("Data", None, skip_token="abc", limit=10)
+    query, params = conn.queries[-1]
+    assert "n.node_id > $skip_token" in query and "ORDER BY n.node_id LIMIT $limit" in query
+    assert params == {"limit": 10, "skip_token": "abc"}
+
+
+TREE = {"title": "root", "children": [
+    {"title": "a", "children": [{"title": "a1"}]},
+    {"title": "b"},
+]}
+
+
+def test_flatten_tree():
+    nodes, edges = flatten_tree(TREE, parent_id="p", common_props={"app_id": "A"})
+    assert [(n["title"], n.get("order"), n["app_id"]) for n in nodes] == \
+           [("root", None, "A"), ("a", 0, "A"), ("a1", 0, "A"), ("b", 1, "A")]
+    ids = {n["title"]: n["node_id"] for n in nodes}
+    assert len(set(ids.values())) == 4
+    assert edges == [("p", ids["root"]), (ids["root"], ids["a"]), (ids["a"], ids["a1"]), (ids["root"], ids["b"])]
+    assert "children" not in nodes[0]
+
+
+def test_add_tree_writes_nodes_then_edges_in_one_transaction(memgraph):
+    graph, conn = memgraph
+    root = graph.add_tree("Data", TREE, common_props={"app_id": "A"})
+    batches = [(query, params["batch"]) for query, params in conn.queries if query.startswith("UNWIND")]
+    node_batches = [(query, rows) for query, rows in batches if "MERGE (n:Data" in query]
+    edge_batches = [(query, rows) for query, rows in batches if "SUBHEADING" in query]
+    # the nodes are flushed before the first edge, one batch per property shape
+    assert batches == node_batches + edge_batches
+    assert sorted(row["title"] for _, rows in node_batches for row in rows) == ["a", "a1", "b", "root"]
+    [(edge_query, edge_rows)] = edge_batches
+    assert "MERGE (a)-[r:SUBHEADING]->(b)" in edge_query
+    assert len(edge_rows) == 3 and edge_rows[0]["from_val"] == root["node_id"]
+    assert (conn.commits, conn.rollbacks, conn.autocommit) == (1, 0, True)
+
+
+def test_add_tree_rolls_back_a_failed_batch(memgraph):
+    graph, conn = memgraph
+
+    def respond(query, params):
+        if "SUBHEADING" in query:
+            raise RuntimeError("write failed")
+        return []
+
+    conn.respond = respond
+    with pytest.raises(RuntimeError):
+        graph.add_tree("Data", TREE)
+    assert (conn.commits, conn.rollbacks, conn.autocommit) == (0, 1, True)
+
+
+def test_projection():
+    assert projection("s", None) == "s"
+    assert projection("s", ("name", "meta")) == \
+           "s{.name, .name_json_data, .name_blob_ref, .meta, .meta_json_data, .meta_blob_ref}"
+
+
+def test_decode_row(memgraph):
+    graph, _ = memgraph
+    # a projected row holds every requested key with its encoded twins, unset ones are null
+    row = {"name": None, "name_json_data": '["a", "b"]', "name_blob_ref": None, "size": 3,
+           "size_json_data": None, "size_blob_ref": None, "other": None, "other_json_data": None, "other_blob_ref": None}
+    assert graph.decode_row(row, ["Data"], ("name", "size", "other")) == {"name": ["a", "b"], "size": 3, "other": None}
+    whole = graph.decode_row(FakeNode(["Data"], {"node_id": "x", "meta_json_data": "{}"}), ["Data"])
+    assert whole == {"node_id": "x", "meta": {}, "label": ["Data"]}
+
+
+def test_get_relationship_projects_in_the_query(memgraph):
+    graph, conn = memgraph
+    conn.respond = lambda query, params: [{
+        "start_props": {"node_id": "a", "node_id_json_data": None, "node_id_blob_ref": None},
+        "start_label": ["Data"],
+        "end_props": {"title": "t", "title_json_data": None, "title_blob_ref": None},
+        "end_label": ["Data"],
+        "rel_type": "SUBHEADING",
+    }]
+    rels = graph.get_relationship({"src_label": "Data", "src_props": {"node_id": "a"}, "rel_types": ["SUBHEADING"],
+                                   "hop_num": 1, "src_prop_keys": ["node_id"], "target_prop_keys": ["title"]})
+    assert rels == [({"node_id": "a"}, "SUBHEADING", {"title": "t"})]
+    query, params = conn.queries[-1]
+    assert "s{.node_id, .node_id_json_data, .node_id_blob_ref} AS start_props" in query
+    assert "e{.title, .title_json_data, .title_blob_ref} AS end_props" in query
+    assert "[:SUBHEADING*1]" in query
+    assert params == {"src_node_id": "a"}
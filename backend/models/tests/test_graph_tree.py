@@ -0,0 +1,53 @@
+from conftest import FakeNode
+from models.graph_db import GraphTree, subtree_query_template
+
+
+def node(node_id, order=None, **props):
+    return {"node_id": node_id, **({"order": order} if order is not None else {}), **props}
+
+
+def test_children_are_sorted_by_order():
+    tree = GraphTree("r")
+    tree.add(node("r"))
+    for node_id, order in [("c", 2), ("a", 0), ("b", 1)]:
+        tree.add(node(node_id, order), "r")
+    tree.add(node("a1", 0), "a")
+    assert [n["node_id"] for n in tree.children("r")] == ["a", "b", "c"]
+    assert tree.child_by_order("r", 1)["node_id"] == "b"
+    assert tree.child_by_order("r", 5) is None
+    assert tree.children("b") == []
+    assert tree.parent("a1")["node_id"] == "a"
+    assert [(n["node_id"], depth) for n, depth in tree.walk()] == [("r", 0), ("a", 1), ("a1", 2), ("b", 1), ("c", 1)]
+    # a child added later is sorted in
+    tree.add(node("d", -1), "r")
+    assert tree.children("r")[0]["node_id"] == "d"
+    assert len(tree) == 6
+
+
+def test_adding_a_node_twice_keeps_the_first():
+    tree = GraphTree("r")
+    first = tree.add(node("r"))
+    assert tree.add(node("r", title="other")) is first
+    assert len(tree) == 1
+
+
+def test_subtree_query_template():
+    query = subtree_query_template("Data", "SUBHEADING", 2)
+    assert "[:SUBHEADING*1..2]" in query and "$root_id" in query
+    assert "[:SUBHEADING*]" in subtree_query_template("Data", "SUBHEADING", None)
+
+
+def test_get_subtree_builds_the_tree_from_one_query(memgraph):
+    graph, conn = memgraph
+    # the rows of a path query may come in any order, the root row has no parent
+    conn.respond = lambda query, params: [
+        {"n": FakeNode(["Data"], node("a1", 0)), "parent_id": "a"},
+        {"n": FakeNode(["Data"], node("b", 1)), "parent_id": "r"},
+        {"n": FakeNode(["Data"], node("r", title="root")), "parent_id": None},
+        {"n": FakeNode(["Data"], node("a", 0)), "parent_id": "r"},
+    ]
+    tree = graph.get_subtree("r", max_depth=3)
+    assert len(conn.queries) == 1
+    assert conn.queries[0][1] == {"root_id": "r"}
+    assert tree.root["title"] == "root" and tree.root["label"] == ["Data"]
+    assert [(n["node_id"], depth) for n, depth in tree.walk()] == [("r", 0), ("a", 1), ("a1", 2), ("b", 1)]
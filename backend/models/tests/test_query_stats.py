@@ -0,0 +1,58 @@
+import logging
+
+import pytest
+
+from models import graph_db
+from models.graph_db import LATENCY_BUCKETS_MS, QueryStats, query_shape
+
+
+def test_query_shape_hides_literals():
+    assert query_shape("MATCH (n {name: 'a b', size: 12})\n   RETURN n  LIMIT 5") == \
+           "MATCH (n {name: ?, size: ?}) RETURN n LIMIT ?"
+    assert query_shape('MATCH (n {name: "x"}) RETURN n') == query_shape("MATCH (n {name: 'y'}) RETURN n")
+    assert query_shape("MATCH (n {name: $src_name}) RETURN n") == "MATCH (n {name: $src_name}) RETURN n"
+
+
+def test_percentile():
+    buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    buckets[0], buckets[3], buckets[-1] = 50, 45, 5
+    assert QueryStats.percentile(buckets, 0.5) == LATENCY_BUCKETS_MS[0]
+    assert QueryStats.percentile(buckets, 0.95) == LATENCY_BUCKETS_MS[3]
+    # the last bucket has no upper bound
+    assert QueryStats.percentile(buckets, 0.99) is None
+    assert QueryStats.percentile([0] * len(buckets), 0.5) is None
+
+
+def test_record_and_top(caplog):
+    stats = QueryStats(slow_ms=100)
+    for ms in (1, 3, 30):
+        stats.record("MATCH (n {id: 1}) RETURN n", ms / 1000, rows=2, nbytes=10)
+    stats.record("MATCH (n {id: 2}) RETURN n", 0.0005, error=True)
+    with caplog.at_level(logging.WARNING, logger=graph_db.logger.name):
+        stats.record("MATCH (m) DELETE m", 0.2)
+    assert "Slow graph query" in caplog.text and "MATCH (m) DELETE m" in caplog.text
+
+    top = stats.top(order="count")
+    assert [t["shape"] for t in top] == ["MATCH (n {id: ?}) RETURN n", "MATCH (m) DELETE m"]
+    first = top[0]
+    assert (first["count"], first["errors"], first["rows"], first["bytes"]) == (4, 1, 6, 30)
+    assert first["max_ms"] == pytest.approx(30)
+    assert first["p50_ms"] == 1 and first["p99_ms"] == 50
+    assert first["buckets"]["<=1"] == 2 and first["buckets"]["<=5"] == 1
+    assert stats.top(n=1, order="max_ms")[0]["shape"] == "MATCH (m) DELETE m"
+    stats.reset()
+    assert stats.top() == []
+
+
+def test_graph_queries_are_recorded(memgraph, monkeypatch):
+    graph, conn = memgraph
+    stats = QueryStats()
+    monkeypatch.setattr(graph_db, "query_stats", stats)
+    graph.delete_node("Data", {"node_id": "a"})
+    graph.delete_node("Data", {"node_id": "b"})
+    conn.respond = lambda query, params: (_ for _ in ()).throw(RuntimeError("failed"))
+    with pytest.raises(RuntimeError):
+        graph.delete_node("Data", {"node_id": "c"})
+    [stat] = graph.query_stats()
+    assert stat["shape"] == "MATCH (n:Data {node_id: $src_node_id}) DETACH DELETE n"
+    assert (stat["count"], stat["errors"]) == (3, 1)
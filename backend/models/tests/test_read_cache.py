@@ -0,0 +1,87 @@
+from conftest import FakeNode
+from models.graph_db import ReadCache, rel_deps
+
+
+def test_write_of_a_dependency_makes_the_entry_stale():
+    cache = ReadCache(labels=["Doc"])
+    snapshot = cache.snapshot()
+    cache.put("k", snapshot, ["Doc"], [1])
+    assert cache.get("k") == [1]
+    cache.bump(["Other"])
+    assert cache.get("k") == [1]
+    cache.bump(["Doc"])
+    assert cache.get("k") is None
+    assert cache.stale == 1
+
+
+def test_write_racing_the_read_leaves_the_entry_stale():
+    cache = ReadCache(labels=["Doc"])
+    snapshot = cache.snapshot()
+    # the write lands between the query and the put of its result
+    cache.bump(["Doc"])
+    cache.put("k", snapshot, ["Doc"], "old")
+    assert cache.get("k") is None
+
+
+def test_relationship_generations():
+    cache = ReadCache(labels=["Doc"])
+    cache.put("typed", cache.snapshot(), rel_deps(["LINK"]), 1)
+    cache.put("any", cache.snapshot(), rel_deps(None), 2)
+    cache.bump(rel_types=["OTHER"])
+    assert cache.get("typed") == 1
+    assert cache.get("any") is None
+
+    cache.put("any", cache.snapshot(), rel_deps(None), 2)
+    cache.bump(rel_types=[])
+    # a write of unknown type invalidates every relationship lookup
+    assert cache.get("typed") is None
+    assert cache.get("any") is None
+
+    cache.put("typed", cache.snapshot(), rel_deps(["LINK"]), 1)
+    cache.bump(["Doc"])
+    assert cache.get("typed") == 1
+
+
+def test_lru_eviction():
+    cache = ReadCache(max_size=2, labels=["Doc"])
+    for key in "ab":
+        cache.put(key, cache.snapshot(), ["Doc"], key)
+    cache.get("a")
+    cache.put("c", cache.snapshot(), ["Doc"], "c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+    assert cache.evictions == 1
+
+
+def test_values_are_copied():
+    cache = ReadCache(labels=["Doc"])
+    value = {"props": [1]}
+    cache.put("k", cache.snapshot(), ["Doc"], value)
+    value["props"].append(2)
+    cached = cache.get("k")
+    cached["props"].append(3)
+    assert cache.get("k") == {"props": [1]}
+
+
+def test_cacheable():
+    assert ReadCache(labels=["Doc"]).cacheable(["Doc"])
+    assert not ReadCache(labels=["Doc"]).cacheable(["Doc", "Run"])
+    assert not ReadCache(labels=["Doc"]).cacheable([])
+    assert not ReadCache(0, labels=["Doc"]).cacheable(["Doc"])
+
+
+def test_graph_query_serves_cached_labels_until_a_write(memgraph):
+    graph, conn = memgraph
+    graph.cache = ReadCache(labels=["Tool"])
+    conn.respond = lambda query, params: [{"n": FakeNode(["Tool"], {"node_id": "t"})}] if "RETURN n" in query else []
+    assert graph.get_node("Tool", {"app_id": "A"}) == [{"node_id": "t", "label": ["Tool"]}]
+    graph.get_node("Tool", {"app_id": "A"})
+    assert len(conn.queries) == 1
+    graph.delete_node("Tool", {"node_id": "x"})
+    graph.get_node("Tool", {"app_id": "A"})
+    assert len(conn.queries) == 3
+    # labels outside the cache are always queried
+    graph.get_node("Data")
+    graph.get_node("Data")
+    assert len(conn.queries) == 5
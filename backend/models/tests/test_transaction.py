@@ -0,0 +1,88 @@
+import pytest
+
+from models.graph_db import ReadCache
+
+
+def test_writes_of_the_block_share_one_transaction(memgraph):
+    graph, conn = memgraph
+    with graph.transaction() as tx:
+        tx.delete_node("Data", {"node_id": "a"})
+        with tx.transaction():
+            tx.delete_node("Data", {"node_id": "b"})
+        assert not conn.autocommit
+    assert (conn.commits, conn.rollbacks, conn.autocommit) == (1, 0, True)
+    assert len(graph.pool.created) == 1
+
+
+def test_exception_rolls_back(memgraph):
+    graph, conn = memgraph
+    with pytest.raises(RuntimeError):
+        with graph.transaction() as tx:
+            tx.delete_node("Data", {"node_id": "a"})
+            raise RuntimeError
+    assert (conn.commits, conn.rollbacks, conn.autocommit) == (0, 1, True)
+
+
+def test_cache_is_invalidated_when_the_transaction_ends(memgraph):
+    graph, conn = memgraph
+    graph.cache = ReadCache(labels=["Tool"])
+    graph.get_node("Tool")
+    generation = graph.cache.snapshot().get("Tool", 0)
+    with graph.transaction() as tx:
+        tx.delete_node("Tool", {"node_id": "a"})
+        # not committed yet, other readers may still cache what they read
+        assert graph.cache.snapshot().get("Tool", 0) == generation
+        # inside the block the cache is bypassed
+        queries = len(conn.queries)
+        tx.get_node("Tool")
+        assert len(conn.queries) == queries + 1
+    assert graph.cache.snapshot()["Tool"] > generation
+    assert graph._tx_pending == {}
+
+
+def test_cache_is_invalidated_after_a_rollback(memgraph):
+    graph, _ = memgraph
+    graph.cache = ReadCache(labels=["Tool"])
+    with pytest.raises(RuntimeError):
+        with graph.transaction() as tx:
+            tx.delete_node("Tool", {"node_id": "a"})
+            raise RuntimeError
+    assert graph.cache.snapshot()["Tool"] == 1
+
+
+def deletes(conn):
+    return [(query.replace(" DETACH DELETE n", ""), params) for query, params in conn.queries if "DETACH DELETE" in query]
+
+
+def test_cascade_delete_of_a_run(memgraph):
+    graph, conn = memgraph
+    graph.cascade_delete(app_id="A", app_ctx_id="R")
+    assert deletes(conn) == [
+        ("MATCH (n:AppRunCtx {app_id: $src_app_id, node_id: $src_node_id})", {"src_app_id": "A", "src_node_id": "R"}),
+        ("MATCH (n:IOData {app_ctx_id: $src_app_ctx_id, app_id: $src_app_id})", {"src_app_id": "A", "src_app_ctx_id": "R"}),
+        ("MATCH (n:Data {app_ctx_id: $src_app_ctx_id, app_id: $src_app_id})", {"src_app_id": "A", "src_app_ctx_id": "R"}),
+    ]
+    assert (conn.commits, conn.rollbacks) == (1, 0)
+
+
+def test_cascade_delete_of_an_application(memgraph):
+    graph, conn = memgraph
+    graph.cascade_delete(app_id="A")
+    assert [query for query, _ in deletes(conn)] == [
+        f"MATCH (n:{label} {{app_id: $src_app_id}})" for label in ["Agent", "Tool", "AppRunCtx", "IOData", "Data"]]
+    with pytest.raises(ValueError):
+        graph.cascade_delete()
+
+
+def test_failed_cascade_delete_deletes_nothing(memgraph):
+    graph, conn = memgraph
+
+    def respond(query, params):
+        if "IOData" in query:
+            raise RuntimeError("delete failed")
+        return []
+
+    conn.respond = respond
+    with pytest.raises(RuntimeError):
+        graph.cascade_delete(app_id="A", app_ctx_id="R")
+    assert (conn.commits, conn.rollbacks) == (0, 1)
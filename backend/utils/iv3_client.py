@@ -5,17 +5,28 @@ from PIL import Image
 import os
 import config
 import aiohttp
+import asyncio
 import json
 import logging
+import threading
 import traceback
+import weakref
+from contextlib import asynccontextmanager
 
 
 log = logging.getLogger(__name__)
 log.setLevel('INFO')
 
+# connections to INTERVL_URL kept open and used at most at once, by the pooled session of the main thread
+LLM_POOL_LIMIT = int(os.environ.get("LLM_POOL_LIMIT", "32"))
+LLM_KEEPALIVE = float(os.environ.get("LLM_KEEPALIVE", "60"))
+# seconds to connect, and between two chunks of a response (a streamed completion has no total limit)
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "300"))
 
 client = None
 model_name = None
+sessions = weakref.WeakKeyDictionary()  # event loop of the main thread -> aiohttp.ClientSession
 
 def get_client():
     global client
@@ -38,6 +49,77 @@ def reset_client():
     model_name = None
 
 
+def new_session():
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=LLM_POOL_LIMIT, keepalive_timeout=LLM_KEEPALIVE),
+        timeout=aiohttp.ClientTimeout(total=None, connect=LLM_CONNECT_TIMEOUT, sock_read=LLM_READ_TIMEOUT)
+    )
+
+
+def get_session():
+    """the pooled session to INTERVL_URL of the running event loop, shared by all requests"""
+    loop = asyncio.get_running_loop()
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        session = sessions[loop] = new_session()
+    return session
+
+
+@asynccontextmanager
+async def llm_session():
+    """
+    the session of one request: the pooled session on the main thread, which close_session closes on shutdown.
+    The loop of another thread (asyncio.run in a tool thread) ends without closing anything, a request there
+    gets a session of its own, closed when the request is done.
+    """
+    if threading.current_thread() is threading.main_thread():
+        yield get_session()
+        return
+    session = new_session()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def close_session():
+    session = sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def get_model_name():
+    """the served model, asked once and cached like get_client does"""
+    global model_name
+    if not model_name:
+        async with llm_session() as session, session.get(f"{config.INTERVL_URL}/v1/models") as response:
+            response.raise_for_status()
+            model_name = (await response.json())["data"][0]["id"]
+        log.info(f"iv3 server {config.INTERVL_URL}/v1 serves {model_name}")
+    return model_name
+
+
+class LLMStreamError(Exception):
+    """a streamed completion failed or ended before it was finished, the text received so far is incomplete"""
+
+
+async def stream_chunks(response, strict=False):
+    """the JSON chunks of a server-sent events completion, strict: a malformed chunk raises LLMStreamError"""
+    async for line in response.content:
+        line = line.decode('utf-8').strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            if strict:
+                raise LLMStreamError(f"malformed chunk: {line}")
+            log.error(f"Error parsing chunk: {line}")
+
+
 def load_base64_image(base64_string):
     if base64_string.startswith('data:image'):
         base64_string = base64_string.split(',')[1]
@@ -148,40 +230,33 @@ async def image_conversation_stream(question, images=None, on_finished: callable
     if image_content:
         content += image_content
 
-    async with aiohttp.ClientSession() as session:
-        data = {
-            "model": model_name,
-            "messages": [{"role": "user", "content": content}],
-            "temperature": 0.8,
-            "stream": True
-        }
+    data = {
+        "model": await get_model_name(),
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0.8,
+        "stream": True
+    }
 
-        async with session.post(f"{config.INTERVL_URL}/v1/chat/completions", json=data) as response:
-            response.raise_for_status()
-            buffer = ''
-            async for line in response.content:
-                if line.strip():
-                    try:
-                        chunk = json.loads(line.decode('utf-8')[6:])
-                        if "choices" in chunk:
-                            delta = chunk["choices"][0].get("delta", {})
-                            if "content" in delta:
-                                text = delta["content"]
-                                buffer += text
-                                yield "response", text
-                            elif "reasoning_content" in delta:
-                                text = delta["reasoning_content"]
-                                yield "progress", text
-
-                            if chunk["choices"][0].get("finish_reason") is not None:
-                                print(chunk["choices"][0].get("finish_reason"))
-                                if on_finished is not None:
-                                    final_result = await on_finished(buffer, buffer)
-                                    yield "final", final_result
-                                break
-
-                    except json.JSONDecodeError:
-                        logger.error(f"Error parsing chunk: {line}")
+    async with llm_session() as session, session.post(f"{config.INTERVL_URL}/v1/chat/completions", json=data) as response:
+        response.raise_for_status()
+        buffer = ''
+        async for chunk in stream_chunks(response):
+            if chunk.get("choices"):
+                delta = chunk["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    text = delta["content"]
+                    buffer += text
+                    yield "response", text
+                elif delta.get("reasoning_content"):
+                    text = delta["reasoning_content"]
+                    yield "progress", text
+
+                if chunk["choices"][0].get("finish_reason") is not None:
+                    print(chunk["choices"][0].get("finish_reason"))
+                    if on_finished is not None:
+                        final_result = await on_finished(buffer, buffer)
+                        yield "final", final_result
+                    break
 
 
 def chat(question, image=None, image_path=None):
@@ -206,33 +281,62 @@ async def async_chat(prompt: str):
     Returns:
         dict: The response from the vLLM server.
     """
-    get_client()  #read model name
-    headers = {
-        "Content-Type": "application/json",
-    }
+    try:
+        # Prepare the payload in OpenAI-compliant format
+        payload = {
+            "model": await get_model_name(),
+            "messages": [
+                {"role": "user", "content": [{"type": "text", "text": prompt}]}
+            ],
+            "temperature": 0.0,
+        }
 
-    # Prepare the payload in OpenAI-compliant format
-    payload = {
-        "model": model_name,
-        "messages": [
-            {"role": "user", "content": [{"type": "text", "text": prompt}]}
-        ],
-        "temperature": 0.0,
-    }
+        async with llm_session() as session, session.post(f"{config.INTERVL_URL}/v1/chat/completions", json=payload) as response:
+            if response.status == 200:
+                result = await response.json()
+                # Extract the generated text from the response
+                return result["choices"][0]["message"]["content"]
+            else:
+                error_text = await response.text()
+                raise Exception(f"Request failed with status {response.status}: {error_text}")
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        return None
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(f"{config.INTERVL_URL}/v1/chat/completions", headers=headers, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    # Extract the generated text from the response
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Request failed with status {response.status}: {error_text}")
-        except Exception as e:
-            print(f"Error occurred: {e}")
-            return None
+
+async def async_chat_stream(prompt: str):
+    """
+    async_chat with the completion streamed: yields the pieces of the answer text as the server produces them.
+    Raises LLMStreamError when the request fails or the stream breaks off before the server finished the answer.
+    """
+    try:
+        payload = {
+            "model": await get_model_name(),
+            "messages": [
+                {"role": "user", "content": [{"type": "text", "text": prompt}]}
+            ],
+            "temperature": 0.0,
+            "stream": True
+        }
+
+        async with llm_session() as session, session.post(f"{config.INTERVL_URL}/v1/chat/completions", json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Request failed with status {response.status}: {error_text}")
+            async for chunk in stream_chunks(response, strict=True):
+                if not chunk.get("choices"):
+                    continue
+                if text := chunk["choices"][0].get("delta", {}).get("content"):
+                    yield text
+                if chunk["choices"][0].get("finish_reason") is not None:
+                    return
+            raise LLMStreamError("the stream ended before the answer was finished")
+    except LLMStreamError as e:
+        log.error(f"chat stream failed: {e}")
+        raise
+    except Exception as e:
+        log.error(f"chat stream failed: {e}")
+        raise LLMStreamError(str(e)) from e
 
 
 if __name__ == '__main__':
@@ -253,7 +357,6 @@ if __name__ == '__main__':
 #         image_base64_url = encode_image_to_base64(image_file)
 #         print(image_conversation(p1, image_base64_url))
 #         print(image_conversation(p2, image_base64_url))
-    import asyncio
     get_client()
     ret = asyncio.run(async_chat("hello"))
     print(ret)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("openai")
+pytest.importorskip("PIL")
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils import iv3_client
+from utils.iv3_client import LLMStreamError, async_chat_stream, llm_session, stream_chunks
+
+
+class Response:
+    """aiohttp response whose content yields the given lines"""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    @property
+    async def content(self):
+        for line in self.lines:
+            yield line.encode()
+
+
+def chunk(text=None, finish_reason=None):
+    delta = {"content": text} if text is not None else {}
+    return "data: " + json.dumps({"choices": [{"delta": delta, "finish_reason": finish_reason}]}) + "\n"
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def test_stream_chunks_stop_at_done():
+    lines = [": keep-alive\n", "\n", chunk("a"), "data:" + chunk("b")[5:], "data: [DONE]\n", chunk("c")]
+    chunks = asyncio.run(collect(stream_chunks(Response(lines))))
+    assert [c["choices"][0]["delta"]["content"] for c in chunks] == ["a", "b"]
+
+
+def test_malformed_chunks(caplog):
+    lines = [chunk("a"), "data: {\"choices\": \n", chunk("b")]
+    chunks = asyncio.run(collect(stream_chunks(Response(lines))))
+    assert len(chunks) == 2 and "Error parsing chunk" in caplog.text
+    with pytest.raises(LLMStreamError):
+        asyncio.run(collect(stream_chunks(Response(lines), strict=True)))
+
+
+def serve(monkeypatch, body, status=200):
+    """run(fn) awaits fn while a completions server answering body is up, the served model is already known"""
+    async def completions(request):
+        response = web.StreamResponse(status=status)
+        await response.prepare(request)
+        for line in body:
+            await response.write(line.encode())
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    monkeypatch.setattr(iv3_client, "model_name", "model")
+
+    async def run(fn):
+        async with TestServer(app) as server:
+            monkeypatch.setattr(iv3_client.config, "INTERVL_URL", str(server.make_url("")).rstrip("/"))
+            try:
+                return await fn()
+            finally:
+                await iv3_client.close_session()
+    return run
+
+
+def test_chat_stream(monkeypatch):
+    run = serve(monkeypatch, [chunk("Hel"), chunk("lo"), chunk(finish_reason="stop"), "data: [DONE]\n"])
+    assert asyncio.run(run(lambda: collect(async_chat_stream("hi")))) == ["Hel", "lo"]
+
+
+@pytest.mark.parametrize("body, status", [
+    # the connection closes before the server finished the answer
+    ([chunk("Hel")], 200),
+    ([chunk("Hel"), "data: [DONE]\n"], 200),
+    ([chunk("Hel"), "data: {\n"], 200),
+    (["overloaded"], 503),
+])
+def test_chat_stream_errors(monkeypatch, body, status):
+    run = serve(monkeypatch, body, status)
+    texts = []
+
+    async def read():
+        async for text in async_chat_stream("hi"):
+            texts.append(text)
+
+    with pytest.raises(LLMStreamError):
+        asyncio.run(run(read))
+    assert texts == ([] if status != 200 else ["Hel"])
+
+
+def test_only_the_main_thread_pools_its_session():
+    async def sessions():
+        async with llm_session() as first, llm_session() as second:
+            return first, second
+
+    async def main():
+        first, second = await sessions()
+        await iv3_client.close_session()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second and first.closed
+
+    result = {}
+    # a tool thread runs its own loop, its sessions are closed with the request
+    thread = threading.Thread(target=lambda: result.update(sessions=asyncio.run(sessions())))
+    thread.start()
+    thread.join()
+    first, second = result["sessions"]
+    assert first is not second and first.closed and second.closed
@@ -546,7 +546,8 @@ export const delInput = async (
 
 export const runAgent = async (
   runAgentForm: AgentForm,
-  authToken: string
+  authToken: string,
+  lastEventId: string = ''
 ) => {
   const url = `${AGENT_API_BASE_URL}/application/agent/run`;
 
@@ -555,7 +556,9 @@ export const runAgent = async (
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
-        Authorization: `Bearer ${authToken}`
+        Authorization: `Bearer ${authToken}`,
+        // 断线重连时从该事件之后继续，不会重新运行
+        ...(lastEventId ? {'Last-Event-ID': lastEventId} : {})
       },
       body: JSON.stringify(runAgentForm)
     });
@@ -581,7 +584,8 @@ export const runAgent = async (
 
 export const runApp = async (
   app_id: string,
-  authToken: string
+  authToken: string,
+  lastEventId: string = ''
 ) => {
   const url = `${AGENT_API_BASE_URL}/application/run/${app_id}`;
 
@@ -590,7 +594,8 @@ export const runApp = async (
       method: 'get',
       headers: {
         'Content-Type': 'application/json',
-        Authorization: `Bearer ${authToken}`
+        Authorization: `Bearer ${authToken}`,
+        ...(lastEventId ? {'Last-Event-ID': lastEventId} : {})
       }
     });
 
@@ -620,8 +625,10 @@ export const parseStream = async function (stream,handleLine: (line: string) =>
 				while (true) {
 						const {value, done} = await reader.read();
 						if (done) break;
-						buffer = decoder.decode(value, {stream: true});
+						buffer += decoder.decode(value, {stream: true});
 						const lines = buffer.split('\n');
+						// 最后一行可能还不完整，留到下一块
+						buffer = lines.pop() ?? '';
 						for (const line of lines) {
 								if (line.trim() === '') continue;
 								handleLine(line);